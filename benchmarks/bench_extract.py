@@ -0,0 +1,216 @@
+"""
+Benchmark dell'estrazione in streaming dei download Vimm's Lair
+
+Genera un archivio zip di grandi dimensioni, lo serve da un server HTTP locale con supporto
+Range e banda limitata, e confronta:
+    sequenziale  download completo (startDownload) e poi estrazione con zipfile
+    streaming    startDownload con "extract": true (estrazione mentre il file arriva)
+
+Per ogni scenario riporta tempo totale, picco di memoria (tracemalloc) e verifica che i file
+estratti siano identici agli originali.
+
+Uso:
+    python benchmarks/bench_extract.py --size-mb 512 --bandwidth-mbps 200
+    python benchmarks/bench_extract.py --size-mb 256 --data-descriptor --segments 1
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fixture_routes  # noqa: E402
+
+BLOCK_BYTES = 1024 * 1024
+
+
+class RangeFileHandler(BaseHTTPRequestHandler):
+    """Serve un file con supporto Range e banda limitata"""
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        path = self.server.file_path
+        total = os.path.getsize(path)
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else total - 1
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{total}')
+        else:
+            start, end = 0, total - 1
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Content-Type', 'application/zip')
+        self.end_headers()
+        bandwidth = self.server.bandwidth_bps
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(remaining, 64 * 1024))
+                try:
+                    self.wfile.write(chunk)
+                except OSError:
+                    return
+                remaining -= len(chunk)
+                if bandwidth:
+                    time.sleep(len(chunk) / bandwidth)
+
+
+def make_archive(directory: str, size_mb: int, entries: int, data_descriptor: bool) -> Dict[str, str]:
+    """Crea bench.zip con entry semi-comprimibili; ritorna nome -> sha1 del contenuto"""
+    hashes = {}
+    entry_blocks = max(1, size_mb // entries)
+    archive_path = os.path.join(directory, 'bench.zip')
+    with open(archive_path, 'wb') as raw:
+        # Con data_descriptor lo zip viene scritto su uno stream non seekable (bit 3 dei flag)
+        target = _Unseekable(raw) if data_descriptor else raw
+        with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for index in range(entries):
+                name = f'rom/disc{index + 1}.iso'
+                digest = hashlib.sha1()
+                with archive.open(name, 'w', force_zip64=True) as entry:
+                    for block in range(entry_blocks):
+                        # Metà casuale, metà ripetitiva: rapporto di compressione realistico
+                        data = os.urandom(BLOCK_BYTES // 2) + bytes([block % 256]) * (BLOCK_BYTES // 2)
+                        digest.update(data)
+                        entry.write(data)
+                hashes[name] = digest.hexdigest()
+    return hashes
+
+
+class _Unseekable:
+    """File scrivibile senza seek/tell, per ottenere uno zip con data descriptor"""
+
+    def __init__(self, f):
+        self._f = f
+
+    def write(self, data: bytes) -> int:
+        return self._f.write(data)
+
+    def flush(self) -> None:
+        self._f.flush()
+
+
+def verify(extract_dir: str, hashes: Dict[str, str]) -> bool:
+    for name, expected in hashes.items():
+        digest = hashlib.sha1()
+        try:
+            with open(os.path.join(extract_dir, name), 'rb') as f:
+                for block in iter(lambda: f.read(BLOCK_BYTES), b''):
+                    digest.update(block)
+        except OSError:
+            return False
+        if digest.hexdigest() != expected:
+            return False
+    return True
+
+
+def wait_download(module, download_id: str, source_dir: str) -> Dict[str, Any]:
+    while True:
+        status = json.loads(module.execute(json.dumps({'method': 'getDownloadStatus', 'download_id': download_id,
+                                                       'source_dir': source_dir})))
+        if status.get('status') not in ('pending', 'downloading', 'extracting'):
+            return status
+        time.sleep(0.05)
+
+
+def run_scenario(module, name: str, url: str, work_dir: str, source_dir: str, segments: int,
+                 hashes: Dict[str, str]) -> Dict[str, Any]:
+    scenario_dir = os.path.join(work_dir, name)
+    extract_dir = os.path.join(scenario_dir, 'out')
+    params = {'method': 'startDownload', 'url': url, 'dest_path': os.path.join(scenario_dir, 'bench.zip'),
+              'segments': segments, 'source_dir': source_dir}
+    if name == 'streaming':
+        params.update(extract=True, extract_dir=extract_dir, keep_archive=False)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    status = json.loads(module.execute(json.dumps(params)))
+    status = wait_download(module, status['download_id'], source_dir)
+    download_done = time.perf_counter()
+    if name == 'sequenziale' and status['status'] == 'completed':
+        with zipfile.ZipFile(params['dest_path']) as archive:
+            archive.extractall(extract_dir)
+        os.remove(params['dest_path'])
+    wall = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {
+        'scenario': name,
+        'status': status['status'],
+        'mode': status.get('mode'),
+        'wall_seconds': round(wall, 3),
+        'download_seconds': round(download_done - start, 3),
+        'peak_kib': round(peak / 1024, 1),
+        'verified': verify(extract_dir, hashes),
+    }
+    if status.get('extraction'):
+        result['extraction'] = status['extraction']['status']
+    shutil.rmtree(scenario_dir, True)
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=256, help='Dimensione non compressa totale')
+    parser.add_argument('--entries', type=int, default=2)
+    parser.add_argument('--bandwidth-mbps', type=float, default=400.0, help='Banda del server (0 = illimitata)')
+    parser.add_argument('--segments', type=int, default=4)
+    parser.add_argument('--data-descriptor', action='store_true', help='Zip con data descriptor (scritto in streaming)')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='tottodrillo-extract-')
+    try:
+        hashes = make_archive(work_dir, args.size_mb, args.entries, args.data_descriptor)
+        server = ThreadingHTTPServer(('127.0.0.1', 0), RangeFileHandler)
+        server.daemon_threads = True
+        server.file_path = os.path.join(work_dir, 'bench.zip')
+        server.bandwidth_bps = args.bandwidth_mbps * 1024 * 1024 / 8
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}/?mediaId=1'
+
+        os.environ.setdefault('TOTTODRILLO_RATE_LIMIT', '0')
+        module = fixture_routes.load_source_module('vimms')
+        source_dir = fixture_routes.make_source_dir('vimms')
+        results: List[Dict[str, Any]] = []
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stderr(devnull):
+            for name in ('sequenziale', 'streaming'):
+                results.append(run_scenario(module, name, url, work_dir, source_dir, args.segments, hashes))
+        server.shutdown()
+        archive_mb = os.path.getsize(server.file_path) / 1024 / 1024
+    finally:
+        shutil.rmtree(work_dir, True)
+
+    if args.json:
+        print(json.dumps({'archive_mb': round(archive_mb, 1), 'results': results}, indent=2))
+        return 0
+    print(f"archivio {archive_mb:.1f} MiB ({args.size_mb} MiB estratti, {args.entries} entry), "
+          f"banda {args.bandwidth_mbps or 'illimitata'} Mbit/s, segmenti {args.segments}")
+    print(f"{'scenario':12} {'stato':10} {'modalità':10} {'estrazione':11} {'totale s':>9} {'download s':>11} "
+          f"{'picco KiB':>10} {'verifica':>9}")
+    for r in results:
+        print(f"{r['scenario']:12} {r['status']:10} {str(r['mode']):10} {r.get('extraction', 'zipfile'):11} "
+              f"{r['wall_seconds']:9.2f} {r['download_seconds']:11.2f} {r['peak_kib']:10.1f} "
+              f"{'ok' if r['verified'] else 'ERRORE':>9}")
+    return 0 if all(r['verified'] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Benchmark offline degli estrattori delle source (rete sostituita dalle fixture registrate)
+
+Uso:
+    python benchmarks/bench_extractors.py                      # esegue e confronta con baseline.json
+    python benchmarks/bench_extractors.py --save-baseline      # aggiorna baseline.json
+    python benchmarks/bench_extractors.py --only vimms --iterations 200
+
+Per ogni estrattore riporta throughput (op/s), distribuzione della latenza (p50/p95/p99)
+e allocazioni (picco tracemalloc e blocchi allocati per chiamata).
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fixture_routes  # noqa: E402
+
+BASELINE_FILE = os.path.join(fixture_routes.BENCH_DIR, 'baseline.json')
+
+
+def build_cases() -> List[Tuple[str, Callable[[], Any]]]:
+    """Costruisce l'elenco (nome, funzione) degli estrattori da misurare"""
+    vimms = fixture_routes.load_source_module('vimms')
+    nswpedia = fixture_routes.load_source_module('nswpedia')
+    switchroms = fixture_routes.load_source_module('switchroms')
+    vimms_dir = fixture_routes.make_source_dir('vimms')
+    nswpedia_dir = fixture_routes.make_source_dir('nswpedia')
+    switchroms_dir = fixture_routes.make_source_dir('switchroms')
+    # Le fixture non cambiano mai: con il memo dei parsing attivo si misurerebbero solo i riusi
+    for module in (vimms, nswpedia, switchroms):
+        module.PARSE_MEMO_SIZE = 0
+
+    return [
+        ('vimms.get_system_search_roms',
+         lambda: vimms.get_system_search_roms('', 'N64', 1, vimms_dir)),
+        ('vimms.get_general_search_roms',
+         lambda: vimms.get_general_search_roms('zelda', 1, vimms_dir)),
+        ('vimms.get_rom_entry_by_uri',
+         lambda: vimms.get_rom_entry_by_uri('/vault/1302', vimms_dir, True)),
+        ('nswpedia.search_roms[category]',
+         lambda: nswpedia.search_roms({'search_key': '', 'page': 1}, nswpedia_dir)),
+        ('nswpedia.search_roms[search]',
+         lambda: nswpedia.search_roms({'search_key': 'mario', 'page': 1}, nswpedia_dir)),
+        ('nswpedia.get_entry',
+         lambda: nswpedia.get_entry({'slug': 'rpg/xenoblade-chronicles-3-60'}, nswpedia_dir)),
+        ('switchroms.search_roms[category]',
+         lambda: switchroms.search_roms({'search_key': '', 'page': 1}, switchroms_dir)),
+        ('switchroms.get_entry',
+         lambda: switchroms.get_entry({'slug': 'xenoblade-chronicles-3'}, switchroms_dir)),
+    ]
+
+
+def check_result(name: str, result: Any) -> None:
+    """Verifica che l'estrattore abbia prodotto dati (fixture non più allineate al codice)"""
+    if isinstance(result, str):
+        result = json.loads(result)
+    if isinstance(result, dict) and 'error' in result:
+        raise RuntimeError(f"{name}: errore dall'estrattore: {result['error']}")
+    if isinstance(result, dict):
+        payload_keys = [key for key in ('roms', 'results', 'entry') if key in result]
+        empty = bool(payload_keys) and not any(result[key] for key in payload_keys)
+    else:
+        empty = not result
+    if empty:
+        raise RuntimeError(f"{name}: nessun risultato estratto dalle fixture")
+
+
+def percentile(samples: List[float], quantile: float) -> float:
+    """Percentile con interpolazione lineare"""
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * quantile
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def run_case(name: str, func: Callable[[], Any], iterations: int, warmup: int) -> Dict[str, Any]:
+    """Misura un estrattore: latenze senza tracemalloc, allocazioni in un passaggio separato"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stderr(devnull):
+        check_result(name, func())
+        for _ in range(warmup):
+            func()
+
+        samples = []
+        total_start = time.perf_counter()
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+        total = time.perf_counter() - total_start
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+    allocated_blocks = sum(max(stat.count_diff, 0) for stat in after.compare_to(before, 'filename'))
+    return {
+        'iterations': iterations,
+        'ops_per_sec': round(iterations / total, 2),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+        'peak_kib': round(peak / 1024, 1),
+        'allocated_blocks': allocated_blocks,
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """Ritorna l'elenco delle regressioni oltre la tolleranza rispetto alla baseline"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in ('p50_ms', 'peak_kib'):
+            if base.get(metric) and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {base[metric]} -> {result[metric]}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', help='Esegue solo gli estrattori il cui nome contiene questa stringa')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help='Salva i risultati come nuova baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Regressione ammessa rispetto alla baseline (0.25 = +25%%)')
+    parser.add_argument('--json', action='store_true', help='Stampa i risultati in JSON')
+    args = parser.parse_args()
+
+    fixture_routes.install_fixture_transport()
+    results = {}
+    for name, func in build_cases():
+        if args.only and args.only not in name:
+            continue
+        results[name] = run_case(name, func, args.iterations, args.warmup)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f).get('results', {})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        header = f"{'estrattore':36} {'op/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'picco KiB':>10} {'blocchi':>8} {'vs base':>8}"
+        print(header)
+        print('-' * len(header))
+        for name, r in results.items():
+            delta = ''
+            if baseline.get(name, {}).get('p50_ms'):
+                delta = f"{(r['p50_ms'] / baseline[name]['p50_ms'] - 1) * 100:+.0f}%"
+            print(f"{name:36} {r['ops_per_sec']:9.1f} {r['p50_ms']:9.3f} {r['p95_ms']:9.3f} {r['p99_ms']:9.3f} "
+                  f"{r['peak_kib']:10.1f} {r['allocated_blocks']:8d} {delta:>8}")
+
+    if args.save_baseline:
+        merged = dict(baseline)
+        merged.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'results': merged}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline salvata in {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print('\nRegressioni rispetto alla baseline:')
+        for line in regressions:
+            print(f'  - {line}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
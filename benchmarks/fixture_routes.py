@@ -0,0 +1,124 @@
+"""
+Mappa URL upstream -> pagine registrate in benchmarks/fixtures
+Condiviso dalla suite di benchmark (trasporto HTTP sostituito) e dal server upstream locale
+"""
+import atexit
+import importlib.util
+import io
+import os
+import re
+import shutil
+import tempfile
+from typing import Optional, Tuple
+
+import requests
+import requests.adapters
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+FIXTURE_DIR = os.path.join(BENCH_DIR, 'fixtures')
+
+# Host upstream reali di ciascuna source
+SITE_HOSTS = {
+    'vimms': ('vimm.net', 'dl.vimm.net', 'dl2.vimm.net', 'dl3.vimm.net'),
+    'nswpedia': ('nswpedia.com',),
+    'switchroms': ('switchroms.io',),
+}
+
+# (site, regex su path+query, fixture, content type) - vince la prima corrispondenza
+ROUTES = [
+    ('vimms', r'^/image\.php\?', 'vimms_screen.png', 'image/png'),
+    ('vimms', r'^/vault/\?.*\bsystem=', 'vimms_listing_system.html', 'text/html; charset=utf-8'),
+    ('vimms', r'^/vault/\?', 'vimms_listing_general.html', 'text/html; charset=utf-8'),
+    ('vimms', r'^/+vault/\d+', 'vimms_detail.html', 'text/html; charset=utf-8'),
+    ('nswpedia', r'^/download/', 'nswpedia_download.html', 'text/html; charset=UTF-8'),
+    ('nswpedia', r'[?&]s=', 'nswpedia_search.html', 'text/html; charset=UTF-8'),
+    ('nswpedia', r'^/nintendo-switch-roms(/page/\d+)?/?$', 'nswpedia_category.html', 'text/html; charset=UTF-8'),
+    ('nswpedia', r'^/nintendo-switch-roms/.+', 'nswpedia_detail.html', 'text/html; charset=UTF-8'),
+    ('switchroms', r'\?download&(amp;)?link=', 'switchroms_link.html', 'text/html; charset=UTF-8'),
+    ('switchroms', r'\?download$', 'switchroms_download.html', 'text/html; charset=UTF-8'),
+    ('switchroms', r'[?&]s=', 'switchroms_category.html', 'text/html; charset=UTF-8'),
+    ('switchroms', r'^/nintendo-switch-games/', 'switchroms_category.html', 'text/html; charset=UTF-8'),
+    ('switchroms', r'^/[^/?]+/?$', 'switchroms_detail.html', 'text/html; charset=UTF-8'),
+]
+_COMPILED_ROUTES = [(site, re.compile(pattern), fixture, ctype) for site, pattern, fixture, ctype in ROUTES]
+
+_fixture_cache = {}
+
+
+def site_for_host(host: str) -> Optional[str]:
+    """Ritorna la source a cui appartiene un host upstream"""
+    host = host.split(':')[0].lower()
+    for site, hosts in SITE_HOSTS.items():
+        if host in hosts:
+            return site
+    return None
+
+
+def match_fixture(site: str, path_and_query: str) -> Optional[Tuple[str, str]]:
+    """Ritorna (percorso fixture, content type) per una richiesta, o None"""
+    for route_site, pattern, fixture, ctype in _COMPILED_ROUTES:
+        if route_site == site and pattern.search(path_and_query):
+            return os.path.join(FIXTURE_DIR, fixture), ctype
+    return None
+
+
+def read_fixture(path: str) -> bytes:
+    """Legge (una sola volta) il contenuto di una fixture"""
+    data = _fixture_cache.get(path)
+    if data is None:
+        with open(path, 'rb') as f:
+            data = _fixture_cache[path] = f.read()
+    return data
+
+
+def _fixture_send(self, request, **kwargs):
+    """Sostituto di HTTPAdapter.send: risponde con le fixture senza accedere alla rete"""
+    parsed = requests.utils.urlparse(request.url)
+    site = site_for_host(parsed.netloc)
+    path_and_query = parsed.path + (f'?{parsed.query}' if parsed.query else '')
+    match = match_fixture(site, path_and_query) if site else None
+
+    response = requests.Response()
+    response.url = request.url
+    response.request = request
+    response.connection = self
+    if match:
+        body = read_fixture(match[0])
+        response.status_code = 200
+        response.headers['Content-Type'] = match[1]
+    else:
+        body = b'<html><body>Not Found</body></html>'
+        response.status_code = 404
+        response.headers['Content-Type'] = 'text/html'
+    response.headers['Content-Length'] = str(len(body))
+    response.raw = io.BytesIO(body)
+    response.encoding = 'utf-8'
+    response.reason = 'OK' if match else 'Not Found'
+    return response
+
+
+def install_fixture_transport() -> None:
+    """Sostituisce il trasporto HTTP di requests con le fixture registrate"""
+    requests.adapters.HTTPAdapter.send = _fixture_send
+    # Nessun upstream reale da proteggere: il rate limiter delle source falserebbe le misure
+    os.environ.setdefault('TOTTODRILLO_RATE_LIMIT', '0')
+
+
+def load_source_module(site: str):
+    """Importa lo script Python di una source dal suo percorso nel repository"""
+    path = os.path.join(REPO_DIR, site, f'{site}_source.py')
+    spec = importlib.util.spec_from_file_location(f'{site}_source', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_source_dir(site: str) -> str:
+    """Crea una source_dir temporanea (con i file JSON della source) per non sporcare il repository"""
+    source_dir = tempfile.mkdtemp(prefix=f'tottodrillo-{site}-')
+    atexit.register(shutil.rmtree, source_dir, True)
+    for name in os.listdir(os.path.join(REPO_DIR, site)):
+        if name.endswith('.json'):
+            shutil.copy(os.path.join(REPO_DIR, site, name), source_dir)
+    return source_dir
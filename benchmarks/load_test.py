@@ -0,0 +1,151 @@
+"""
+Generatore di carico: N utenti simulati che chiamano execute() di una source in parallelo
+
+Per default avvia in-process il server upstream locale (upstream_server.py) e punta la
+source verso di esso tramite il parametro base_url. Riporta throughput, tasso di errore
+e latenza p50/p95/p99 per metodo.
+
+Uso:
+    python benchmarks/load_test.py --source nswpedia --users 16 --requests 400 --latency-ms 120 --jitter-ms 40
+    python benchmarks/load_test.py --source vimms --base-url http://127.0.0.1:8765/vimms   # server già avviato
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fixture_routes  # noqa: E402
+import upstream_server  # noqa: E402
+
+# Mix di chiamate eseguite ciclicamente da ogni utente simulato
+SCENARIOS = {
+    'vimms': [
+        {'method': 'searchRoms', 'platforms': ['n64'], 'search_key': '', 'max_results': 50, 'page': 1},
+        {'method': 'searchRoms', 'search_key': 'zelda', 'max_results': 50, 'page': 2},
+        {'method': 'getEntry', 'slug': '1302'},
+    ],
+    'nswpedia': [
+        {'method': 'searchRoms', 'search_key': '', 'page': 1},
+        {'method': 'searchRoms', 'search_key': 'mario', 'page': 1},
+        {'method': 'getEntry', 'slug': 'rpg/xenoblade-chronicles-3-60'},
+    ],
+    'switchroms': [
+        {'method': 'searchRoms', 'search_key': '', 'page': 1},
+        {'method': 'getEntry', 'slug': 'xenoblade-chronicles-3'},
+    ],
+}
+
+
+def percentile(samples: List[float], quantile: float) -> float:
+    """Percentile con interpolazione lineare"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * quantile
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def run_load(source: str, base_url: str, users: int, total_requests: int, rate_limit: Any = False) -> Dict[str, Any]:
+    """Esegue il carico e ritorna latenze ed errori per metodo"""
+    module = fixture_routes.load_source_module(source)
+    source_dir = fixture_routes.make_source_dir(source)
+    scenario = SCENARIOS[source]
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+
+    def user(user_id: int) -> None:
+        while True:
+            n = next(counter)
+            if n >= total_requests:
+                return
+            # serve_policy false: ogni chiamata deve arrivare al server, non alle risposte salvate
+            params = dict(scenario[(n + user_id) % len(scenario)], source_dir=source_dir, base_url=base_url,
+                          rate_limit=rate_limit, serve_policy=False)
+            start = time.perf_counter()
+            result = module.execute(json.dumps(params))
+            elapsed = time.perf_counter() - start
+            method = params['method']
+            failed = '"error"' in result[:20]
+            with lock:
+                latencies.setdefault(method, []).append(elapsed)
+                if failed:
+                    errors[method] = errors.get(method, 0) + 1
+
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stderr(devnull):
+        with ThreadPoolExecutor(max_workers=users) as pool:
+            for future in [pool.submit(user, i) for i in range(users)]:
+                future.result()
+    wall = time.perf_counter() - start
+
+    report = {'source': source, 'users': users, 'requests': total_requests,
+              'wall_seconds': round(wall, 3), 'throughput_rps': round(total_requests / wall, 2), 'methods': {}}
+    for method, samples in sorted(latencies.items()):
+        report['methods'][method] = {
+            'count': len(samples),
+            'errors': errors.get(method, 0),
+            'p50_ms': round(percentile(samples, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(samples, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 1),
+            'max_ms': round(max(samples) * 1000, 1),
+        }
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', choices=sorted(SCENARIOS), default='vimms')
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--base-url', help='Usa un server upstream già avviato invece di avviarne uno in-process')
+    parser.add_argument('--rate-limit', help='Attiva il rate limiter delle source: RATE[:BURST] richieste/s per host')
+    parser.add_argument('--json', action='store_true')
+    upstream_server.add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server = upstream_server.UpstreamServer(config=upstream_server.config_from_args(args), seed=args.seed)
+        server.start_background()
+        base_url = server.base_url(args.source)
+
+    try:
+        rate_limit = False
+        if args.rate_limit:
+            rate, _, burst = args.rate_limit.partition(':')
+            rate_limit = {'rate': float(rate), 'burst': int(burst) if burst else None}
+        report = run_load(args.source, base_url, args.users, args.requests, rate_limit)
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+    if server:
+        report['upstream_requests'] = server.requests_served
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"source={report['source']} utenti={report['users']} richieste={report['requests']} "
+          f"durata={report['wall_seconds']}s throughput={report['throughput_rps']} req/s")
+    if 'upstream_requests' in report:
+        print(f"richieste upstream servite: {report['upstream_requests']}")
+    print(f"{'metodo':12} {'n':>6} {'errori':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for method, m in report['methods'].items():
+        print(f"{method:12} {m['count']:6d} {m['errors']:7d} {m['p50_ms']:9.1f} {m['p95_ms']:9.1f} {m['p99_ms']:9.1f} {m['max_ms']:9.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Server HTTP locale che sostituisce vimm.net, nswpedia.com e switchroms.io
+
+Serve le pagine di benchmarks/fixtures sotto un prefisso per source:
+    http://127.0.0.1:8765/vimms/...      (base_url della source vimms)
+    http://127.0.0.1:8765/nswpedia/...   (base_url della source nswpedia)
+    http://127.0.0.1:8765/switchroms/... (base_url della source switchroms)
+
+Gli URL assoluti degli upstream presenti nelle fixture vengono riscritti verso il server,
+così anche le pagine successive (download, link, immagini) restano in locale.
+Latenza, jitter, errori 5xx, 429 con Retry-After e redirect verso popup fuori dominio
+sono configurabili da riga di comando.
+
+Uso:
+    python benchmarks/upstream_server.py --port 8765 --latency-ms 150 --jitter-ms 50 --error-rate 0.02
+    python vimms/vimms_source.py '{"method":"searchRoms","source_dir":"vimms","platforms":["n64"],"base_url":"http://127.0.0.1:8765/vimms"}'
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fixture_routes  # noqa: E402
+
+DEFAULT_CONFIG = {
+    'latency_ms': 0.0,       # Latenza fissa aggiunta a ogni risposta
+    'jitter_ms': 0.0,        # Variazione casuale (+/-) della latenza
+    'error_rate': 0.0,       # Probabilità di rispondere 503
+    'rate_429': 0.0,         # Probabilità di rispondere 429 con Retry-After
+    'retry_after': 1,        # Valore dell'header Retry-After (secondi)
+    'popup_rate': 0.0,       # Probabilità di redirect a un popup fuori dominio (pagine download NSWpedia)
+    'bandwidth_kbps': 0.0,   # Limite di banda per risposta (0 = illimitata)
+}
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    """Gestisce le richieste verso le fixture applicando i comportamenti configurati"""
+
+    server_version = 'TottodrilloUpstream/1.0'
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_HEAD(self) -> None:
+        self._handle(send_body=False)
+
+    def do_GET(self) -> None:
+        self._handle(send_body=True)
+
+    def _handle(self, send_body: bool) -> None:
+        config = self.server.config
+        rng = self.server.rng
+
+        delay = config['latency_ms'] + rng.uniform(-config['jitter_ms'], config['jitter_ms'])
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        self.server.count_request()
+
+        if self.path.startswith('/popup'):
+            return self._send(200, b'<html><body><h1>Sponsored</h1></body></html>', 'text/html', send_body)
+        if rng.random() < config['rate_429']:
+            return self._send(429, b'Too Many Requests', 'text/plain', send_body,
+                              {'Retry-After': str(config['retry_after'])})
+        if rng.random() < config['error_rate']:
+            return self._send(503, b'Service Unavailable', 'text/plain', send_body)
+
+        site, _, rest = self.path.lstrip('/').partition('/')
+        path_and_query = '/' + rest
+        if site not in fixture_routes.SITE_HOSTS:
+            return self._send(404, b'Unknown site', 'text/plain', send_body)
+
+        if site == 'nswpedia' and path_and_query.startswith('/download/') and rng.random() < config['popup_rate']:
+            # Host diverso (localhost invece di 127.0.0.1): la source lo vede come dominio esterno
+            popup_url = f'http://localhost:{self.server.server_address[1]}/popup?from={site}'
+            return self._send(302, b'', 'text/html', send_body, {'Location': popup_url})
+
+        match = fixture_routes.match_fixture(site, path_and_query)
+        if not match:
+            return self._send(404, b'<html><body>Not Found</body></html>', 'text/html', send_body)
+        body = fixture_routes.read_fixture(match[0])
+        if match[1].startswith('text/html'):
+            body = self._rewrite_hosts(site, body)
+        self._send(200, body, match[1], send_body)
+
+    def _rewrite_hosts(self, site: str, body: bytes) -> bytes:
+        """Riscrive gli URL assoluti dell'upstream verso il prefisso locale della source"""
+        local_base = f'http://{self.headers.get("Host", "127.0.0.1")}/{site}'.encode()
+        for host in fixture_routes.SITE_HOSTS[site]:
+            body = body.replace(b'https://' + host.encode(), local_base)
+            body = body.replace(b'"//' + host.encode(), b'"' + local_base)
+        return body
+
+    def _send(self, status: int, body: bytes, content_type: str, send_body: bool,
+              headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not send_body or not body:
+            return
+        bandwidth = self.server.config['bandwidth_kbps']
+        if bandwidth <= 0:
+            self.wfile.write(body)
+            return
+        chunk_size = 16 * 1024
+        for i in range(0, len(body), chunk_size):
+            chunk = body[i:i + chunk_size]
+            self.wfile.write(chunk)
+            time.sleep(len(chunk) / (bandwidth * 1024.0))
+
+
+class UpstreamServer(ThreadingHTTPServer):
+    """Server upstream locale con configurazione modificabile a runtime"""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, config: Optional[Dict[str, Any]] = None,
+                 seed: Optional[int] = None, verbose: bool = False):
+        super().__init__((host, port), UpstreamHandler)
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        self.rng = random.Random(seed)
+        self.verbose = verbose
+        self.requests_served = 0
+        self._count_lock = threading.Lock()
+
+    def count_request(self) -> None:
+        with self._count_lock:
+            self.requests_served += 1
+
+    def base_url(self, site: str) -> str:
+        """Ritorna il base_url da passare alla source indicata"""
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/{site}'
+
+    def start_background(self) -> threading.Thread:
+        """Avvia il server in un thread daemon"""
+        thread = threading.Thread(target=self.serve_forever, name='upstream-server', daemon=True)
+        thread.start()
+        return thread
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    """Aggiunge le opzioni di comportamento del server a un parser"""
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--popup-rate', type=float, default=0.0)
+    parser.add_argument('--bandwidth-kbps', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def config_from_args(args: argparse.Namespace) -> Dict[str, Any]:
+    """Costruisce la configurazione del server dalle opzioni di riga di comando"""
+    return {key: getattr(args, key) for key in DEFAULT_CONFIG}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--verbose', action='store_true')
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = UpstreamServer(args.host, args.port, config_from_args(args), seed=args.seed, verbose=args.verbose)
+    print(f"Server upstream in ascolto su http://{args.host}:{server.server_address[1]}")
+    for site in fixture_routes.SITE_HOSTS:
+        print(f"  {site:11} base_url = {server.base_url(site)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,14 +2,22 @@
 Wrapper Python per integrare NSWpedia.com come sorgente Tottodrillo
 Implementa l'interfaccia SourceExecutor
 """
+import copy
+import email.utils
+import hashlib
 import json
 import re
 import sys
 import os
+import random
+import threading
+import time
 import urllib.parse
-from typing import Dict, Any, List, Optional
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Optional, Tuple, Callable, FrozenSet
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
 def get_random_ua() -> str:
     """Genera un User-Agent casuale"""
@@ -41,6 +49,1550 @@ def get_browser_headers(referer: Optional[str] = None) -> Dict[str, str]:
         headers["Referer"] = referer
     return headers
 
+# Identificativo della source usato come label nelle metriche
+SOURCE_ID = "nswpedia"
+
+# Registro metriche in-process: contatori e istogrammi di latenza per source/metodo/host
+# È condiviso da tutte le chiamate a execute() nello stesso interprete
+_metrics_lock = threading.Lock()
+_metrics_counters: Dict[tuple, float] = {}
+_metrics_histograms: Dict[tuple, Dict[str, Any]] = {}
+_metrics_started_at = time.time()
+
+# Limiti superiori (in secondi) dei bucket degli istogrammi di latenza
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0, float('inf'))
+
+# Contesto della chiamata execute() corrente (metodo in esecuzione, ecc.)
+_request_context = threading.local()
+
+def current_method() -> str:
+    """Ritorna il metodo execute() in esecuzione nel thread corrente"""
+    return getattr(_request_context, 'method', None) or 'unknown'
+
+# Campi del contesto copiati nei thread worker avviati durante una chiamata
+REQUEST_CONTEXT_FIELDS = ('method', 'base_url', 'source_dir', 'rate_limit', 'deadline')
+
+def run_with_context(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Avvolge func perché giri in un thread worker con il contesto della chiamata corrente"""
+    context = {name: getattr(_request_context, name, None) for name in REQUEST_CONTEXT_FIELDS}
+
+    def wrapper(*args, **kwargs):
+        for name, value in context.items():
+            setattr(_request_context, name, value)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            for name in context:
+                setattr(_request_context, name, None)
+    return wrapper
+
+def metrics_inc(name: str, labels: Dict[str, str], value: float = 1) -> None:
+    """Incrementa un contatore del registro metriche"""
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        _metrics_counters[key] = _metrics_counters.get(key, 0) + value
+
+def metrics_observe(name: str, labels: Dict[str, str], seconds: float) -> None:
+    """Registra una latenza (in secondi) nell'istogramma indicato"""
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        histogram = _metrics_histograms.get(key)
+        if histogram is None:
+            histogram = {'buckets': [0] * len(LATENCY_BUCKETS), 'count': 0, 'sum': 0.0, 'max': 0.0}
+            _metrics_histograms[key] = histogram
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][i] += 1
+                break
+        histogram['count'] += 1
+        histogram['sum'] += seconds
+        histogram['max'] = max(histogram['max'], seconds)
+
+def _histogram_percentile(histogram: Dict[str, Any], quantile: float) -> Optional[float]:
+    """Stima un percentile dai bucket (limite superiore del bucket che lo contiene)"""
+    if not histogram['count']:
+        return None
+    target = quantile * histogram['count']
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+        cumulative += count
+        if cumulative >= target:
+            return min(bound, histogram['max'])
+    return histogram['max']
+
+def metrics_snapshot() -> Dict[str, Any]:
+    """Ritorna una copia serializzabile del registro metriche"""
+    with _metrics_lock:
+        counters = [
+            {'name': name, 'labels': dict(labels), 'value': value}
+            for (name, labels), value in sorted(_metrics_counters.items())
+        ]
+        histograms = []
+        for (name, labels), histogram in sorted(_metrics_histograms.items()):
+            histograms.append({
+                'name': name,
+                'labels': dict(labels),
+                'count': histogram['count'],
+                'sum': round(histogram['sum'], 6),
+                'max': round(histogram['max'], 6),
+                'p50': _histogram_percentile(histogram, 0.50),
+                'p95': _histogram_percentile(histogram, 0.95),
+                'p99': _histogram_percentile(histogram, 0.99),
+            })
+    return {
+        'source': SOURCE_ID,
+        'uptime_seconds': round(time.time() - _metrics_started_at, 3),
+        'counters': counters,
+        'histograms': histograms
+    }
+
+def _prometheus_labels(labels: tuple, extra: Optional[Dict[str, str]] = None) -> str:
+    """Formatta le label nel formato testuale Prometheus"""
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ''
+    escaped = []
+    for k, v in items:
+        value = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{k}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+def write_prometheus_file(path: str) -> str:
+    """Scrive il registro metriche in formato testuale Prometheus (scrittura atomica)"""
+    lines = []
+    with _metrics_lock:
+        typed = set()
+        for (name, labels), value in sorted(_metrics_counters.items()):
+            metric = f'tottodrillo_{name}'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} counter')
+                typed.add(metric)
+            lines.append(f'{metric}{_prometheus_labels(labels)} {value}')
+        for (name, labels), histogram in sorted(_metrics_histograms.items()):
+            metric = f'tottodrillo_{name}'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} histogram')
+                typed.add(metric)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else str(bound)
+                lines.append(f'{metric}_bucket{_prometheus_labels(labels, {"le": le})} {cumulative}')
+            lines.append(f'{metric}_sum{_prometheus_labels(labels)} {histogram["sum"]}')
+            lines.append(f'{metric}_count{_prometheus_labels(labels)} {histogram["count"]}')
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+    return path
+
+# Directory (dentro source_dir) per i dati persistenti della source
+CACHE_DIR_NAME = 'cache'
+
+def get_cache_dir(source_dir: Optional[str] = None) -> Optional[str]:
+    """Ritorna (creandola) la directory cache della source, o None se source_dir non è noto"""
+    source_dir = source_dir or getattr(_request_context, 'source_dir', None)
+    if not source_dir:
+        return None
+    cache_dir = os.path.join(source_dir, CACHE_DIR_NAME)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError:
+        return None
+    return cache_dir
+
+def write_json_atomic(path: str, data: Any) -> None:
+    """Scrive un file JSON passando da un file temporaneo (mai file troncati)"""
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+# Rate limiter per host (token bucket) applicato da http_get a tutte le richieste.
+# Su 429/503 il rate si dimezza e Retry-After blocca l'host; con le risposte OK il rate
+# risale gradualmente. I rate appresi sono salvati in cache/rate_limits.json.
+# Configurabile per chiamata ("rate_limit": {"rate": 2, "burst": 5}) o con la variabile
+# d'ambiente TOTTODRILLO_RATE_LIMIT="rate[:burst]" ("0" lo disattiva)
+RATE_LIMIT_ENV_VAR = 'TOTTODRILLO_RATE_LIMIT'
+RATE_LIMIT_DEFAULT_RATE = 2.0  # Richieste al secondo per host
+RATE_LIMIT_DEFAULT_BURST = 5
+RATE_LIMIT_MIN_RATE = 0.1
+RATE_LIMIT_DECREASE_FACTOR = 0.5
+RATE_LIMIT_INCREASE_STEP = 0.05  # Richieste/s recuperate per ogni risposta OK
+RATE_LIMIT_MAX_WAIT = 30.0  # Attesa massima prima di una richiesta (secondi)
+RATE_LIMIT_THROTTLE_STATUS = (429, 503)
+RATE_LIMITS_FILE = 'rate_limits.json'
+
+_rate_limit_lock = threading.Lock()
+_rate_limiters = {}  # host -> TokenBucket
+_learned_rates = {}  # host -> rate letto da rate_limits.json
+_rate_limits_loaded = set()  # source_dir già letti
+_rate_limits_dirty = False
+
+class TokenBucket:
+    """Token bucket di un host con rate adattivo e blocco temporaneo da Retry-After"""
+    __slots__ = ('lock', 'max_rate', 'burst', 'rate', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, max_rate: float, burst: int, rate: Optional[float] = None):
+        self.lock = threading.Lock()
+        self.max_rate = max_rate
+        self.burst = burst
+        self.rate = max(RATE_LIMIT_MIN_RATE, min(rate or max_rate, max_rate))
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def configure(self, max_rate: float, burst: int) -> None:
+        with self.lock:
+            self.max_rate = max_rate
+            self.burst = burst
+            self.rate = min(self.rate, max_rate)
+
+    def acquire(self) -> float:
+        """Prenota un token e ritorna i secondi da attendere prima della richiesta"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return min(max(wait, self.blocked_until - now), RATE_LIMIT_MAX_WAIT)
+
+    def on_throttled(self, retry_after: Optional[float]) -> None:
+        """Riduce il rate dopo un 429/503 e blocca l'host per Retry-After secondi"""
+        with self.lock:
+            self.rate = max(RATE_LIMIT_MIN_RATE, self.rate * RATE_LIMIT_DECREASE_FACTOR)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def on_success(self) -> bool:
+        """Fa risalire il rate dopo una risposta OK; ritorna True se il rate è cambiato"""
+        with self.lock:
+            if self.rate >= self.max_rate:
+                return False
+            self.rate = min(self.max_rate, self.rate + RATE_LIMIT_INCREASE_STEP)
+            return True
+
+def rate_limit_config() -> Optional[Tuple[float, int]]:
+    """Ritorna (rate, burst) per la chiamata corrente, o None se il rate limiter è disattivato"""
+    config = getattr(_request_context, 'rate_limit', None)
+    if config is None:
+        env_value = os.environ.get(RATE_LIMIT_ENV_VAR, '').strip()
+        if env_value:
+            rate, _, burst = env_value.partition(':')
+            config = {'rate': rate, 'burst': burst or None}
+    if config is False:
+        return None
+    if not isinstance(config, dict):
+        config = {}
+    try:
+        rate = float(config.get('rate') if config.get('rate') is not None else RATE_LIMIT_DEFAULT_RATE)
+        burst = int(config.get('burst') or RATE_LIMIT_DEFAULT_BURST)
+    except (TypeError, ValueError):
+        rate, burst = RATE_LIMIT_DEFAULT_RATE, RATE_LIMIT_DEFAULT_BURST
+    if rate <= 0:
+        return None
+    return rate, max(1, burst)
+
+def load_rate_limits() -> None:
+    """Legge (una volta per source_dir) i rate appresi nelle chiamate precedenti"""
+    cache_dir = get_cache_dir()
+    if not cache_dir or cache_dir in _rate_limits_loaded:
+        return
+    _rate_limits_loaded.add(cache_dir)
+    path = os.path.join(cache_dir, RATE_LIMITS_FILE)
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ [rate_limit] Impossibile leggere {path}: {e}", file=sys.stderr)
+        return
+    with _rate_limit_lock:
+        for host, state in saved.items():
+            if isinstance(state, dict) and isinstance(state.get('rate'), (int, float)):
+                _learned_rates[host] = float(state['rate'])
+                if host in _rate_limiters:
+                    bucket = _rate_limiters[host]
+                    bucket.rate = max(RATE_LIMIT_MIN_RATE, min(bucket.rate, _learned_rates[host]))
+
+def save_rate_limits() -> None:
+    """Salva i rate appresi in cache/rate_limits.json se sono cambiati"""
+    global _rate_limits_dirty
+    if not _rate_limits_dirty:
+        return
+    cache_dir = get_cache_dir()
+    if not cache_dir:
+        return
+    with _rate_limit_lock:
+        _rate_limits_dirty = False
+        state = {host: {'rate': round(bucket.rate, 4), 'max_rate': bucket.max_rate, 'updated': round(time.time())}
+                 for host, bucket in _rate_limiters.items()}
+    try:
+        write_json_atomic(os.path.join(cache_dir, RATE_LIMITS_FILE), state)
+    except OSError as e:
+        print(f"⚠️ [rate_limit] Impossibile salvare i rate: {e}", file=sys.stderr)
+
+def get_rate_limiter(host: str) -> Optional[TokenBucket]:
+    """Ritorna il token bucket dell'host (None se il rate limiter è disattivato)"""
+    config = rate_limit_config()
+    if config is None:
+        return None
+    load_rate_limits()
+    with _rate_limit_lock:
+        bucket = _rate_limiters.get(host)
+        if bucket is None:
+            bucket = _rate_limiters[host] = TokenBucket(config[0], config[1], _learned_rates.get(host))
+        elif (bucket.max_rate, bucket.burst) != config:
+            bucket.configure(*config)
+    return bucket
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Converte l'header Retry-After (secondi o data HTTP) in secondi"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+def rate_limit_feedback(limiter: TokenBucket, response: requests.Response, labels: Dict[str, str]) -> None:
+    """Adatta il rate dell'host in base all'esito della risposta"""
+    global _rate_limits_dirty
+    if response.status_code in RATE_LIMIT_THROTTLE_STATUS:
+        limiter.on_throttled(parse_retry_after(response.headers.get('Retry-After')))
+        metrics_inc('rate_limit_throttled_total', dict(labels, status=str(response.status_code)))
+        _rate_limits_dirty = True
+    elif response.status_code < 400 and limiter.on_success():
+        _rate_limits_dirty = True
+
+def rate_limit_snapshot() -> Dict[str, Any]:
+    """Stato dei token bucket per host (per getStats)"""
+    with _rate_limit_lock:
+        return {host: {'rate': round(bucket.rate, 4), 'max_rate': bucket.max_rate, 'burst': bucket.burst,
+                       'blocked_for_seconds': round(max(0.0, bucket.blocked_until - time.monotonic()), 3)}
+                for host, bucket in _rate_limiters.items()}
+
+# Politica di retry condivisa: backoff esponenziale con jitter, budget di retry per
+# chiamata execute() e classificazione degli errori ritentabili
+RETRY_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5  # Secondi prima del secondo tentativo (raddoppia a ogni tentativo)
+RETRY_MAX_DELAY = 8.0
+RETRY_BUDGET_PER_CALL = 6  # Retry totali consentiti in una chiamata execute()
+RETRIABLE_STATUS = (408, 425, 429, 500, 502, 503, 504)
+
+class RetryableError(Exception):
+    """Tentativo fallito ma ripetibile (pagina incompleta, redirect verso un popup, ...)"""
+
+class RetryPolicy:
+    """Esegue una funzione ritentando gli errori transitori con backoff esponenziale e jitter"""
+
+    def __init__(self, max_attempts: int = RETRY_MAX_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @staticmethod
+    def classify(error: Exception) -> Optional[str]:
+        """Ritorna il motivo del retry, o None se l'errore non è ritentabile"""
+        if isinstance(error, RetryableError):
+            return type(error).__name__
+        if isinstance(error, requests.HTTPError):
+            status = error.response.status_code if error.response is not None else None
+            return f'http_{status}' if status in RETRIABLE_STATUS else None
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return type(error).__name__
+        return None
+
+    def delay(self, attempt: int, error: Exception) -> float:
+        """Attesa prima del tentativo successivo (rispetta Retry-After se presente)"""
+        backoff = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        wait = random.uniform(backoff / 2, backoff)
+        response = getattr(error, 'response', None)
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after:
+                wait = max(wait, min(retry_after, self.max_delay))
+        return wait
+
+    def run(self, func: Callable[[], Any], description: str = '') -> Any:
+        """Chiama func() finché riesce, l'errore non è ritentabile o tentativi/budget sono esauriti"""
+        attempt = 1
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                reason = self.classify(e)
+                if reason is None or attempt >= self.max_attempts or not consume_retry_budget():
+                    raise
+                wait = self.delay(attempt, e)
+                check_deadline(wait)
+                metrics_inc('retries_total', {'source': SOURCE_ID, 'method': current_method(), 'reason': reason})
+                print(f"⚠️ [retry] {description or 'richiesta'}: {e} - riprovo tra {wait:.1f}s "
+                      f"(tentativo {attempt + 1}/{self.max_attempts})", file=sys.stderr)
+                time.sleep(wait)
+                attempt += 1
+
+def consume_retry_budget() -> bool:
+    """Consuma un retry dal budget della chiamata corrente; False se esaurito"""
+    budget = getattr(_request_context, 'retry_budget', None)
+    if budget is None:
+        return True
+    if budget <= 0:
+        return False
+    _request_context.retry_budget = budget - 1
+    return True
+
+def fetch_with_retry(url: str, session: Optional[requests.Session] = None,
+                     policy: Optional[RetryPolicy] = None, **kwargs) -> requests.Response:
+    """
+    http_get con retry sugli errori transitori (rete, timeout, 429/5xx)
+    Le risposte con altri status vengono restituite al chiamante così come sono
+    """
+    def attempt() -> requests.Response:
+        response = http_get(url, session=session, **kwargs)
+        if response.status_code in RETRIABLE_STATUS:
+            response.raise_for_status()
+        return response
+    return (policy or RetryPolicy()).run(attempt, url)
+
+class OffDomainRedirectError(RetryableError):
+    """Redirect verso un dominio esterno (popup pubblicitario) invece della pagina richiesta"""
+
+def same_site_host(host: str, allowed_hosts: FrozenSet[str]) -> bool:
+    """Verifica se host coincide con uno dei domini ammessi o ne è un sottodominio"""
+    return any(host == allowed or host.endswith('.' + allowed) for allowed in allowed_hosts)
+
+
+def fetch_same_site(url: str, session: Optional[requests.Session] = None, max_redirects: int = 5,
+                    **kwargs) -> requests.Response:
+    """
+    GET che segue i redirect manualmente, controllando l'header Location prima di seguirlo
+    Un redirect fuori dal dominio solleva OffDomainRedirectError senza scaricare il popup
+    """
+    allowed_hosts = frozenset(
+        re.sub(r'^www\.', '', (urllib.parse.urlparse(u).hostname or '').lower()) for u in (url, get_base_url())
+    ) - {''}
+    kwargs['allow_redirects'] = False
+    for _ in range(max_redirects + 1):
+        response = http_get(url, session=session, **kwargs)
+        if not response.is_redirect:
+            return response
+        location = urllib.parse.urljoin(url, response.headers.get('Location', ''))
+        response.close()
+        host = (urllib.parse.urlparse(location).hostname or '').lower()
+        if not same_site_host(host, allowed_hosts):
+            metrics_inc('popup_redirects_total', {'source': SOURCE_ID, 'host': host})
+            raise OffDomainRedirectError(f"redirect fuori dal dominio: {location}")
+        url = location
+    raise requests.TooManyRedirects(f"troppi redirect per {url}")
+
+# Circuit breaker per host: dopo CIRCUIT_FAILURE_THRESHOLD fallimenti consecutivi (errori di
+# rete, timeout, 5xx) le richieste verso l'host falliscono subito con SourceUnavailableError;
+# trascorso il cooldown passa una sola richiesta di prova (half-open) che lo richiude o riapre
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN_SECONDS = 30.0
+CIRCUIT_FAILURE_STATUS = (500, 502, 503, 504)
+LAST_GOOD_CACHE_SIZE = 64  # Risposte recenti riusate quando la sorgente non è raggiungibile
+REQUEST_KEY_IGNORED_PARAMS = ('source_dir', 'profile', 'rate_limit', 'prometheus_file', 'refresh', 'serve_policy',
+                              'deadline_ms')
+
+_circuit_lock = threading.Lock()
+_circuit_breakers = {}  # host -> CircuitBreaker
+_last_good_lock = threading.Lock()
+_last_good_responses = OrderedDict()  # chiave richiesta -> risposta JSON
+
+class SourceUnavailableError(Exception):
+    """L'host upstream è considerato non raggiungibile (circuit breaker aperto)"""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"Sorgente non disponibile: {host} (nuovo tentativo tra {retry_in:.0f}s)")
+        self.host = host
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """Stato del circuit breaker di un host: closed, open o half_open"""
+    __slots__ = ('host', 'lock', 'state', 'failures', 'opened_at', 'probe_in_flight', 'last_error')
+
+    def __init__(self, host: str):
+        self.host = host
+        self.lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.last_error = None
+
+    def before_request(self) -> None:
+        """Solleva SourceUnavailableError se l'host è giù; in half-open lascia passare una sola prova"""
+        with self.lock:
+            if self.state == 'closed':
+                return
+            retry_in = self.opened_at + CIRCUIT_COOLDOWN_SECONDS - time.monotonic()
+            if self.state == 'open' and retry_in <= 0:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return
+            raise SourceUnavailableError(self.host, max(0.0, retry_in))
+
+    def release_probe(self) -> None:
+        """Libera la richiesta di prova half-open senza cambiare stato (richiesta non eseguita)"""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self.lock:
+            if self.state != 'closed':
+                print(f"✅ [circuit] {self.host} di nuovo raggiungibile", file=sys.stderr)
+            self.state = 'closed'
+            self.failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self, reason: str) -> None:
+        with self.lock:
+            self.failures += 1
+            self.last_error = reason
+            self.probe_in_flight = False
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= CIRCUIT_FAILURE_THRESHOLD):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                metrics_inc('circuit_opened_total', {'source': SOURCE_ID, 'host': self.host})
+                print(f"⛔ [circuit] {self.host} non disponibile dopo {self.failures} errori ({reason})", file=sys.stderr)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            retry_in = self.opened_at + CIRCUIT_COOLDOWN_SECONDS - time.monotonic() if self.state == 'open' else 0.0
+            return {'state': self.state, 'consecutive_failures': self.failures,
+                    'retry_in_seconds': round(max(0.0, retry_in), 3), 'last_error': self.last_error}
+
+def get_circuit_breaker(host: str) -> CircuitBreaker:
+    with _circuit_lock:
+        breaker = _circuit_breakers.get(host)
+        if breaker is None:
+            breaker = _circuit_breakers[host] = CircuitBreaker(host)
+        return breaker
+
+def circuit_snapshot() -> Dict[str, Any]:
+    """Stato dei circuit breaker per host (per getCircuitState e getStats)"""
+    with _circuit_lock:
+        breakers = list(_circuit_breakers.values())
+    return {breaker.host: breaker.snapshot() for breaker in breakers}
+
+def request_cache_key(params: Dict[str, Any]) -> str:
+    """Chiave normalizzata di una richiesta execute() (senza i parametri che non cambiano la risposta)"""
+    return json.dumps({k: v for k, v in params.items() if k not in REQUEST_KEY_IGNORED_PARAMS},
+                      sort_keys=True, default=str)
+
+def remember_good_response(params: Dict[str, Any], result: str) -> None:
+    """Conserva l'ultima risposta valida di una richiesta per i periodi di indisponibilità"""
+    key = request_cache_key(params)
+    with _last_good_lock:
+        _last_good_responses[key] = result
+        _last_good_responses.move_to_end(key)
+        while len(_last_good_responses) > LAST_GOOD_CACHE_SIZE:
+            _last_good_responses.popitem(last=False)
+
+def source_unavailable_response(params: Dict[str, Any], error: SourceUnavailableError) -> str:
+    """Risposta per sorgente non disponibile: l'ultima risposta valida se presente, altrimenti un errore strutturato"""
+    with _last_good_lock:
+        cached = _last_good_responses.get(request_cache_key(params))
+    if cached is not None:
+        data = json.loads(cached)
+        data["source_unavailable"] = True
+        return dumps_json(data, compact=response_schema(params) >= RESPONSE_SCHEMA_COMPACT)
+    return json.dumps({
+        "error": str(error),
+        "error_code": "source_unavailable",
+        "host": error.host,
+        "retry_after_seconds": round(error.retry_in, 1)
+    })
+
+# Cache negativa: getEntry con entry null (slug inesistente, 404) e ricerche senza risultati
+# vengono ricordati per un breve periodo, così lo stesso slug morto non viene richiesto a ogni
+# visualizzazione. Solo risposte ottenute senza errori upstream; "refresh": true la ignora
+NEGATIVE_CACHE_TTL = {'getEntry': 600.0, 'searchRoms': 300.0}  # Secondi per metodo
+NEGATIVE_CACHE_SIZE = 256
+NEGATIVE_RESULT_MAX_LENGTH = 512  # Le risposte vuote sono piccole: le altre non vengono analizzate
+
+_negative_lock = threading.Lock()
+_negative_results = OrderedDict()  # chiave richiesta -> (scadenza, risposta JSON)
+
+def is_negative_result(method: str, result: str) -> bool:
+    """True se la risposta è un "non trovato": entry null o nessun risultato"""
+    if len(result) > NEGATIVE_RESULT_MAX_LENGTH:
+        return False
+    try:
+        data = json.loads(result)
+    except ValueError:
+        return False
+    if not isinstance(data, dict) or 'error' in data:
+        return False
+    if method == 'getEntry':
+        return 'entry' in data and data['entry'] is None
+    return not (data.get('results') or data.get('roms'))
+
+def cached_negative_result(method: str, params: Dict[str, Any]) -> Optional[str]:
+    """Risposta negativa ancora valida per la richiesta, o None"""
+    if method not in NEGATIVE_CACHE_TTL or params.get("refresh", False):
+        return None
+    key = request_cache_key(params)
+    with _negative_lock:
+        cached = _negative_results.get(key)
+        if cached and cached[0] <= time.monotonic():
+            del _negative_results[key]
+            cached = None
+    metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'negative', 'result': 'hit' if cached else 'miss'})
+    return cached[1] if cached else None
+
+def remember_negative_result(method: str, params: Dict[str, Any], result: str) -> None:
+    if method not in NEGATIVE_CACHE_TTL or not is_negative_result(method, result):
+        return
+    key = request_cache_key(params)
+    with _negative_lock:
+        _negative_results[key] = (time.monotonic() + NEGATIVE_CACHE_TTL[method], result)
+        _negative_results.move_to_end(key)
+        while len(_negative_results) > NEGATIVE_CACHE_SIZE:
+            _negative_results.popitem(last=False)
+
+# Single-flight: chiamate identiche e contemporanee di searchRoms/getEntry (es. prefetch della
+# lista e schermata di dettaglio) condividono un'unica richiesta upstream. La prima chiamata
+# esegue il lavoro, le altre attendono il suo risultato (o la sua eccezione)
+SINGLE_FLIGHT_METHODS = ('searchRoms', 'getEntry')
+
+_inflight_lock = threading.Lock()
+_inflight = {}  # chiave richiesta -> _Flight
+
+class _Flight:
+    """Una chiamata in corso e il suo esito, condiviso con le chiamate identiche"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.upstream_failed = False
+
+def single_flight(method: str, params: Dict[str, Any], func: Callable[[], str]) -> str:
+    """Esegue func una sola volta per tutte le chiamate identiche in corso nello stesso processo"""
+    if method not in SINGLE_FLIGHT_METHODS:
+        return func()
+    key = request_cache_key(params)
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+    metrics_inc('singleflight_requests_total', {'source': SOURCE_ID, 'method': method,
+                                                'role': 'leader' if leader else 'follower'})
+    if not leader:
+        print(f"🔗 [single_flight] {method} già in corso, attendo il risultato condiviso", file=sys.stderr)
+        remaining = remaining_time()
+        if not flight.done.wait(max(0.0, remaining) if remaining is not None else None):
+            raise DeadlineExceededError("Tempo massimo della richiesta (deadline_ms) esaurito")
+        if flight.upstream_failed:
+            _request_context.upstream_failed = True
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    try:
+        flight.result = func()
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        flight.upstream_failed = getattr(_request_context, 'upstream_failed', False)
+        with _inflight_lock:
+            del _inflight[key]
+        flight.done.set()
+
+# Politica di servizio di searchRoms/getEntry: le risposte valide sono salvate in cache/responses.
+# Entro ttl_seconds vengono restituite senza contattare la sorgente; oltre il TTL (fino a
+# max_stale_seconds) escono subito con "stale": true mentre un thread le aggiorna; se la rete
+# non risponde si usa qualsiasi copia salvata con "offline": true. Configurabile per metodo in
+# SERVE_POLICY o per chiamata ("serve_policy": {...}, false la disattiva); "refresh": true
+# salta le copie salvate ma mantiene il fallback offline
+SERVE_POLICY = {
+    'searchRoms': {'ttl_seconds': 300, 'max_stale_seconds': 24 * 3600, 'stale_while_revalidate': True, 'offline': True},
+    'getEntry': {'ttl_seconds': 900, 'max_stale_seconds': 7 * 24 * 3600, 'stale_while_revalidate': True, 'offline': True},
+}
+RESPONSE_STORE_DIR = 'responses'
+RESPONSE_STORE_MAX_FILES = 500
+RESPONSE_STORE_MEMORY_SIZE = 64
+
+_response_store_lock = threading.Lock()
+_stored_responses = OrderedDict()  # chiave richiesta -> (salvata il, risposta JSON)
+_response_store_writes = 0
+
+def serve_policy(method: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Politica di servizio della chiamata, o None se disattivata"""
+    policy = SERVE_POLICY.get(method)
+    override = params.get("serve_policy")
+    if policy is None or override is False:
+        return None
+    policy = dict(policy)
+    if isinstance(override, dict):
+        policy.update({k: v for k, v in override.items() if k in policy})
+    if params.get("refresh", False):
+        policy.update(ttl_seconds=0, stale_while_revalidate=False)
+    return policy
+
+def response_store_path(key: str, source_dir: Optional[str]) -> Optional[str]:
+    cache_dir = get_cache_dir(source_dir)
+    if not cache_dir:
+        return None
+    store_dir = os.path.join(cache_dir, RESPONSE_STORE_DIR)
+    os.makedirs(store_dir, exist_ok=True)
+    return os.path.join(store_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+def load_stored_response(params: Dict[str, Any]) -> Optional[Tuple[float, str]]:
+    """Ritorna (timestamp di salvataggio, risposta) dalla memoria o da cache/responses"""
+    key = request_cache_key(params)
+    with _response_store_lock:
+        stored = _stored_responses.get(key)
+    if stored:
+        return stored
+    try:
+        with open(response_store_path(key, params.get("source_dir")), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        stored = (float(data['stored_at']), data['result'])
+    except (TypeError, OSError, ValueError, KeyError):
+        return None
+    with _response_store_lock:
+        _stored_responses[key] = stored
+        while len(_stored_responses) > RESPONSE_STORE_MEMORY_SIZE:
+            _stored_responses.popitem(last=False)
+    return stored
+
+def store_response(params: Dict[str, Any], result: str) -> None:
+    """Salva una risposta valida; oltre RESPONSE_STORE_MAX_FILES elimina le più vecchie"""
+    global _response_store_writes
+    key = request_cache_key(params)
+    stored = (time.time(), result)
+    with _response_store_lock:
+        _stored_responses[key] = stored
+        _stored_responses.move_to_end(key)
+        while len(_stored_responses) > RESPONSE_STORE_MEMORY_SIZE:
+            _stored_responses.popitem(last=False)
+        _response_store_writes += 1
+        prune = _response_store_writes % 50 == 0
+    try:
+        path = response_store_path(key, params.get("source_dir"))
+        if not path:
+            return
+        write_json_atomic(path, {'stored_at': stored[0], 'result': result})
+        if prune:
+            store_dir = os.path.dirname(path)
+            files = sorted((os.path.join(store_dir, name) for name in os.listdir(store_dir)), key=os.path.getmtime)
+            for old in files[:-RESPONSE_STORE_MAX_FILES]:
+                os.remove(old)
+    except OSError as e:
+        print(f"⚠️ [store_response] Impossibile salvare la risposta: {e}", file=sys.stderr)
+
+def flag_response(result: str, params: Dict[str, Any], flag: str, stored_at: float) -> str:
+    """Aggiunge a una risposta salvata il flag indicato ("stale"/"offline") e la sua età"""
+    data = json.loads(result)
+    data[flag] = True
+    data["cached_age_seconds"] = int(max(0, time.time() - stored_at))
+    return dumps_json(data, compact=response_schema(params) >= RESPONSE_SCHEMA_COMPACT)
+
+def revalidate_in_background(method: str, params: Dict[str, Any]) -> None:
+    """Aggiorna in un thread la risposta salvata, condividendo l'eventuale richiesta identica in corso"""
+    def refresh() -> None:
+        _request_context.deadline = None
+        _request_context.retry_budget = RETRY_BUDGET_PER_CALL
+        _request_context.upstream_failed = False
+        try:
+            result = single_flight(method, params, lambda: dispatch_method(method, params, params.get("source_dir")))
+            if (not result.startswith('{"error"') and not _request_context.upstream_failed
+                    and not is_negative_result(method, result)):
+                store_response(params, result)
+                metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'responses', 'result': 'revalidated'})
+        except Exception as e:
+            print(f"⚠️ [revalidate] Aggiornamento di {method} fallito: {e}", file=sys.stderr)
+        finally:
+            save_rate_limits()
+
+    threading.Thread(target=run_with_context(refresh), daemon=True).start()
+
+def serve_stored_response(method: str, params: Dict[str, Any], policy: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Risposta salvata ancora valida (fresca, o scaduta con "stale": true), o None"""
+    stored = load_stored_response(params) if policy else None
+    if not stored:
+        return None
+    age = time.time() - stored[0]
+    labels = {'source': SOURCE_ID, 'cache': 'responses'}
+    if age < float(policy['ttl_seconds']):
+        metrics_inc('cache_requests_total', dict(labels, result='hit'))
+        return stored[1]
+    if policy['stale_while_revalidate'] and age < float(policy['ttl_seconds']) + float(policy['max_stale_seconds']):
+        metrics_inc('cache_requests_total', dict(labels, result='stale'))
+        print(f"♻️ [serve_stored_response] {method}: copia scaduta da {int(age)}s, aggiorno in background", file=sys.stderr)
+        revalidate_in_background(method, params)
+        return flag_response(stored[1], params, 'stale', stored[0])
+    return None
+
+def offline_response(params: Dict[str, Any], policy: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Qualsiasi copia salvata, con "offline": true, quando la sorgente non risponde"""
+    stored = load_stored_response(params) if policy and policy['offline'] else None
+    if not stored:
+        return None
+    metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'responses', 'result': 'offline'})
+    print("📴 [offline_response] Sorgente non raggiungibile, uso la copia salvata", file=sys.stderr)
+    return flag_response(stored[1], params, 'offline', stored[0])
+
+# Timeout adattivi per (host, endpoint): il read timeout è il p99 delle latenze recenti
+# moltiplicato per TIMEOUT_P99_FACTOR, limitato tra TIMEOUT_MIN_SECONDS e il timeout
+# predefinito della chiamata (usato finché non ci sono abbastanza campioni, e per
+# TIMEOUT_RECOVERY_SECONDS dopo un timeout, così le risposte lente tornano a essere misurate).
+# Il parametro "deadline_ms" di execute() limita il tempo totale di tutte le richieste
+CONNECT_TIMEOUT_SECONDS = 5.0
+DEFAULT_TIMEOUT_SECONDS = 15.0
+TIMEOUT_P99_FACTOR = 3.0
+TIMEOUT_MIN_SECONDS = 2.0
+TIMEOUT_MIN_SAMPLES = 20
+TIMEOUT_WINDOW = 200  # Campioni di latenza conservati per (host, endpoint)
+TIMEOUT_RECOVERY_SECONDS = 300.0
+
+_timeout_lock = threading.Lock()
+_latency_samples = {}  # (host, endpoint) -> deque delle ultime latenze
+_timeout_defaults = {}  # (host, endpoint) -> timeout predefinito della chiamata
+_timeout_counts = {}  # (host, endpoint) -> richieste scadute (non usate come campioni di latenza)
+_last_timeouts = {}  # (host, endpoint) -> istante (monotonic) dell'ultima richiesta scaduta
+
+class DeadlineExceededError(Exception):
+    """Il tempo massimo della chiamata execute() (deadline_ms) è esaurito"""
+
+def remaining_time() -> Optional[float]:
+    """Secondi rimanenti prima del deadline della chiamata corrente (None se non impostato)"""
+    deadline = getattr(_request_context, 'deadline', None)
+    return None if deadline is None else deadline - time.monotonic()
+
+def check_deadline(needed: float = 0.0) -> None:
+    """Solleva DeadlineExceededError se non restano almeno needed secondi"""
+    remaining = remaining_time()
+    if remaining is not None and remaining <= needed:
+        raise DeadlineExceededError("Tempo massimo della richiesta (deadline_ms) esaurito")
+
+def record_latency(host: str, endpoint: str, seconds: float) -> None:
+    with _timeout_lock:
+        samples = _latency_samples.get((host, endpoint))
+        if samples is None:
+            samples = _latency_samples[(host, endpoint)] = deque(maxlen=TIMEOUT_WINDOW)
+        samples.append(seconds)
+
+def record_timeout(host: str, endpoint: str) -> None:
+    with _timeout_lock:
+        _timeout_counts[(host, endpoint)] = _timeout_counts.get((host, endpoint), 0) + 1
+        _last_timeouts[(host, endpoint)] = time.monotonic()
+
+
+def adaptive_read_timeout(host: str, endpoint: str, default: float) -> float:
+    """Read timeout per (host, endpoint) calcolato dalle latenze osservate"""
+    with _timeout_lock:
+        samples = sorted(_latency_samples.get((host, endpoint), ()))
+        last_timeout = _last_timeouts.get((host, endpoint))
+    if len(samples) < TIMEOUT_MIN_SAMPLES:
+        return default
+    if last_timeout is not None and time.monotonic() - last_timeout < TIMEOUT_RECOVERY_SECONDS:
+        # L'host è rallentato oltre la stima: il timeout predefinito lascia arrivare le risposte lente
+        return default
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return max(TIMEOUT_MIN_SECONDS, min(default, p99 * TIMEOUT_P99_FACTOR))
+
+def request_timeouts(host: str, endpoint: str, default: float,
+                     adaptive: bool = True) -> Tuple[Tuple[float, float], bool]:
+    """
+    Ritorna ((connect, read), True se il read timeout è stato ridotto dal deadline)
+    Con adaptive=False il read timeout resta quello indicato (es. trasferimenti di file)
+    """
+    with _timeout_lock:
+        _timeout_defaults[(host, endpoint)] = default
+    read = adaptive_read_timeout(host, endpoint, default) if adaptive else default
+    connect = min(CONNECT_TIMEOUT_SECONDS, read)
+    remaining = remaining_time()
+    if remaining is not None and remaining < read:
+        check_deadline()
+        return (min(connect, remaining), remaining), True
+    return (connect, read), False
+
+def timeout_snapshot() -> Dict[str, Any]:
+    """Timeout correnti per (host, endpoint) (per getStats)"""
+    with _timeout_lock:
+        counts = {key: len(samples) for key, samples in _latency_samples.items()}
+        timed_out = dict(_timeout_counts)
+        defaults = dict(_timeout_defaults)
+    snapshot = {}
+    for host, endpoint in sorted(set(counts) | set(timed_out)):
+        default = defaults.get((host, endpoint), DEFAULT_TIMEOUT_SECONDS)
+        snapshot[f'{host} {endpoint}'] = {'samples': counts.get((host, endpoint), 0),
+                                          'timeouts': timed_out.get((host, endpoint), 0),
+                                          'default_timeout': default,
+                                          'read_timeout': round(adaptive_read_timeout(host, endpoint, default), 3)}
+    return snapshot
+
+# Cookie jar persistente (cache/cookies.json) condiviso da tutte le chiamate e da tutti gli host
+# della source: cookie di sessione/consenso e cf_clearance ottenuto dalla WebView dell'app
+# vengono riusati invece di essere riottenuti a ogni chiamata
+COOKIES_FILE = 'cookies.json'
+CLEARANCE_COOKIE = 'cf_clearance'
+DIRECT_LINK_DELAY_SECONDS = 20  # Attesa della challenge Cloudflare per i link diretti
+DIRECT_LINK_DELAY_WITH_CLEARANCE = 3
+
+_cookie_lock = threading.Lock()
+_cookie_jar = requests.cookies.RequestsCookieJar()
+_cookie_jar_loaded = set()  # cache_dir già letti
+_cookie_jar_dirty = False
+
+def _cookie_to_dict(cookie) -> Dict[str, Any]:
+    return {'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain, 'path': cookie.path,
+            'expires': cookie.expires, 'secure': cookie.secure}
+
+def _cookie_from_dict(data: Dict[str, Any]):
+    return requests.cookies.create_cookie(
+        name=str(data['name']), value=str(data.get('value', '')), domain=data.get('domain') or '',
+        path=data.get('path') or '/', expires=int(data['expires']) if data.get('expires') else None,
+        secure=bool(data.get('secure', False)))
+
+def load_cookie_jar() -> None:
+    """Legge (una volta per source_dir) i cookie salvati, scartando quelli scaduti"""
+    cache_dir = get_cache_dir()
+    if not cache_dir or cache_dir in _cookie_jar_loaded:
+        return
+    _cookie_jar_loaded.add(cache_dir)
+    path = os.path.join(cache_dir, COOKIES_FILE)
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f).get('cookies', [])
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"⚠️ [cookies] Impossibile leggere {path}: {e}", file=sys.stderr)
+        return
+    now = time.time()
+    for data in saved:
+        if isinstance(data, dict) and data.get('name') and not (data.get('expires') and data['expires'] <= now):
+            _cookie_jar.set_cookie(_cookie_from_dict(data))
+
+def save_cookie_jar() -> None:
+    """Salva i cookie in cache/cookies.json se sono cambiati (solo quelli non scaduti)"""
+    global _cookie_jar_dirty
+    if not _cookie_jar_dirty:
+        return
+    cache_dir = get_cache_dir()
+    if not cache_dir:
+        return
+    with _cookie_lock:
+        _cookie_jar_dirty = False
+        _cookie_jar.clear_expired_cookies()
+        cookies = [_cookie_to_dict(cookie) for cookie in _cookie_jar]
+    try:
+        write_json_atomic(os.path.join(cache_dir, COOKIES_FILE), {'cookies': cookies})
+    except OSError as e:
+        print(f"⚠️ [cookies] Impossibile salvare i cookie: {e}", file=sys.stderr)
+
+def new_session() -> requests.Session:
+    """Crea una sessione HTTP che parte dai cookie persistenti della source"""
+    session = requests.Session()
+    with _cookie_lock:
+        load_cookie_jar()
+        _cookie_jar.clear_expired_cookies()
+        for cookie in _cookie_jar:
+            session.cookies.set_cookie(copy.copy(cookie))
+    return session
+
+def store_session_cookies(session: requests.Session) -> None:
+    """Copia nel jar persistente i cookie ricevuti da una sessione"""
+    global _cookie_jar_dirty
+    with _cookie_lock:
+        known = {(cookie.domain, cookie.path, cookie.name): (cookie.value, cookie.expires) for cookie in _cookie_jar}
+        for cookie in session.cookies:
+            if known.get((cookie.domain, cookie.path, cookie.name)) != (cookie.value, cookie.expires):
+                _cookie_jar.set_cookie(copy.copy(cookie))
+                _cookie_jar_dirty = True
+
+def _domain_matches(host: str, domain: str) -> bool:
+    domain = domain.lstrip('.').lower()
+    return host == domain or host.endswith('.' + domain)
+
+def has_valid_clearance(url: Optional[str] = None) -> bool:
+    """True se esiste un cf_clearance non scaduto per l'host (di default quello della source)"""
+    host = urllib.parse.urlparse(url or get_base_url()).hostname or ''
+    now = time.time()
+    with _cookie_lock:
+        load_cookie_jar()
+        return any(cookie.name == CLEARANCE_COOKIE and _domain_matches(host, cookie.domain)
+                   and not (cookie.expires and cookie.expires <= now) for cookie in _cookie_jar)
+
+def import_cookies(params: Dict[str, Any]) -> str:
+    """
+    Importa cookie nel jar persistente (es. cf_clearance ottenuto dalla WebView)
+    cookies: lista di {name, value, domain, path, expires} oppure dict nome -> valore
+    (in questo caso il dominio è "domain" o l'host della source)
+    """
+    global _cookie_jar_dirty
+    cookies = params.get("cookies") or []
+    default_domain = params.get("domain") or urllib.parse.urlparse(get_base_url()).hostname
+    if isinstance(cookies, dict):
+        cookies = [{'name': name, 'value': value} for name, value in cookies.items()]
+    imported = 0
+    with _cookie_lock:
+        load_cookie_jar()
+        for data in cookies:
+            if not isinstance(data, dict) or not data.get('name'):
+                continue
+            if data.get('expires') and float(data['expires']) <= time.time():
+                continue
+            _cookie_jar.set_cookie(_cookie_from_dict(dict(data, domain=data.get('domain') or default_domain)))
+            imported += 1
+        _cookie_jar_dirty = _cookie_jar_dirty or imported > 0
+    save_cookie_jar()
+    return json.dumps({"imported": imported, "clearance": has_valid_clearance()})
+
+def export_cookies(params: Dict[str, Any]) -> str:
+    """Esporta i cookie non scaduti del jar persistente (filtrabili per "domain")"""
+    domain = params.get("domain")
+    with _cookie_lock:
+        load_cookie_jar()
+        _cookie_jar.clear_expired_cookies()
+        cookies = [_cookie_to_dict(cookie) for cookie in _cookie_jar
+                   if not domain or _domain_matches(domain.lower(), cookie.domain)]
+    return json.dumps({"cookies": cookies})
+
+def http_get(url: str, session: Optional[requests.Session] = None, endpoint: str = 'default',
+             **kwargs) -> requests.Response:
+    """
+    Esegue una GET verso l'upstream registrando latenza, esito e byte scaricati
+    Tutte le richieste HTTP della source passano da qui; timeout è il valore predefinito
+    dell'endpoint, sostituito dal timeout adattivo quando ci sono abbastanza campioni
+    (adaptive_timeout=False per tenerlo fisso)
+    """
+    host = urllib.parse.urlparse(url).netloc or 'unknown'
+    labels = {'source': SOURCE_ID, 'method': current_method(), 'host': host}
+    check_deadline()
+    breaker = get_circuit_breaker(host)
+    breaker.before_request()
+    # rate_limited=False per le risorse statiche (copertine), che l'app scaricava già senza limiti
+    limiter = get_rate_limiter(host) if kwargs.pop('rate_limited', True) else None
+    adaptive_timeout = kwargs.pop('adaptive_timeout', True)
+    try:
+        if limiter:
+            wait = limiter.acquire()
+            if wait > 0:
+                check_deadline(wait)
+                metrics_observe('rate_limit_wait_seconds', labels, wait)
+                time.sleep(wait)
+        kwargs['timeout'], deadline_bound = request_timeouts(host, endpoint, kwargs.get('timeout') or DEFAULT_TIMEOUT_SECONDS,
+                                                             adaptive_timeout)
+    except DeadlineExceededError:
+        breaker.release_probe()
+        raise
+    start = time.monotonic()
+    try:
+        response = (session or requests).get(url, **kwargs)
+    except Exception as e:
+        metrics_observe('upstream_latency_seconds', labels, time.monotonic() - start)
+        metrics_inc('upstream_errors_total', dict(labels, kind=type(e).__name__))
+        if deadline_bound and isinstance(e, requests.Timeout):
+            # Timeout dovuto al deadline della chiamata, non a un problema dell'host
+            breaker.release_probe()
+            raise DeadlineExceededError("Tempo massimo della richiesta (deadline_ms) esaurito") from e
+        if isinstance(e, requests.Timeout):
+            # Il limite scaduto non è una latenza osservata: non deve alimentare il timeout adattivo
+            record_timeout(host, endpoint)
+        if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+            breaker.record_failure(type(e).__name__)
+            _request_context.upstream_failed = True
+        else:
+            # Nessuno scambio riuscito (URL non valido, troppi redirect...): nessun esito per il breaker
+            breaker.release_probe()
+        raise
+    elapsed = time.monotonic() - start
+    metrics_observe('upstream_latency_seconds', labels, elapsed)
+    record_latency(host, endpoint, elapsed)
+    metrics_inc('upstream_requests_total', dict(labels, status=str(response.status_code)))
+    if response.status_code >= 400:
+        metrics_inc('upstream_errors_total', dict(labels, kind=f'http_{response.status_code}'))
+    if response.status_code in CIRCUIT_FAILURE_STATUS:
+        breaker.record_failure(f'http_{response.status_code}')
+        _request_context.upstream_failed = True
+    else:
+        breaker.record_success()
+    if limiter:
+        rate_limit_feedback(limiter, response, labels)
+    if session is not None:
+        store_session_cookies(session)
+    if not kwargs.get('stream'):
+        metrics_inc('bytes_downloaded_total', {'source': SOURCE_ID, 'host': host}, len(response.content))
+    return response
+
+# URL base dell'upstream: sovrascrivibile per chiamata (parametro "base_url") o tramite
+# variabile d'ambiente, ad esempio per puntare al server upstream locale dei benchmark
+DEFAULT_BASE_URL = "https://nswpedia.com"
+BASE_URL_ENV_VAR = "TOTTODRILLO_NSWPEDIA_BASE_URL"
+
+def get_base_url() -> str:
+    """Ritorna l'URL base dell'upstream per la chiamata corrente (senza / finale)"""
+    base_url = getattr(_request_context, 'base_url', None) or os.environ.get(BASE_URL_ENV_VAR) or DEFAULT_BASE_URL
+    return base_url.rstrip('/')
+
+# Versioni dello schema di risposta negoziabili con il parametro "schema_version"
+# 1 = legacy (default), 2 = compatto: niente campi deprecati, null o liste vuote nelle ROM
+RESPONSE_SCHEMA_LEGACY = 1
+RESPONSE_SCHEMA_COMPACT = 2
+DEPRECATED_ROM_FIELDS = ('boxart_url', 'boxart_urls')
+
+# Encoder JSON più veloce se disponibile (usato solo nello schema compatto)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def response_schema(params: Dict[str, Any]) -> int:
+    """Ritorna la versione di schema richiesta dal chiamante"""
+    try:
+        return int(params.get("schema_version") or RESPONSE_SCHEMA_LEGACY)
+    except (TypeError, ValueError):
+        return RESPONSE_SCHEMA_LEGACY
+
+def dumps_json(data: Any, compact: bool = False) -> str:
+    """Serializza in JSON; in modalità compatta usa orjson (se presente) e nessuno spazio"""
+    if not compact:
+        return json.dumps(data)
+    if orjson is not None:
+        return orjson.dumps(data).decode('utf-8')
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+def compact_rom(rom: Dict[str, Any]) -> Dict[str, Any]:
+    """Rimuove da una ROM i campi deprecati, null e le liste vuote (anche nei link)"""
+    compacted = {}
+    for key, value in rom.items():
+        if key in DEPRECATED_ROM_FIELDS or value is None or value == []:
+            continue
+        if key == 'links':
+            value = [{k: v for k, v in link.items() if v is not None} for link in value]
+        compacted[key] = value
+    return compacted
+
+def encode_response(response: Dict[str, Any], params: Dict[str, Any]) -> str:
+    """Serializza la risposta di searchRoms/getEntry nello schema richiesto"""
+    if response_schema(params) < RESPONSE_SCHEMA_COMPACT:
+        return json.dumps(response)
+    response = dict(response)
+    for key in ('results', 'roms'):
+        if response.get(key):
+            response[key] = [compact_rom(rom) for rom in response[key]]
+    if response.get('entry'):
+        response['entry'] = compact_rom(response['entry'])
+    response['schema_version'] = RESPONSE_SCHEMA_COMPACT
+    return dumps_json(response, compact=True)
+
+# Campi di getEntry selezionabili con "fields" (lista o stringa separata da virgole): gli stadi di
+# estrazione dei campi non richiesti, con le loro richieste di rete, vengono saltati e i campi
+# omessi dalla entry. slug e rom_id sono sempre presenti; senza "fields" la entry è completa
+ENTRY_FIELDS = ('title', 'platform', 'box_image', 'screen_image', 'regions', 'links')
+ENTRY_ALWAYS_FIELDS = ('slug', 'rom_id')
+
+def entry_fields(params: Dict[str, Any]) -> FrozenSet[str]:
+    """Ritorna i campi della entry richiesti dal chiamante (i nomi sconosciuti vengono ignorati)"""
+    fields = params.get("fields")
+    if not fields:
+        return frozenset(ENTRY_FIELDS)
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    return frozenset(str(field).strip() for field in fields) & frozenset(ENTRY_FIELDS)
+
+def select_entry_fields(entry: Dict[str, Any], fields: FrozenSet[str]) -> Dict[str, Any]:
+    """Tiene nella entry solo i campi richiesti; i campi deprecati seguono box_image"""
+    if len(fields) == len(ENTRY_FIELDS):
+        return entry
+    return {key: value for key, value in entry.items()
+            if key in ENTRY_ALWAYS_FIELDS or key in fields
+            or (key in DEPRECATED_ROM_FIELDS and 'box_image' in fields)}
+
+# Regole di estrazione dichiarative: selettori, pattern e campi letti dalle pagine upstream,
+# compilati una sola volta in funzioni di estrazione. extraction_rules.json nella directory della
+# source sovrascrive per nome le regole predefinite e viene ricaricato quando il file cambia, così
+# un cambio di markup del sito si corregge senza aggiornare lo script. Selettore: {"tag", "class"
+# (stringa: classe esatta; lista: tutte contenute nell'attributo), "class_re", "id", "attrs"} o una
+# lista di selettori annidati. Campo: {"select", "attr" (altrimenti il testo), "pattern", "group",
+# "post", "default"}. Record: {"fields", "required"}. Pattern: regex (flag inline, es. "(?i)")
+EXTRACTION_RULES_FILE = 'extraction_rules.json'
+EXTRACTION_RULE_SECTIONS = ('selectors', 'patterns', 'records', 'parse_only', 'values')
+DEFAULT_EXTRACTION_RULES = {
+    'selectors': {
+        'listing_item': {'tag': 'div', 'class': ['soft-item', 'shadow-sm']},
+        'pagination': {'tag': 'ul', 'class_re': '(?i)pagination'},
+        'pagination_link': {'tag': 'a', 'attrs': {'href': True}},
+        'app_info': {'tag': 'div', 'class': ['info-block', 'scora']},
+        'app_info_span': {'tag': 'span', 'class': 'body-2'},
+        'box_art': [{'tag': 'div', 'class': ['icon-big', 'icon']}, {'tag': 'img'}],
+        'screenshot_link': [{'tag': 'div', 'id': 'lightgallery', 'class': 'screenshots_row'},
+                            {'tag': 'a', 'class': 'screen_shot'}],
+        'download_button': [{'tag': 'div', 'class': 'btn-block'}, {'tag': 'a', 'attrs': {'href': '/download/'}}],
+    },
+    'patterns': {
+        'slug': r'/([^/]+)/?$',
+        'search_page_number': r'/page/(\d+)/',
+        'category_page_number': r'/nintendo-switch-roms/page/(\d+)',
+        'page_title_suffix': r'(?i)\s*-\s*NSWpedia.*$',
+    },
+    'records': {
+        'listing_item': {
+            'fields': {
+                'url': {'select': {'tag': 'a', 'class': 'link-title'}, 'attr': 'href'},
+                'title': {'select': [{'tag': 'a', 'class': 'link-title'}, {'tag': 'h2', 'class': 'soft-item-title'}],
+                          'default': ''},
+                'box_image': {'select': [{'tag': 'div', 'class': ['icon-big', 'icon']}, {'tag': 'img'}], 'attr': 'src'},
+            },
+            'required': ['url'],
+        },
+    },
+    # Classi dei nodi conservati nell'albero dei listing (SoupStrainer)
+    'parse_only': {'listing': 'soft-item|pagination'},
+    'values': {},
+}
+
+# Post-processori applicabili ai campi ("post": [...])
+FIELD_POST_PROCESSORS = {
+    'strip': lambda value: value.strip(),
+    'lower': lambda value: value.lower(),
+    'absolute_url': lambda value: value if not value or value.startswith('http') else f"{get_base_url()}{value}",
+}
+
+_extraction_rules_lock = threading.Lock()
+_extraction_rules = {}  # source_dir -> (mtime e dimensione del file di override, ExtractionRules)
+
+class Selector:
+    """Selettore compilato: argomenti di find/find_all preparati una volta sola"""
+
+    def __init__(self, spec: Any):
+        specs = spec if isinstance(spec, list) else [spec]
+        self.steps = [self._compile_step(step) for step in specs]
+        # Chiave di ogni prefisso della catena: i campi di un record condividono i nodi già trovati
+        self.keys = [json.dumps(specs[:depth + 1], sort_keys=True) for depth in range(len(specs))]
+
+    @staticmethod
+    def _compile_step(step: Dict[str, Any]) -> Dict[str, Any]:
+        kwargs = {}
+        if step.get('tag'):
+            kwargs['name'] = step['tag']
+        classes = step.get('class')
+        if isinstance(classes, list):
+            required = tuple(classes)
+
+            def has_classes(value: Optional[str]) -> bool:
+                if not value:
+                    return False
+                for name in required:
+                    if name not in value:
+                        return False
+                return True
+            kwargs['class_'] = has_classes
+        elif classes:
+            kwargs['class_'] = classes
+        if step.get('class_re'):
+            kwargs['class_'] = re.compile(step['class_re'])
+        if step.get('id'):
+            kwargs['id'] = step['id']
+        attrs = {}
+        for name, value in step.get('attrs', {}).items():
+            attrs[name] = value if isinstance(value, bool) else re.compile(value)
+        if attrs:
+            kwargs['attrs'] = attrs
+        return kwargs
+
+    def find(self, node: Any, found: Optional[Dict[str, Any]] = None) -> Any:
+        for key, kwargs in zip(self.keys, self.steps):
+            if found is not None and key in found:
+                node = found[key]
+            else:
+                node = node.find(**kwargs)
+                if found is not None:
+                    found[key] = node
+            if node is None:
+                return None
+        return node
+
+    def find_all(self, node: Any) -> List[Any]:
+        for kwargs in self.steps[:-1]:
+            node = node.find(**kwargs)
+            if node is None:
+                return []
+        return node.find_all(**self.steps[-1])
+
+def compile_field(spec: Dict[str, Any]) -> Callable[..., Any]:
+    """Compila un campo in una funzione nodo -> valore"""
+    select = Selector(spec['select']) if spec.get('select') else None
+    attr = spec.get('attr')
+    pattern = re.compile(spec['pattern']) if spec.get('pattern') else None
+    group = spec.get('group', 1)
+    post = [FIELD_POST_PROCESSORS[name] for name in spec.get('post', ())]
+    default = spec.get('default')
+
+    def extract(node: Any, found: Optional[Dict[str, Any]] = None) -> Any:
+        if select:
+            node = select.find(node, found)
+            if node is None:
+                return default
+        value = node.get(attr, '') if attr else node.get_text(strip=True)
+        if pattern:
+            match = pattern.search(value)
+            if not match:
+                return default
+            value = match.group(group)
+        for process in post:
+            value = process(value)
+        return value
+    return extract
+
+def compile_record(spec: Dict[str, Any]) -> Callable[[Any], Optional[Dict[str, Any]]]:
+    """Compila un record in una funzione nodo -> dict dei campi, o None se manca un campo obbligatorio"""
+    fields = [(name, compile_field(field)) for name, field in spec['fields'].items()]
+    required = tuple(spec.get('required', ()))
+
+    def extract(node: Any) -> Optional[Dict[str, Any]]:
+        record = {}
+        found = {}
+        for name, field in fields:
+            value = record[name] = field(node, found)
+            if not value and name in required:
+                return None
+        return record
+    return extract
+
+class ExtractionRules:
+    """
+    Regole di estrazione compilate
+    Uguaglianza e hash dipendono dal contenuto delle regole: usate come argomento di memo_parse,
+    un ricaricamento con regole diverse invalida i parsing memorizzati
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.digest = hashlib.sha1(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()
+        self.selectors = {name: Selector(selector) for name, selector in spec['selectors'].items()}
+        self.patterns = {name: re.compile(pattern) for name, pattern in spec['patterns'].items()}
+        self.records = {name: compile_record(record) for name, record in spec['records'].items()}
+        self.parse_only = {name: SoupStrainer(class_=re.compile(classes)) for name, classes in spec['parse_only'].items()}
+        self.values = dict(spec['values'])
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, ExtractionRules) and other.digest == self.digest
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+def merge_extraction_rules(override: Dict[str, Any]) -> Dict[str, Any]:
+    """Applica le regole di extraction_rules.json a quelle predefinite, sezione per sezione e per nome"""
+    spec = {section: dict(DEFAULT_EXTRACTION_RULES.get(section, {})) for section in EXTRACTION_RULE_SECTIONS}
+    for section, rules in override.items():
+        if section not in spec or not isinstance(rules, dict):
+            raise ValueError(f"sezione non valida: {section}")
+        spec[section].update(rules)
+    return spec
+
+def load_extraction_rules(source_dir: Optional[str] = None) -> ExtractionRules:
+    """Ritorna le regole compilate, ricompilandole se extraction_rules.json è cambiato"""
+    source_dir = source_dir or getattr(_request_context, 'source_dir', None) or ''
+    path = os.path.join(source_dir, EXTRACTION_RULES_FILE) if source_dir else None
+    try:
+        stat = os.stat(path) if path else None
+        signature = (stat.st_mtime_ns, stat.st_size) if stat else None
+    except OSError:
+        signature = None
+    with _extraction_rules_lock:
+        cached = _extraction_rules.get(source_dir)
+    if cached and cached[0] == signature:
+        return cached[1]
+    try:
+        override = {}
+        if signature:
+            with open(path, 'r', encoding='utf-8') as f:
+                override = json.load(f)
+        rules = ExtractionRules(merge_extraction_rules(override))
+        if signature:
+            print(f"🧩 Regole di estrazione caricate da {path}", file=sys.stderr)
+    except (OSError, ValueError, KeyError, TypeError, re.error) as e:
+        # Regole non valide: resta in uso l'ultima versione compilata (o quelle predefinite)
+        print(f"⚠️ Regole di estrazione non valide in {path}: {e}", file=sys.stderr)
+        rules = cached[1] if cached else ExtractionRules(merge_extraction_rules({}))
+    with _extraction_rules_lock:
+        _extraction_rules[source_dir] = (signature, rules)
+    return rules
+
+# Memo dei parsing: una pagina identica byte per byte (sha1 del corpo) a una già analizzata
+# riusa il risultato dell'estrattore senza ricostruire l'albero BeautifulSoup. La chiave include
+# la versione dell'estrattore, ricavata dal suo bytecode e da quello delle funzioni e classi del
+# modulo che richiama (modificarne il codice invalida il memo), PARSER_VERSION e l'impronta delle
+# regole di estrazione in uso (un ricaricamento di extraction_rules.json invalida il memo).
+# Il risultato è condiviso tra le chiamate, quindi chi lo riceve non deve modificarlo
+PARSE_MEMO_SIZE = 32
+PARSER_VERSION = 1  # Da incrementare quando cambia l'output degli estrattori senza cambiarne il codice
+
+_parse_memo_lock = threading.Lock()
+_parse_memo = OrderedDict()  # (estrattore, versioni, regole, sha1 pagina, base URL, argomenti) -> risultato
+
+def code_fingerprint(code: Any, seen: Optional[set] = None) -> bytes:
+    """
+    Impronta di un code object: bytecode, nomi e costanti (comprese le funzioni annidate),
+    più quella delle funzioni e classi del modulo che richiama (ognuna una sola volta)
+    """
+    seen = set() if seen is None else seen
+    parts = [code.co_code, repr(code.co_names).encode('utf-8')]
+    for const in code.co_consts:
+        parts.append(code_fingerprint(const, seen) if hasattr(const, 'co_code') else repr(const).encode('utf-8'))
+    for name in code.co_names:
+        value = globals().get(name)
+        if name in seen or getattr(value, '__module__', None) != __name__:
+            continue
+        seen.add(name)
+        functions = [value] if hasattr(value, '__code__') else list(vars(value).values()) if isinstance(value, type) else []
+        for function in functions:
+            if hasattr(function, '__code__'):
+                parts.append(code_fingerprint(function.__code__, seen))
+    return b'\0'.join(parts)
+
+def extractor_version(parse: Callable[..., Any]) -> str:
+    """Versione di un estrattore (cambia con il suo codice e con quello delle funzioni che richiama)"""
+    version = getattr(parse, 'extractor_version', None)
+    if version is None:
+        version = parse.extractor_version = hashlib.sha1(code_fingerprint(parse.__code__)).hexdigest()[:12]
+    return version
+
+def memo_parse(name: str, body: bytes, parse: Callable[..., Any], *args: Any) -> Any:
+    """Ritorna parse(body, *args), riusando il risultato se la stessa pagina è già stata analizzata"""
+    key = (name, PARSER_VERSION, extractor_version(parse), load_extraction_rules().digest,
+           hashlib.sha1(body).hexdigest(), get_base_url(), args)
+    with _parse_memo_lock:
+        found = key in _parse_memo
+        if found:
+            _parse_memo.move_to_end(key)
+            result = _parse_memo[key]
+    metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'parse', 'result': 'hit' if found else 'miss'})
+    if found:
+        return result
+    result = parse(body, *args)
+    with _parse_memo_lock:
+        _parse_memo[key] = result
+        while len(_parse_memo) > PARSE_MEMO_SIZE:
+            _parse_memo.popitem(last=False)
+    return result
+
+class RomRow:
+    """
+    Riga di un risultato di ricerca con __slots__ e stringhe internate
+    Il dict JSON viene creato solo al momento della risposta con to_dict()
+    """
+    __slots__ = ('slug', 'rom_id', 'title', 'platform', 'box_image')
+
+    def __init__(self, slug: str, rom_id: str, title: str, box_image: Optional[str] = None, platform: str = "switch"):
+        self.slug = slug
+        self.rom_id = rom_id  # URL completo della ROM
+        self.title = title
+        self.platform = sys.intern(platform)
+        self.box_image = box_image
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Converte la riga nel formato JSON di searchRoms"""
+        return {
+            "slug": self.slug,
+            "rom_id": self.rom_id,
+            "title": self.title,
+            "platform": self.platform,
+            "box_image": self.box_image,
+            "regions": [],  # Non disponibili nella lista
+            "links": []  # Verranno recuperati in get_entry
+        }
+
+def parse_listing_page(content: bytes, rules: ExtractionRules, search_key: str,
+                       page: int) -> Tuple[List[RomRow], int, Optional[str]]:
+    """Estrae da una pagina categoria/ricerca le ROM, il numero di pagine e l'URL della pagina successiva"""
+    soup = BeautifulSoup(content, 'html.parser', parse_only=rules.parse_only['listing'])
+    
+    # Blocchi ROM (class="soft-item shadow-sm"): URL, titolo e immagine dal record listing_item
+    extract_item = rules.records['listing_item']
+    slug_pattern = rules.patterns['slug']
+    roms = []
+    for block in rules.selectors['listing_item'].find_all(soup):
+        try:
+            item = extract_item(block)
+            if not item:
+                continue
+            rom_url = item['url']
+            
+            # Slug dall'URL (es: "paper-mario-the-origami-king-89" da "https://nswpedia.com/nintendo-switch-roms/action/paper-mario-the-origami-king-89")
+            slug_match = slug_pattern.search(rom_url)
+            slug = slug_match.group(1) if slug_match else rom_url.split('/')[-1]
+            
+            roms.append(RomRow(slug, rom_url, item['title'], item['box_image']))
+        except Exception as e:
+            continue
+    
+    # Estrai informazioni sulla paginazione
+    total_pages = 1
+    next_page_url = None
+    try:
+        # Cerca il blocco di paginazione (ul.pagination)
+        pagination_ul = rules.selectors['pagination'].find(soup)
+        if pagination_ul:
+            # Trova tutti i link di pagina (sia numerici che "Next")
+            page_links = rules.selectors['pagination_link'].find_all(pagination_ul)
+            page_numbers = []
+            
+            for link in page_links:
+                href = link.get('href', '')
+                if not href:
+                    continue
+                
+                # Gestisci i due formati diversi:
+                # 1. Homepage: /nintendo-switch-roms/page/2
+                # 2. Ricerca: /page/2/?s=query
+                if search_key:
+                    # Formato ricerca: /page/\d+/?s=...
+                    match = rules.patterns['search_page_number'].search(href)
+                    if match:
+                        page_num = int(match.group(1))
+                        page_numbers.append(page_num)
+                else:
+                    # Formato homepage: /nintendo-switch-roms/page/\d+
+                    match = rules.patterns['category_page_number'].search(href)
+                    if match:
+                        page_num = int(match.group(1))
+                        page_numbers.append(page_num)
+                
+                # Cerca anche il link "Next" o "Further"
+                link_text = link.get_text(strip=True).lower()
+                if ('next' in link_text or 'further' in link_text) and not next_page_url:
+                    # Assicurati che l'URL sia completo
+                    if href.startswith('http'):
+                        next_page_url = href
+                    else:
+                        next_page_url = f"{get_base_url()}{href}"
+            
+            if page_numbers:
+                total_pages = max(page_numbers)
+                
+            # Se non abbiamo trovato next_page_url ma ci sono più pagine, costruiscilo
+            if not next_page_url and total_pages > page:
+                if search_key:
+                    next_page_url = f"{get_base_url()}/page/{page + 1}/?s={urllib.parse.quote(search_key)}"
+                else:
+                    next_page_url = f"{get_base_url()}/nintendo-switch-roms/page/{page + 1}/"
+    except Exception as e:
+        print(f"⚠️ [parse_listing_page] Errore estrazione paginazione: {e}", file=sys.stderr)
+        pass
+    
+    return roms, total_pages, next_page_url
+
 def search_roms(params: Dict[str, Any], source_dir: str) -> str:
     """
     Cerca ROM su NSWpedia.com
@@ -56,125 +1608,30 @@ def search_roms(params: Dict[str, Any], source_dir: str) -> str:
         if not search_key:
             # Nessuna query: usa la pagina categoria
             if page == 1:
-                search_url = "https://nswpedia.com/nintendo-switch-roms"
+                search_url = f"{get_base_url()}/nintendo-switch-roms"
             else:
-                search_url = f"https://nswpedia.com/nintendo-switch-roms/page/{page}/"
+                search_url = f"{get_base_url()}/nintendo-switch-roms/page/{page}/"
             print(f"🔍 [search_roms] Caricamento pagina categoria (pagina {page}): {search_url}", file=sys.stderr)
         else:
             # Query presente: usa la ricerca
             if page == 1:
-                search_url = f"https://nswpedia.com/?s={urllib.parse.quote(search_key)}"
+                search_url = f"{get_base_url()}/?s={urllib.parse.quote(search_key)}"
             else:
-                search_url = f"https://nswpedia.com/page/{page}/?s={urllib.parse.quote(search_key)}"
+                search_url = f"{get_base_url()}/page/{page}/?s={urllib.parse.quote(search_key)}"
             print(f"🔍 [search_roms] Cercando: {search_key} su {search_url}", file=sys.stderr)
         
         # Fai la richiesta
-        session = requests.Session()
+        session = new_session()
         headers = get_browser_headers()
-        response = session.get(search_url, headers=headers, timeout=15)
+        response = fetch_with_retry(search_url, session=session, endpoint='listing', headers=headers, timeout=15)
         response.raise_for_status()
         
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Trova tutti i blocchi ROM (class="soft-item shadow-sm")
-        rom_blocks = soup.find_all('div', class_=lambda x: x and 'soft-item' in x and 'shadow-sm' in x)
-        
-        roms = []
-        for block in rom_blocks[:max_results]:
-            try:
-                # URL e titolo dal link
-                link_elem = block.find('a', class_='link-title')
-                if not link_elem:
-                    continue
-                
-                rom_url = link_elem.get('href', '')
-                if not rom_url:
-                    continue
-                
-                title_elem = link_elem.find('h2', class_='soft-item-title')
-                title = title_elem.get_text(strip=True) if title_elem else ""
-                
-                # Immagine dal div icon-big
-                img_elem = None
-                icon_div = block.find('div', class_=lambda x: x and 'icon-big' in x and 'icon' in x)
-                if icon_div:
-                    # Cerca l'img dentro il picture
-                    img_elem = icon_div.find('img')
-                
-                box_image = img_elem.get('src', '') if img_elem else None
-                
-                # Slug dall'URL (es: "paper-mario-the-origami-king-89" da "https://nswpedia.com/nintendo-switch-roms/action/paper-mario-the-origami-king-89")
-                slug_match = re.search(r'/([^/]+)/?$', rom_url)
-                slug = slug_match.group(1) if slug_match else rom_url.split('/')[-1]
-                
-                roms.append({
-                    "slug": slug,
-                    "rom_id": rom_url,  # Usiamo l'URL completo come rom_id
-                    "title": title,
-                    "platform": "switch",  # Sempre Switch
-                    "box_image": box_image,
-                    "regions": [],  # Non disponibili nella lista
-                    "links": []  # Verranno recuperati in get_entry
-                })
-            except Exception as e:
-                continue
-        
-        # Estrai informazioni sulla paginazione
-        total_pages = 1
-        next_page_url = None
-        try:
-            # Cerca il blocco di paginazione (ul.pagination)
-            pagination_ul = soup.find('ul', class_=lambda x: x and 'pagination' in str(x).lower())
-            if pagination_ul:
-                # Trova tutti i link di pagina (sia numerici che "Next")
-                page_links = pagination_ul.find_all('a', href=True)
-                page_numbers = []
-                
-                for link in page_links:
-                    href = link.get('href', '')
-                    if not href:
-                        continue
-                    
-                    # Gestisci i due formati diversi:
-                    # 1. Homepage: /nintendo-switch-roms/page/2
-                    # 2. Ricerca: /page/2/?s=query
-                    if search_key:
-                        # Formato ricerca: /page/\d+/?s=...
-                        match = re.search(r'/page/(\d+)/', href)
-                        if match:
-                            page_num = int(match.group(1))
-                            page_numbers.append(page_num)
-                    else:
-                        # Formato homepage: /nintendo-switch-roms/page/\d+
-                        match = re.search(r'/nintendo-switch-roms/page/(\d+)', href)
-                        if match:
-                            page_num = int(match.group(1))
-                            page_numbers.append(page_num)
-                    
-                    # Cerca anche il link "Next" o "Further"
-                    link_text = link.get_text(strip=True).lower()
-                    if ('next' in link_text or 'further' in link_text) and not next_page_url:
-                        # Assicurati che l'URL sia completo
-                        if href.startswith('http'):
-                            next_page_url = href
-                        else:
-                            next_page_url = f"https://nswpedia.com{href}"
-                
-                if page_numbers:
-                    total_pages = max(page_numbers)
-                    
-                # Se non abbiamo trovato next_page_url ma ci sono più pagine, costruiscilo
-                if not next_page_url and total_pages > page:
-                    if search_key:
-                        next_page_url = f"https://nswpedia.com/page/{page + 1}/?s={urllib.parse.quote(search_key)}"
-                    else:
-                        next_page_url = f"https://nswpedia.com/nintendo-switch-roms/page/{page + 1}/"
-        except Exception as e:
-            print(f"⚠️ [search_roms] Errore estrazione paginazione: {e}", file=sys.stderr)
-            pass
+        rows, total_pages, next_page_url = memo_parse('listing', response.content, parse_listing_page,
+                                                      load_extraction_rules(), search_key, page)
+        roms = rows[:max_results]
         
         result = {
-            "roms": roms,
+            "roms": [rom.to_dict() for rom in roms],
             "total_results": len(roms) * total_pages if total_pages > 1 else len(roms),  # Stima
             "current_results": len(roms),
             "current_page": page,
@@ -185,14 +1642,384 @@ def search_roms(params: Dict[str, Any], source_dir: str) -> str:
         if next_page_url:
             result["next_page_url"] = next_page_url
         
-        return json.dumps(result)
+        return encode_response(result, params)
         
+    except (SourceUnavailableError, DeadlineExceededError):
+        raise
     except Exception as e:
         import traceback
         error_msg = f"{str(e)}\n{traceback.format_exc()}"
         print(f"❌ [search_roms] Errore: {error_msg}", file=sys.stderr)
         return json.dumps({"error": error_msg})
 
+# Probe dei mirror: con "probe_links": true getEntry interroga in parallelo i link download
+# (GET con Range sui primi byte) e li ordina per tempo di download stimato, entro un budget fisso
+PROBE_BUDGET_MS = 1500
+PROBE_MAX_WORKERS = 6
+PROBE_RANGE_BYTES = 64 * 1024
+PROBE_CACHE_TTL_SECONDS = 900
+PROBE_DEAD_STATUS = (404, 410)  # Solo questi (o un errore di rete) indicano un mirror morto
+SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4}
+
+_probe_cache_lock = threading.Lock()
+_probe_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}  # url -> (scadenza, esito probe)
+
+def parse_size_str(size_str: Optional[str]) -> Optional[int]:
+    """Converte una dimensione testuale ("14.5 GB", "900MB") in byte"""
+    match = re.search(r'([\d.,]+)\s*([KMGT]?B)', (size_str or '').upper())
+    if not match:
+        return None
+    try:
+        return int(float(match.group(1).replace(',', '.')) * SIZE_UNITS[match.group(2)])
+    except ValueError:
+        return None
+
+def format_size(num_bytes: int) -> str:
+    """Dimensione leggibile (es. "14.5 GB")"""
+    size = float(num_bytes)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{int(size)} B"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def probe_mirror(url: str, referer: str, deadline: float) -> Optional[Dict[str, Any]]:
+    """
+    Misura un mirror: raggiungibilità, dimensione totale e throughput sui primi PROBE_RANGE_BYTES
+    Passa da http_get (breaker, metriche, timeout) con deadline pari al budget dei probe, senza
+    sessione: i cookie degli hoster non finiscono nel jar persistente. None se non misurabile
+    """
+    with _probe_cache_lock:
+        cached = _probe_cache.get(url)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return None
+
+    host = urllib.parse.urlparse(url).netloc or 'unknown'
+    headers = dict(get_browser_headers(referer=referer), Range=f'bytes=0-{PROBE_RANGE_BYTES - 1}')
+    result = {'alive': False, 'size': None, 'latency_ms': None, 'throughput_kbps': None}
+    # Thread worker di probe_links: il deadline del contesto diventa quello del budget dei probe
+    _request_context.deadline = deadline
+    measured = True
+    start = time.monotonic()
+    try:
+        with http_get(url, endpoint='mirror_probe', rate_limited=False, headers=headers,
+                      stream=True, allow_redirects=True, timeout=remaining) as response:
+            first_byte = time.monotonic()
+            result['latency_ms'] = round((first_byte - start) * 1000, 1)
+            content_type = response.headers.get('Content-Type', '').lower()
+            if response.status_code >= 400 or 'text/html' in content_type:
+                # 404/410: mirror morto. Challenge Cloudflare (403/503, tipica dei link diretti),
+                # pagina intermedia dell'hoster o errore temporaneo: non misurabile, non morto
+                measured = response.status_code in PROBE_DEAD_STATUS
+            else:
+                result['alive'] = True
+                # File vero: dimensione da Content-Range (206) o Content-Length (200, Range ignorato)
+                total = response.headers.get('Content-Range', '').rpartition('/')[2]
+                if not total.isdigit() and response.status_code == 200:
+                    total = response.headers.get('Content-Length', '')
+                result['size'] = int(total) if total.isdigit() else None
+                received = 0
+                for chunk in response.iter_content(chunk_size=16 * 1024):
+                    received += len(chunk)
+                    if received >= PROBE_RANGE_BYTES or time.monotonic() >= deadline:
+                        break
+                elapsed = time.monotonic() - first_byte
+                if received and elapsed > 0:
+                    result['throughput_kbps'] = round(received / 1024 / elapsed, 1)
+    except (SourceUnavailableError, DeadlineExceededError):
+        # Host già dato per non raggiungibile dal breaker o budget esaurito: link non misurato
+        return None
+    except Exception as e:
+        print(f"⚠️ [probe_mirror] {host} non raggiungibile: {type(e).__name__}", file=sys.stderr)
+    if not measured:
+        metrics_inc('mirror_probes_total', {'source': SOURCE_ID, 'host': host, 'result': 'unmeasured'})
+        return None
+    metrics_inc('mirror_probes_total', {'source': SOURCE_ID, 'host': host, 'result': 'alive' if result['alive'] else 'dead'})
+    with _probe_cache_lock:
+        _probe_cache[url] = (time.monotonic() + PROBE_CACHE_TTL_SECONDS, result)
+        if len(_probe_cache) > 512:
+            now = time.monotonic()
+            for key in [k for k, (expires, _) in _probe_cache.items() if expires <= now]:
+                del _probe_cache[key]
+    return result
+
+def probe_links(links: List[Dict[str, Any]], referer: str, budget_ms: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Interroga in parallelo i mirror e ordina i link: prima i vivi con tempo stimato minore,
+    poi quelli non misurati nell'ordine della pagina, infine quelli non raggiungibili
+    """
+    if not links:
+        return links
+    budget = (budget_ms if budget_ms is not None else PROBE_BUDGET_MS) / 1000.0
+    remaining = remaining_time()
+    if remaining is not None:
+        budget = min(budget, remaining - 0.5)
+    if budget <= 0:
+        return links
+    deadline = time.monotonic() + budget
+
+    urls = list(dict.fromkeys(link['url'] for link in links if link.get('url')))
+    probe = run_with_context(probe_mirror)
+    executor = ThreadPoolExecutor(max_workers=min(PROBE_MAX_WORKERS, len(urls)) or 1)
+    futures = {executor.submit(probe, url, referer, deadline): url for url in urls}
+    _, pending = wait(futures, timeout=budget)
+    # I probe in coda non partono più; quelli in corso sono limitati dal deadline e finiscono a breve
+    for future in pending:
+        future.cancel()
+    executor.shutdown(wait=True)
+    results = {futures[f]: f.result() for f in futures if f.done() and not f.cancelled() and f.result()}
+    print(f"🔍 [probe_links] {len(results)}/{len(urls)} mirror misurati in {budget * 1000:.0f}ms", file=sys.stderr)
+
+    def sort_key(item):
+        index, link = item
+        probe = link.get('probe')
+        if not probe:
+            return (1, 0, index)
+        if not probe['alive']:
+            return (2, 0, index)
+        size = link.get('size') or parse_size_str(link.get('size_str'))
+        if size and probe['throughput_kbps']:
+            return (0, probe['latency_ms'] / 1000.0 + size / 1024 / probe['throughput_kbps'], index)
+        return (0, float('inf'), index)
+
+    for link in links:
+        probe = results.get(link.get('url'))
+        if not probe:
+            continue
+        link['probe'] = probe
+        if probe['size'] and not link.get('size'):
+            link['size'] = probe['size']
+            if not link.get('size_str'):
+                link['size_str'] = format_size(probe['size'])
+    return [link for _, link in sorted(enumerate(links), key=sort_key)]
+
+def get_download_page_links(download_page_url: str, page_url: str, session: requests.Session) -> List[Dict[str, Any]]:
+    """
+    Carica la pagina download di una ROM ed estrae i link delle tabelle download
+    Ritorna una lista vuota se la pagina non è disponibile
+    """
+    download_links = []
+    
+    # Visita la pagina di download
+    # La pagina a volte fa redirect a un popup fuori dal dominio nswpedia.com: i redirect
+    # vengono controllati dagli header, così un tentativo a vuoto costa un solo round trip
+    def fetch_download_page() -> BeautifulSoup:
+        download_response = fetch_same_site(download_page_url, session=session, endpoint='download_page', headers=get_browser_headers(referer=page_url), timeout=15)
+        download_response.raise_for_status()
+        soup = BeautifulSoup(download_response.content, 'html.parser')
+        tables_count = len(soup.find_all('div', class_='table-download'))
+        # Se non ci sono tabelle di download, potrebbe essere una pagina popup o errore
+        if not tables_count:
+            raise RetryableError(f"nessuna tabella download trovata: {download_response.url}")
+        print(f"✅ [get_entry] Pagina download caricata correttamente: {download_response.url} ({tables_count} tabelle trovate)", file=sys.stderr)
+        return soup
+    
+    try:
+        download_soup = RetryPolicy().run(fetch_download_page, 'pagina download')
+    except (SourceUnavailableError, DeadlineExceededError):
+        raise
+    except Exception as e:
+        print(f"⚠️ [get_entry] Pagina download non disponibile, salto i link: {e}", file=sys.stderr)
+        download_soup = None
+    
+    if download_soup:
+        # Trova tutte le tabelle di download
+        download_tables = download_soup.find_all('div', class_='table-download')
+        # Con un cf_clearance valido (importato dalla WebView) la challenge è già superata
+        direct_link_delay = DIRECT_LINK_DELAY_WITH_CLEARANCE if has_valid_clearance(download_page_url) else DIRECT_LINK_DELAY_SECONDS
+    
+        for table_div in download_tables:
+            try:
+                # Leggi il titolo della tabella per capire se è "Direct" o altro
+                h3 = table_div.find('h3')
+                table_title = h3.get_text(strip=True) if h3 else ""
+                
+                # Determina se richiede webview e estrai nome del sito
+                is_direct = "Direct" in table_title
+                requires_webview = not is_direct
+                
+                # Estrai nome del sito dal titolo (es: "Downloads List - 1Fichier" -> "1Fichier")
+                site_name = None
+                if not is_direct and "Downloads List -" in table_title:
+                    # Estrai il nome dopo "Downloads List -"
+                    parts = table_title.split("Downloads List -")
+                    if len(parts) > 1:
+                        site_name = parts[1].strip()
+                elif is_direct:
+                    site_name = "Diretto"  # Sarà localizzato dall'app
+                
+                # Trova la tabella
+                table = table_div.find('table')
+                if not table:
+                    continue
+                
+                tbody = table.find('tbody')
+                if not tbody:
+                    continue
+                
+                rows = tbody.find_all('tr')
+                for row in rows:
+                    try:
+                        cells = row.find_all('td')
+                        if len(cells) < 3:
+                            continue
+                        
+                        # Prima cella: link con nome file
+                        link_cell = cells[0]
+                        link_elem = link_cell.find('a')
+                        if not link_elem:
+                            continue
+                        
+                        link_url = link_elem.get('href', '')
+                        if not link_url.startswith('http'):
+                            link_url = f"{get_base_url()}{link_url}"
+                        
+                        # Codifica correttamente l'URL (gestisce spazi e caratteri speciali)
+                        parsed = urllib.parse.urlparse(link_url)
+                        encoded_path = urllib.parse.quote(parsed.path, safe='/')
+                        link_url = urllib.parse.urlunparse((
+                            parsed.scheme,
+                            parsed.netloc,
+                            encoded_path,
+                            parsed.params,
+                            parsed.query,
+                            parsed.fragment
+                        ))
+                        
+                        file_name = link_elem.get_text(strip=True)
+                        
+                        # Seconda cella: size
+                        size_str = cells[1].get_text(strip=True)
+                        
+                        # Terza cella: type
+                        format_type = cells[2].get_text(strip=True).upper()
+                        
+                        # Per i link diretti, NON estrarre l'URL finale
+                        # Cloudflare richiede una challenge JavaScript che richiede ~20 secondi
+                        # Il WebView deve aprire la pagina intermedia per completare la challenge e ottenere il cookie cf_clearance
+                        # Poi il WebView può intercettare il download quando parte
+                        final_url = link_url
+                        intermediate_url = link_url if is_direct else None  # URL della pagina intermedia per WebView
+                        
+                        # Costruisci il nome del link: mostra "Diretto" o il nome del sito alla fine tra parentesi
+                        link_name = file_name
+                        if site_name:
+                            # Se è diretto, mostra "nome file (Diretto)", altrimenti "nome file (NomeSito)"
+                            if is_direct:
+                                link_name = f"{file_name} (Diretto)"
+                            else:
+                                link_name = f"{file_name} ({site_name})"
+                        
+                        download_links.append({
+                            "name": link_name,
+                            "type": "ROM",
+                            "format": format_type or "unknown",
+                            "url": intermediate_url if is_direct else final_url,  # Per link diretti, usa pagina intermedia per WebView
+                            "size": None,
+                            "size_str": size_str,
+                            "requires_webview": True if is_direct else requires_webview,  # Link diretti richiedono WebView per Cloudflare
+                            "delay_seconds": direct_link_delay if is_direct else None,  # Link diretti richiedono l'attesa della challenge Cloudflare
+                            "intermediate_url": None  # Non più necessario, url punta già alla pagina intermedia
+                        })
+                        print(f"✅ [get_entry] Link aggiunto alla lista: {link_name}", file=sys.stderr)
+                    except Exception as e:
+                        print(f"⚠️ [get_entry] Errore parsing riga tabella: {e}", file=sys.stderr)
+                        import traceback
+                        print(f"   Traceback: {traceback.format_exc()}", file=sys.stderr)
+                        continue
+            except Exception as e:
+                print(f"⚠️ [get_entry] Errore parsing tabella download: {e}", file=sys.stderr)
+                import traceback
+                print(f"   Traceback: {traceback.format_exc()}", file=sys.stderr)
+                continue
+        
+        print(f"✅ [get_entry] Trovati {len(download_links)} link download totali", file=sys.stderr)
+    return download_links
+
+def parse_detail_page(content: bytes, rules: ExtractionRules) -> Dict[str, Any]:
+    """Estrae dalla pagina ROM titolo, box art, screenshot e URL della pagina download"""
+    soup = BeautifulSoup(content, 'html.parser')
+    
+    # Estrai titolo dal campo "App name" (stesso formato della ricerca)
+    title = None
+    
+    # Cerca il div info-block scora che contiene "App name"
+    for info_block in rules.selectors['app_info'].find_all(soup):
+        spans = rules.selectors['app_info_span'].find_all(info_block)
+        if len(spans) >= 2:
+            # Il primo span contiene la label, il secondo il valore
+            label_span = spans[0]
+            value_span = spans[1]
+            label_text = label_span.get_text(strip=True).lower()
+            if 'app name' in label_text:
+                title = value_span.get_text(strip=True)
+                break
+    
+    # Fallback: cerca h1 o title se non trovato in "App name"
+    if not title:
+        h1 = soup.find('h1')
+        if h1:
+            title = h1.get_text(strip=True)
+    
+    if not title:
+        title_tag = soup.find('title')
+        if title_tag:
+            title = title_tag.get_text(strip=True)
+            # Rimuovi suffissi comuni
+            title = rules.patterns['page_title_suffix'].sub('', title)
+    
+    if title:
+        title = title.strip()
+    
+    # Estrai immagine box art (stessa logica della lista)
+    box_image = None
+    img_elem = rules.selectors['box_art'].find(soup)
+    if img_elem:
+        box_image = img_elem.get('src', '')
+    
+    # Fallback: cerca prima immagine valida nell'articolo
+    if not box_image:
+        article = soup.find('article') or soup.find('main')
+        if article:
+            img_elem = article.find('img', src=re.compile(r'\.(jpg|jpeg|png|webp)', re.I))
+            if img_elem:
+                box_image = img_elem.get('src', '')
+    
+    # Estrai screenshot (primi 2)
+    screen_images = []
+    for link in rules.selectors['screenshot_link'].find_all(soup)[:2]:
+        img = link.find('img')
+        if img:
+            img_url = img.get('src', '')
+            if img_url:
+                screen_images.append(img_url)
+    
+    # Trova il pulsante "Download for Free" e leggi l'URL dalla pagina
+    # NON calcolare l'URL, deve essere letto dal pulsante
+    download_button = None
+    download_page_url = None
+    
+    # Link dentro div.btn-block con href verso /download/ (metodo più affidabile)
+    download_button = rules.selectors['download_button'].find(soup)
+    
+    # Leggi l'URL dal pulsante trovato
+    if download_button:
+        download_page_url = download_button.get('href', '')
+        if download_page_url:
+            # Assicurati che l'URL sia completo
+            if not download_page_url.startswith('http'):
+                download_page_url = f"{get_base_url()}{download_page_url}"
+        else:
+            pass
+    else:
+        pass
+    
+    return {'title': title, 'box_image': box_image, 'screen_images': screen_images,
+            'download_page_url': download_page_url}
+
 def get_entry(params: Dict[str, Any], source_dir: str) -> str:
     """
     Ottiene i dettagli completi di una ROM
@@ -200,8 +2027,10 @@ def get_entry(params: Dict[str, Any], source_dir: str) -> str:
     try:
         slug = params.get("slug", "")
         include_download_links = params.get("include_download_links", True)
+        lazy_links = params.get("lazy_links", False)  # Link risolti su richiesta con resolveLink
+        fields = entry_fields(params)
         if not slug:
-            return json.dumps({"entry": None})
+            return encode_response({"entry": None}, params)
         
         # Costruisci URL (lo slug può essere un URL completo o solo lo slug)
         if slug.startswith("http"):
@@ -209,309 +2038,60 @@ def get_entry(params: Dict[str, Any], source_dir: str) -> str:
         else:
             # Lo slug potrebbe essere solo il nome finale o l'URL completo
             if slug.startswith("nintendo-switch-roms/"):
-                page_url = f"https://nswpedia.com/{slug}"
+                page_url = f"{get_base_url()}/{slug}"
             else:
                 # Prova prima senza categoria
-                page_url = f"https://nswpedia.com/nintendo-switch-roms/{slug}"
+                page_url = f"{get_base_url()}/nintendo-switch-roms/{slug}"
         
         
         # Fai la richiesta alla pagina ROM
-        session = requests.Session()
+        session = new_session()
         headers = get_browser_headers()
         response = None
         try:
-            response = session.get(page_url, headers=headers, timeout=15)
+            response = fetch_with_retry(page_url, session=session, endpoint='detail', headers=headers, timeout=15)
             
             # Se 404, prova con categoria "action" (categoria comune)
             if response.status_code == 404 and not slug.startswith("http") and "/action/" not in page_url:
-                fallback_url = f"https://nswpedia.com/nintendo-switch-roms/action/{slug}"
+                fallback_url = f"{get_base_url()}/nintendo-switch-roms/action/{slug}"
                 print(f"🔄 [get_entry] 404, provo URL alternativo: {fallback_url}", file=sys.stderr)
-                response = session.get(fallback_url, headers=headers, timeout=15)
+                response = fetch_with_retry(fallback_url, session=session, endpoint='detail', headers=headers, timeout=15)
                 if response.status_code == 200:
                     page_url = fallback_url
             
             if response.status_code == 404:
                 print(f"⚠️ [get_entry] Pagina non trovata (404) per: {page_url}", file=sys.stderr)
-                return json.dumps({"entry": None})
+                return encode_response({"entry": None}, params)
             
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
             if e.response is not None and e.response.status_code == 404:
                 print(f"⚠️ [get_entry] Pagina non trovata (404) per: {page_url}", file=sys.stderr)
-                return json.dumps({"entry": None})
+                return encode_response({"entry": None}, params)
             raise
         
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Estrai titolo dal campo "App name" (stesso formato della ricerca)
-        title = None
-        
-        # Cerca il div info-block scora che contiene "App name"
-        info_blocks = soup.find_all('div', class_=lambda x: x and 'info-block' in str(x) and 'scora' in str(x))
-        for info_block in info_blocks:
-            spans = info_block.find_all('span', class_='body-2')
-            if len(spans) >= 2:
-                # Il primo span contiene la label, il secondo il valore
-                label_span = spans[0]
-                value_span = spans[1]
-                label_text = label_span.get_text(strip=True).lower()
-                if 'app name' in label_text:
-                    title = value_span.get_text(strip=True)
-                    break
-        
-        # Fallback: cerca h1 o title se non trovato in "App name"
-        if not title:
-            h1 = soup.find('h1')
-            if h1:
-                title = h1.get_text(strip=True)
-        
-        if not title:
-            title_tag = soup.find('title')
-            if title_tag:
-                title = title_tag.get_text(strip=True)
-                # Rimuovi suffissi comuni
-                title = re.sub(r'\s*-\s*NSWpedia.*$', '', title, flags=re.IGNORECASE)
-        
-        if title:
-            title = title.strip()
-        
-        # Estrai immagine box art (stessa logica della lista)
-        box_image = None
-        icon_div = soup.find('div', class_=lambda x: x and 'icon-big' in str(x) and 'icon' in str(x))
-        if icon_div:
-            img_elem = icon_div.find('img')
-            if img_elem:
-                box_image = img_elem.get('src', '')
-        
-        # Fallback: cerca prima immagine valida nell'articolo
-        if not box_image:
-            article = soup.find('article') or soup.find('main')
-            if article:
-                img_elem = article.find('img', src=re.compile(r'\.(jpg|jpeg|png|webp)', re.I))
-                if img_elem:
-                    box_image = img_elem.get('src', '')
-        
-        # Estrai screenshot (primi 2)
-        screen_images = []
-        screenshots_div = soup.find('div', id='lightgallery', class_='screenshots_row')
-        if screenshots_div:
-            screenshot_links = screenshots_div.find_all('a', class_='screen_shot')[:2]
-            for link in screenshot_links:
-                img = link.find('img')
-                if img:
-                    img_url = img.get('src', '')
-                    if img_url:
-                        screen_images.append(img_url)
-        
-        # Trova il pulsante "Download for Free" e leggi l'URL dalla pagina
-        # NON calcolare l'URL, deve essere letto dal pulsante
-        download_button = None
-        download_page_url = None
-        
-        # Metodo 1: cerca dentro div.btn-block (metodo più affidabile)
-        btn_block = soup.find('div', class_='btn-block')
-        download_button = None
-        if btn_block:
-            # Cerca il link dentro btn-block che ha href che inizia con /download/
-            download_button = btn_block.find('a', href=re.compile(r'/download/'))
-        
-        # Leggi l'URL dal pulsante trovato
-        if download_button:
-            download_page_url = download_button.get('href', '')
-            if download_page_url:
-                # Assicurati che l'URL sia completo
-                if not download_page_url.startswith('http'):
-                    download_page_url = f"https://nswpedia.com{download_page_url}"
-            else:
-                pass
-        else:
-            pass
+        parsed = memo_parse('detail', response.content, parse_detail_page, load_extraction_rules())
+        title, box_image = parsed['title'], parsed['box_image']
+        screen_images, download_page_url = parsed['screen_images'], parsed['download_page_url']
         
         download_links = []
         
-        # Estrai download links solo se richiesto
-        if not include_download_links:
+        # Estrai download links solo se richiesto (pagina download e mirror non vengono aperti)
+        if not include_download_links or 'links' not in fields:
             pass
         elif not download_page_url:
             pass
+        elif lazy_links:
+            # Un solo descrittore per la pagina download, risolto su richiesta con resolveLink
+            download_links = [lazy_link_descriptor("download_page", download_page_url, page_url, name="Download",
+                                                   type="ROM", format="unknown", size=None, size_str=None,
+                                                   requires_webview=False)]
         else:
-            
-            # Visita la pagina di download
-            # Gestisce il caso in cui la pagina fa redirect a un popup fuori dal dominio nswpedia.com
-            download_soup = None
-            max_retries = 3
-            retry_count = 0
-            
-            while retry_count < max_retries and download_soup is None:
-                try:
-                    download_response = session.get(download_page_url, headers=get_browser_headers(referer=page_url), timeout=15, allow_redirects=True)
-                    download_response.raise_for_status()
-                    
-                    # Controlla se l'URL finale è fuori dal dominio nswpedia.com (popup)
-                    final_url = download_response.url
-                    parsed_final = urllib.parse.urlparse(final_url)
-                    parsed_original = urllib.parse.urlparse(download_page_url)
-                    
-                    # Se l'URL finale è su un dominio diverso da nswpedia.com, è un popup
-                    if parsed_final.netloc != parsed_original.netloc and 'nswpedia.com' not in parsed_final.netloc:
-                        print(f"⚠️ [get_entry] Rilevato popup fuori dal dominio: {final_url}", file=sys.stderr)
-                        print(f"   URL originale: {download_page_url}", file=sys.stderr)
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            print(f"   Riprovo (tentativo {retry_count + 1}/{max_retries})...", file=sys.stderr)
-                            # Attendi un po' prima di riprovare
-                            import time
-                            time.sleep(1)
-                            continue
-                        else:
-                            print(f"   ⚠️ Massimo numero di tentativi raggiunto, salto questa pagina", file=sys.stderr)
-                            break
-                    
-                    # Se siamo ancora su nswpedia.com, verifica che la pagina contenga le tabelle di download
-                    download_soup = BeautifulSoup(download_response.content, 'html.parser')
-                    download_tables_check = download_soup.find_all('div', class_='table-download')
-                    
-                    # Se non ci sono tabelle di download, potrebbe essere una pagina popup o errore
-                    if not download_tables_check:
-                        print(f"⚠️ [get_entry] Pagina caricata ma nessuna tabella download trovata: {final_url}", file=sys.stderr)
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            print(f"   Riprovo (tentativo {retry_count + 1}/{max_retries})...", file=sys.stderr)
-                            import time
-                            time.sleep(1)
-                            download_soup = None
-                            continue
-                        else:
-                            print(f"   ⚠️ Massimo numero di tentativi raggiunto, salto questa pagina", file=sys.stderr)
-                            download_soup = None
-                            break
-                    
-                    print(f"✅ [get_entry] Pagina download caricata correttamente: {final_url} ({len(download_tables_check)} tabelle trovate)", file=sys.stderr)
-                    break
-                    
-                except Exception as e:
-                    print(f"❌ [get_entry] Errore caricamento pagina download: {e}", file=sys.stderr)
-                    import traceback
-                    print(f"   Traceback: {traceback.format_exc()}", file=sys.stderr)
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        import time
-                        time.sleep(1)
-                        continue
-                    else:
-                        download_soup = None
-                        break
-            
-            if download_soup:
-                # Trova tutte le tabelle di download
-                download_tables = download_soup.find_all('div', class_='table-download')
-            
-                for table_div in download_tables:
-                    try:
-                        # Leggi il titolo della tabella per capire se è "Direct" o altro
-                        h3 = table_div.find('h3')
-                        table_title = h3.get_text(strip=True) if h3 else ""
-                        
-                        # Determina se richiede webview e estrai nome del sito
-                        is_direct = "Direct" in table_title
-                        requires_webview = not is_direct
-                        
-                        # Estrai nome del sito dal titolo (es: "Downloads List - 1Fichier" -> "1Fichier")
-                        site_name = None
-                        if not is_direct and "Downloads List -" in table_title:
-                            # Estrai il nome dopo "Downloads List -"
-                            parts = table_title.split("Downloads List -")
-                            if len(parts) > 1:
-                                site_name = parts[1].strip()
-                        elif is_direct:
-                            site_name = "Diretto"  # Sarà localizzato dall'app
-                        
-                        # Trova la tabella
-                        table = table_div.find('table')
-                        if not table:
-                            continue
-                        
-                        tbody = table.find('tbody')
-                        if not tbody:
-                            continue
-                        
-                        rows = tbody.find_all('tr')
-                        for row in rows:
-                            try:
-                                cells = row.find_all('td')
-                                if len(cells) < 3:
-                                    continue
-                                
-                                # Prima cella: link con nome file
-                                link_cell = cells[0]
-                                link_elem = link_cell.find('a')
-                                if not link_elem:
-                                    continue
-                                
-                                link_url = link_elem.get('href', '')
-                                if not link_url.startswith('http'):
-                                    link_url = f"https://nswpedia.com{link_url}"
-                                
-                                # Codifica correttamente l'URL (gestisce spazi e caratteri speciali)
-                                parsed = urllib.parse.urlparse(link_url)
-                                encoded_path = urllib.parse.quote(parsed.path, safe='/')
-                                link_url = urllib.parse.urlunparse((
-                                    parsed.scheme,
-                                    parsed.netloc,
-                                    encoded_path,
-                                    parsed.params,
-                                    parsed.query,
-                                    parsed.fragment
-                                ))
-                                
-                                file_name = link_elem.get_text(strip=True)
-                                
-                                # Seconda cella: size
-                                size_str = cells[1].get_text(strip=True)
-                                
-                                # Terza cella: type
-                                format_type = cells[2].get_text(strip=True).upper()
-                                
-                                # Per i link diretti, NON estrarre l'URL finale
-                                # Cloudflare richiede una challenge JavaScript che richiede ~20 secondi
-                                # Il WebView deve aprire la pagina intermedia per completare la challenge e ottenere il cookie cf_clearance
-                                # Poi il WebView può intercettare il download quando parte
-                                final_url = link_url
-                                intermediate_url = link_url if is_direct else None  # URL della pagina intermedia per WebView
-                                
-                                # Costruisci il nome del link: mostra "Diretto" o il nome del sito alla fine tra parentesi
-                                link_name = file_name
-                                if site_name:
-                                    # Se è diretto, mostra "nome file (Diretto)", altrimenti "nome file (NomeSito)"
-                                    if is_direct:
-                                        link_name = f"{file_name} (Diretto)"
-                                    else:
-                                        link_name = f"{file_name} ({site_name})"
-                                
-                                download_links.append({
-                                    "name": link_name,
-                                    "type": "ROM",
-                                    "format": format_type or "unknown",
-                                    "url": intermediate_url if is_direct else final_url,  # Per link diretti, usa pagina intermedia per WebView
-                                    "size": None,
-                                    "size_str": size_str,
-                                    "requires_webview": True if is_direct else requires_webview,  # Link diretti richiedono WebView per Cloudflare
-                                    "delay_seconds": 20 if is_direct else None,  # Link diretti richiedono 20 secondi per challenge Cloudflare
-                                    "intermediate_url": None  # Non più necessario, url punta già alla pagina intermedia
-                                })
-                                print(f"✅ [get_entry] Link aggiunto alla lista: {link_name}", file=sys.stderr)
-                            except Exception as e:
-                                print(f"⚠️ [get_entry] Errore parsing riga tabella: {e}", file=sys.stderr)
-                                import traceback
-                                print(f"   Traceback: {traceback.format_exc()}", file=sys.stderr)
-                                continue
-                    except Exception as e:
-                        print(f"⚠️ [get_entry] Errore parsing tabella download: {e}", file=sys.stderr)
-                        import traceback
-                        print(f"   Traceback: {traceback.format_exc()}", file=sys.stderr)
-                        continue
-                
-                print(f"✅ [get_entry] Trovati {len(download_links)} link download totali", file=sys.stderr)
+            download_links = get_download_page_links(download_page_url, page_url, session)
+        
+        # Probe dei mirror (opzionale): ordina i link per tempo di download stimato
+        if download_links and not lazy_links and params.get("probe_links", False):
+            download_links = probe_links(download_links, page_url, params.get("probe_budget_ms"))
         
         # Estrai regioni (non disponibili su NSWpedia)
         regions = []
@@ -527,14 +2107,179 @@ def get_entry(params: Dict[str, Any], source_dir: str) -> str:
             "links": download_links
         }
         
-        return json.dumps({"entry": entry})
+        return encode_response({"entry": select_entry_fields(entry, fields)}, params)
         
+    except (SourceUnavailableError, DeadlineExceededError):
+        raise
     except Exception as e:
         import traceback
         error_msg = f"{str(e)}\n{traceback.format_exc()}"
         print(f"❌ [get_entry] Errore: {error_msg}", file=sys.stderr)
         return json.dumps({"error": error_msg})
 
+# Link "lazy": con "lazy_links": true getEntry restituisce descrittori non risolti (campo
+# "resolve") che l'app risolve al tap con resolveLink; i link risolti restano in cache
+RESOLVE_CACHE_TTL_SECONDS = 600
+RESOLVE_CACHE_SIZE = 128
+
+_resolve_cache_lock = threading.Lock()
+_resolve_cache = OrderedDict()  # descrittore -> (scadenza, link risolti)
+
+def lazy_link_descriptor(kind: str, url: str, referer: Optional[str] = None, **link) -> Dict[str, Any]:
+    """Link non ancora risolto: i campi già noti più il descrittore da passare a resolveLink"""
+    return dict(link, url=url, resolved=False, resolve={"kind": kind, "url": url, "referer": referer})
+
+def resolve_link(params: Dict[str, Any], source_dir: str) -> str:
+    """
+    Risolve un link lazy restituito da getEntry
+    Accetta "link" (il link completo) oppure "resolve" (solo il descrittore); ritorna {"links": [...]}
+    """
+    link = params.get("link") or {}
+    descriptor = params.get("resolve") or link.get("resolve")
+    if not isinstance(descriptor, dict) or not descriptor.get("url"):
+        return json.dumps({"error": "Descrittore del link non fornito"})
+    key = json.dumps(descriptor, sort_keys=True)
+    with _resolve_cache_lock:
+        cached = _resolve_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'resolve_link', 'result': 'hit'})
+        return json.dumps({"links": cached[1], "cached": True})
+    metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'resolve_link', 'result': 'miss'})
+
+    base_link = {k: v for k, v in link.items() if k not in ('resolve', 'resolved')}
+    links = resolve_descriptor(descriptor, base_link)
+    if links:
+        with _resolve_cache_lock:
+            _resolve_cache[key] = (time.monotonic() + RESOLVE_CACHE_TTL_SECONDS, links)
+            _resolve_cache.move_to_end(key)
+            while len(_resolve_cache) > RESOLVE_CACHE_SIZE:
+                _resolve_cache.popitem(last=False)
+    return json.dumps({"links": links})
+
+def resolve_descriptor(descriptor: Dict[str, Any], base_link: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Risolve un descrittore NSWpedia: la pagina download diventa la lista dei suoi link"""
+    if descriptor.get("kind") == "download_page":
+        return get_download_page_links(descriptor["url"], descriptor.get("referer") or get_base_url(), new_session())
+    return []
+
+# Miniature delle copertine: getThumbnails scarica in parallelo le immagini di una pagina di
+# risultati, le riduce con PIL (se installato) al lato massimo richiesto e le salva in
+# cache/thumbs, con un limite di spazio e rimozione delle meno usate (LRU sull'ultimo accesso)
+THUMB_DIR_NAME = 'thumbs'
+THUMB_DEFAULT_SIZE = 256
+THUMB_MAX_SIZE = 1024
+THUMB_CACHE_MAX_BYTES = 64 * 1024 * 1024
+THUMB_CACHE_TARGET_RATIO = 0.8  # Dopo una rimozione la cache scende all'80% del limite
+THUMB_MAX_WORKERS = 6
+THUMB_JPEG_QUALITY = 85
+
+_thumb_lock = threading.Lock()
+_thumb_cache_bytes = {}  # directory -> byte occupati (calcolati alla prima scrittura)
+
+def get_thumb_dir(source_dir: Optional[str] = None) -> Optional[str]:
+    cache_dir = get_cache_dir(source_dir)
+    if not cache_dir:
+        return None
+    thumb_dir = os.path.join(cache_dir, THUMB_DIR_NAME)
+    os.makedirs(thumb_dir, exist_ok=True)
+    return thumb_dir
+
+def make_thumbnail(data: bytes, size: int) -> Optional[bytes]:
+    """Riduce un'immagine a lato massimo size (JPEG); None se PIL non è disponibile"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    from io import BytesIO
+    with Image.open(BytesIO(data)) as img:
+        img.draft('RGB', (size, size))  # I JPEG vengono decodificati già ridotti
+        if img.mode in ('RGBA', 'LA', 'P'):
+            rgba = img.convert('RGBA')
+            img = Image.new('RGB', rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.split()[3])
+        else:
+            img = img.convert('RGB')
+        img.thumbnail((size, size))
+        output = BytesIO()
+        img.save(output, 'JPEG', quality=THUMB_JPEG_QUALITY, optimize=True)
+        return output.getvalue()
+
+def store_thumbnail(thumb_dir: str, path: str, data: bytes) -> None:
+    """Scrive una miniatura e applica il limite di spazio della cache"""
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    with _thumb_lock:
+        used = _thumb_cache_bytes.get(thumb_dir)
+        if used is None:
+            used = sum(entry.stat().st_size for entry in os.scandir(thumb_dir) if entry.is_file())
+        else:
+            used += len(data)
+        if used > THUMB_CACHE_MAX_BYTES:
+            entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                             for entry in os.scandir(thumb_dir) if entry.is_file())
+            for _, entry_size, entry_path in entries:
+                if used <= THUMB_CACHE_MAX_BYTES * THUMB_CACHE_TARGET_RATIO:
+                    break
+                try:
+                    os.remove(entry_path)
+                    used -= entry_size
+                except OSError:
+                    pass
+            metrics_inc('thumbnail_evictions_total', {'source': SOURCE_ID})
+        _thumb_cache_bytes[thumb_dir] = used
+
+def fetch_thumbnail(url: str, size: int, thumb_dir: str) -> Dict[str, Any]:
+    """Ritorna la miniatura di url dalla cache o scaricandola"""
+    name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    for path, resized in ((os.path.join(thumb_dir, f'{name}_{size}.jpg'), True),
+                          (os.path.join(thumb_dir, f'{name}_orig'), False)):
+        if os.path.exists(path):
+            try:
+                os.utime(path)  # Ultimo accesso per l'LRU
+            except OSError:
+                pass
+            metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'thumbnail', 'result': 'hit'})
+            return {"url": url, "path": path, "resized": resized, "cached": True}
+    metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'thumbnail', 'result': 'miss'})
+    try:
+        response = http_get(url, endpoint='image', rate_limited=False, headers={'User-Agent': get_random_ua()},
+                            timeout=10)
+        content_type = response.headers.get('Content-Type', '').lower()
+        if response.status_code != 200 or 'image' not in content_type:
+            return {"url": url, "path": None, "error": f"HTTP {response.status_code} ({content_type or 'nessun tipo'})"}
+        data = make_thumbnail(response.content, size)
+        resized = data is not None
+        path = os.path.join(thumb_dir, f'{name}_{size}.jpg' if resized else f'{name}_orig')
+        store_thumbnail(thumb_dir, path, data if resized else response.content)
+        return {"url": url, "path": path, "resized": resized, "cached": False}
+    except Exception as e:
+        print(f"⚠️ [get_thumbnails] Errore miniatura {url}: {e}", file=sys.stderr)
+        return {"url": url, "path": None, "error": str(e)}
+
+def get_thumbnails(params: Dict[str, Any], source_dir: str) -> str:
+    """
+    Miniature locali per le copertine di una pagina di risultati
+    Accetta "urls" oppure "results"/"roms" (le ROM di searchRoms, usa box_image) e "size" (lato massimo in px)
+    """
+    rows = params.get("results") or params.get("roms") or []
+    urls = params.get("urls") or [rom.get("box_image") for rom in rows if isinstance(rom, dict)]
+    urls = list(dict.fromkeys(url for url in urls if isinstance(url, str) and url.startswith('http')))
+    try:
+        size = max(16, min(THUMB_MAX_SIZE, int(params.get("size") or THUMB_DEFAULT_SIZE)))
+    except (TypeError, ValueError):
+        return json.dumps({"error": "size non valido"})
+    thumb_dir = get_thumb_dir(source_dir)
+    if not thumb_dir:
+        return json.dumps({"error": "Cache delle miniature non disponibile"})
+    if not urls:
+        return json.dumps({"thumbnails": [], "size": size})
+    fetch = run_with_context(fetch_thumbnail)
+    with ThreadPoolExecutor(max_workers=min(THUMB_MAX_WORKERS, len(urls))) as executor:
+        thumbnails = list(executor.map(lambda url: fetch(url, size, thumb_dir), urls))
+    return json.dumps({"thumbnails": thumbnails, "size": size})
+
 def get_platforms(source_dir: str) -> str:
     """Ritorna le piattaforme supportate (solo Switch)"""
     platforms = {
@@ -559,22 +2304,211 @@ def execute(params_json: str) -> str:
         method = params.get("method", "")
         source_dir = params.get("source_dir", os.path.dirname(__file__))
         
-        if method == "searchRoms":
-            return search_roms(params, source_dir)
-        elif method == "getEntry":
-            return get_entry(params, source_dir)
-        elif method == "getPlatforms":
-            return get_platforms(source_dir)
-        elif method == "getRegions":
-            return get_regions()
-        else:
-            return json.dumps({"error": f"Metodo sconosciuto: {method}"})
+        _request_context.method = method
+        _request_context.base_url = params.get("base_url")
+        _request_context.source_dir = source_dir
+        _request_context.rate_limit = params.get("rate_limit")
+        _request_context.retry_budget = RETRY_BUDGET_PER_CALL
+        _request_context.upstream_failed = False
+        deadline_ms = params.get("deadline_ms")
+        _request_context.deadline = time.monotonic() + float(deadline_ms) / 1000.0 if deadline_ms else None
+        labels = {'source': SOURCE_ID, 'method': str(method)}
+        start = time.monotonic()
+        policy = serve_policy(method, params)
+        cached = None
+        profiled = False
+        try:
+            cached = cached_negative_result(method, params) or serve_stored_response(method, params, policy)
+            if cached is not None:
+                result = cached
+            elif profiling_enabled(params):
+                # Volutamente fuori da single_flight: ogni chiamata profilata misura la propria esecuzione
+                profiled = True
+                result = run_profiled(method, params, source_dir)
+            else:
+                result = single_flight(method, params, lambda: dispatch_method(method, params, source_dir))
+        except SourceUnavailableError as e:
+            result = source_unavailable_response(params, e)
+        except DeadlineExceededError as e:
+            result = json.dumps({"error": str(e), "error_code": "deadline_exceeded"})
+        except Exception:
+            metrics_inc('execute_errors_total', labels)
+            # Errore imprevisto (es. pagina non raggiungibile): meglio l'ultima copia salvata
+            cached = result = offline_response(params, policy)
+            if result is None:
+                raise
+        finally:
+            metrics_observe('execute_latency_seconds', labels, time.monotonic() - start)
+            metrics_inc('execute_calls_total', labels)
+            save_rate_limits()
+            save_cookie_jar()
+            upstream_failed = getattr(_request_context, 'upstream_failed', False)
+            _request_context.method = None
+            _request_context.base_url = None
+            _request_context.source_dir = None
+            _request_context.rate_limit = None
+            _request_context.retry_budget = None
+            _request_context.upstream_failed = False
+            _request_context.deadline = None
+        if result.startswith('{"error"'):
+            metrics_inc('execute_errors_total', labels)
+            result = offline_response(params, policy) or result
+        elif cached is None and method in ("searchRoms", "getEntry") and not upstream_failed:
+            # Solo risposte ottenute senza errori upstream (non risultati vuoti dovuti a un guasto)
+            # Il blocco "profile" riguarda solo questa chiamata: non va riproposto dalle cache
+            good = strip_profile(result, params) if profiled else result
+            remember_negative_result(method, params, good)
+            if not is_negative_result(method, good):
+                # I "non trovato" restano solo nella cache negativa, con il suo TTL breve
+                remember_good_response(params, good)
+                if policy:
+                    store_response(params, good)
+        elif upstream_failed and is_negative_result(method, result):
+            # Risultato vuoto dovuto a un guasto di rete: meglio l'ultima copia salvata
+            result = offline_response(params, policy) or result
+        return result
     except Exception as e:
         import traceback
         error_msg = f"{str(e)}\n{traceback.format_exc()}"
         print(f"❌ [execute] Errore: {error_msg}", file=sys.stderr)
         return json.dumps({"error": error_msg})
 
+def dispatch_method(method: str, params: Dict[str, Any], source_dir: str) -> str:
+    """Instrada la chiamata execute() al metodo richiesto"""
+    if method == "searchRoms":
+        return search_roms(params, source_dir)
+    elif method == "getEntry":
+        return get_entry(params, source_dir)
+    elif method == "getPlatforms":
+        return get_platforms(source_dir)
+    elif method == "getRegions":
+        return get_regions()
+    elif method == "getStats":
+        return get_stats(params, source_dir)
+    elif method == "getCircuitState":
+        return json.dumps({"circuits": circuit_snapshot()})
+    elif method == "resolveLink":
+        return resolve_link(params, source_dir)
+    elif method == "getThumbnails":
+        return get_thumbnails(params, source_dir)
+    elif method == "importCookies":
+        return import_cookies(params)
+    elif method == "exportCookies":
+        return export_cookies(params)
+    else:
+        return json.dumps({"error": f"Metodo sconosciuto: {method}"})
+
+def get_stats(params: Dict[str, Any], source_dir: str) -> str:
+    """
+    Ritorna il registro metriche della source (contatori e percentili di latenza)
+    Con prometheus_file=true (o un percorso) scrive anche un file testuale Prometheus
+    """
+    stats = metrics_snapshot()
+    stats["rate_limits"] = rate_limit_snapshot()
+    stats["circuits"] = circuit_snapshot()
+    stats["timeouts"] = timeout_snapshot()
+    prometheus_file = params.get("prometheus_file")
+    if prometheus_file:
+        if not isinstance(prometheus_file, str):
+            prometheus_file = os.path.join(source_dir, 'metrics', f'{SOURCE_ID}.prom')
+        stats["prometheus_file"] = write_prometheus_file(prometheus_file)
+    return json.dumps(stats)
+
+# Profilazione opt-in delle chiamate execute() (parametro "profile" o variabile d'ambiente)
+PROFILE_ENV_VAR = 'TOTTODRILLO_PROFILE'
+PROFILE_DIR_NAME = 'profiles'
+PROFILE_KEEP = 20  # Numero di profili conservati prima della rotazione
+
+# cProfile e tracemalloc sono globali all'interprete: una sola chiamata profilata alla volta
+_profile_lock = threading.Lock()
+
+def profiling_enabled(params: Dict[str, Any]) -> bool:
+    """Verifica se la chiamata corrente deve essere profilata"""
+    flag = params.get("profile")
+    if flag is None:
+        flag = os.environ.get(PROFILE_ENV_VAR, '')
+    return str(flag).strip().lower() in ('1', 'true', 'yes', 'on')
+
+def _rotate_profiles(profile_dir: str) -> None:
+    """Mantiene solo gli ultimi PROFILE_KEEP profili (file .prof + .txt)"""
+    try:
+        names = sorted(n for n in os.listdir(profile_dir) if n.endswith('.prof'))
+        for name in names[:-PROFILE_KEEP]:
+            base = os.path.join(profile_dir, name[:-len('.prof')])
+            for ext in ('.prof', '.txt'):
+                if os.path.exists(base + ext):
+                    os.remove(base + ext)
+    except OSError as e:
+        print(f"⚠️ [profile] Errore rotazione profili: {e}", file=sys.stderr)
+
+def strip_profile(result: str, params: Dict[str, Any]) -> str:
+    """Rimuove da una risposta il blocco "profile" aggiunto da run_profiled()"""
+    try:
+        data = json.loads(result)
+    except ValueError:
+        return result
+    if not isinstance(data, dict) or "profile" not in data:
+        return result
+    del data["profile"]
+    return dumps_json(data, compact=response_schema(params) >= RESPONSE_SCHEMA_COMPACT)
+
+
+def run_profiled(method: str, params: Dict[str, Any], source_dir: str) -> str:
+    """
+    Esegue dispatch_method() sotto cProfile e tracemalloc
+    Salva le statistiche in <source_dir>/profiles e aggiunge "profile" alla risposta
+    """
+    import cProfile
+    import io
+    import pstats
+    import tracemalloc
+
+    with _profile_lock:
+        profile_dir = os.path.join(source_dir, PROFILE_DIR_NAME)
+        os.makedirs(profile_dir, exist_ok=True)
+        now = time.time()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f'-{int(now * 1000) % 1000:03d}'
+        base = os.path.join(profile_dir, f'{stamp}_{method}')
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+        start = time.monotonic()
+        profiler.enable()
+        try:
+            result = dispatch_method(method, params, source_dir)
+        finally:
+            profiler.disable()
+            elapsed = time.monotonic() - start
+            _, peak_memory = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+
+        profiler.dump_stats(base + '.prof')
+        report = io.StringIO()
+        report.write(f"method: {method}\nduration_ms: {elapsed * 1000:.1f}\npeak_memory_bytes: {peak_memory}\n\n")
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(40)
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(report.getvalue())
+        _rotate_profiles(profile_dir)
+
+    print(f"⏱️ [profile] {method}: {elapsed * 1000:.1f} ms, picco memoria {peak_memory} bytes -> {base}.prof", file=sys.stderr)
+    try:
+        data = json.loads(result)
+    except ValueError:
+        return result
+    if isinstance(data, dict):
+        data["profile"] = {
+            "path": base + '.prof',
+            "report_path": base + '.txt',
+            "duration_ms": round(elapsed * 1000, 1),
+            "peak_memory_bytes": peak_memory
+        }
+        return dumps_json(data, compact=response_schema(params) >= RESPONSE_SCHEMA_COMPACT)
+    return result
+
 if __name__ == "__main__":
     # Test locale
     if len(sys.argv) > 1:
@@ -0,0 +1,99 @@
+"""
+Fixture comuni dei test delle source Python
+Ogni test carica da zero lo script della source (stato globale pulito) e, quando serve,
+sostituisce il trasporto HTTP di requests con le pagine registrate in benchmarks/fixtures
+"""
+import os
+import shutil
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests.adapters
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import fixture_routes  # noqa: E402
+
+SOURCES = ('vimms', 'nswpedia', 'switchroms')
+
+
+@pytest.fixture(params=SOURCES)
+def source(request):
+    """Modulo di ciascuna source (i test sull'infrastruttura comune girano su tutte e tre)"""
+    return fixture_routes.load_source_module(request.param)
+
+
+@pytest.fixture
+def vimms():
+    return fixture_routes.load_source_module('vimms')
+
+
+@pytest.fixture
+def nswpedia():
+    return fixture_routes.load_source_module('nswpedia')
+
+
+@pytest.fixture
+def switchroms():
+    return fixture_routes.load_source_module('switchroms')
+
+
+@pytest.fixture
+def make_source_dir(tmp_path):
+    """Crea una source_dir temporanea con i file JSON della source indicata"""
+    def make(site: str) -> str:
+        source_dir = tmp_path / site
+        source_dir.mkdir(exist_ok=True)
+        for name in os.listdir(os.path.join(fixture_routes.REPO_DIR, site)):
+            if name.endswith('.json'):
+                shutil.copy(os.path.join(fixture_routes.REPO_DIR, site, name), source_dir)
+        return str(source_dir)
+    return make
+
+
+@pytest.fixture
+def fixture_transport(monkeypatch):
+    """Risponde alle richieste verso gli upstream con le fixture, senza accedere alla rete"""
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, 'send', requests.adapters.HTTPAdapter.send)
+    monkeypatch.setenv('TOTTODRILLO_RATE_LIMIT', '0')
+    fixture_routes.install_fixture_transport()
+
+
+@pytest.fixture
+def local_server():
+    """
+    Avvia server HTTP locali. routes: path -> (status, headers, body) oppure una funzione
+    che riceve l'handler e scrive la risposta; i path non previsti rispondono 404
+    """
+    servers = []
+
+    def start(routes) -> str:
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                route = routes.get(self.path.split('?')[0])
+                if route is None:
+                    self.send_error(404)
+                elif callable(route):
+                    route(self)
+                else:
+                    status, headers, body = route
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_port}'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,88 @@
+"""Circuit breaker per host: apertura, prova half-open e risposte con la sorgente non disponibile"""
+import json
+
+import pytest
+
+
+def open_breaker(source, host='example.com'):
+    breaker = source.get_circuit_breaker(host)
+    for _ in range(source.CIRCUIT_FAILURE_THRESHOLD):
+        breaker.before_request()
+        breaker.record_failure('Timeout')
+    return breaker
+
+
+def test_opens_after_consecutive_failures(source):
+    breaker = source.get_circuit_breaker('example.com')
+    for _ in range(source.CIRCUIT_FAILURE_THRESHOLD - 1):
+        breaker.record_failure('Timeout')
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.failures == 0
+    open_breaker(source)
+    assert breaker.state == 'open'
+    with pytest.raises(source.SourceUnavailableError) as error:
+        breaker.before_request()
+    assert error.value.host == 'example.com' and error.value.retry_in > 0
+    assert source.circuit_snapshot()['example.com']['state'] == 'open'
+
+
+def test_half_open_lets_one_probe_through(source, monkeypatch):
+    breaker = open_breaker(source)
+    monkeypatch.setattr(source, 'CIRCUIT_COOLDOWN_SECONDS', 0.0)
+    breaker.before_request()
+    assert breaker.state == 'half_open'
+    with pytest.raises(source.SourceUnavailableError):
+        breaker.before_request()
+    # Prova non eseguita (deadline, errore locale): un'altra richiesta può riprovare
+    breaker.release_probe()
+    breaker.before_request()
+    breaker.record_failure('http_503')
+    assert breaker.state == 'open'
+    breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    breaker.before_request()
+    breaker.before_request()
+
+
+def test_http_get_trips_on_5xx_only(source, local_server, monkeypatch):
+    monkeypatch.setenv('TOTTODRILLO_RATE_LIMIT', '0')
+    hits = []
+
+    def failing(handler):
+        hits.append(handler.path)
+        handler.send_response(503)
+        handler.send_header('Content-Length', '0')
+        handler.end_headers()
+
+    base = local_server({'/down': failing})
+    host = base.split('//')[1]
+    for _ in range(source.CIRCUIT_FAILURE_THRESHOLD + 2):
+        assert source.http_get(f'{base}/missing').status_code == 404
+    assert source.get_circuit_breaker(host).state == 'closed'
+    for _ in range(source.CIRCUIT_FAILURE_THRESHOLD):
+        source.http_get(f'{base}/down')
+    with pytest.raises(source.SourceUnavailableError):
+        source.http_get(f'{base}/down')
+    assert len(hits) == source.CIRCUIT_FAILURE_THRESHOLD
+
+
+def test_execute_serves_last_good_response_when_unavailable(source, tmp_path, monkeypatch):
+    state = {'down': False}
+
+    def upstream(method, params, source_dir):
+        if state['down']:
+            raise source.SourceUnavailableError('example.com', 12.0)
+        return json.dumps({'entry': {'slug': params['slug'], 'title': 'A'}})
+
+    monkeypatch.setattr(source, 'dispatch_method', upstream)
+
+    def call(**params):
+        return json.loads(source.execute(json.dumps(dict(params, method='getEntry', source_dir=str(tmp_path)))))
+
+    call(slug='a')
+    state['down'] = True
+    result = call(slug='a', refresh=True)
+    assert result['source_unavailable'] is True and result['entry']['title'] == 'A'
+    result = call(slug='b')
+    assert result['error_code'] == 'source_unavailable' and result['retry_after_seconds'] == 12.0
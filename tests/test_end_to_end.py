@@ -0,0 +1,44 @@
+"""searchRoms/getEntry/getStats di ogni source sulle pagine registrate (trasporto delle fixture)"""
+import json
+
+import pytest
+
+CALLS = {
+    'vimms': ({'search_key': 'zelda'}, {'slug': '1302'}),
+    'nswpedia': ({'search_key': 'mario'}, {'slug': 'rpg/xenoblade-chronicles-3-60'}),
+    'switchroms': ({'search_key': ''}, {'slug': 'xenoblade-chronicles-3'}),
+}
+
+
+@pytest.fixture
+def call(source, make_source_dir, fixture_transport):
+    source_dir = make_source_dir(source.SOURCE_ID)
+
+    def call(method, **params):
+        return json.loads(source.execute(json.dumps(dict(params, method=method, source_dir=source_dir))))
+    return call
+
+
+def test_search_and_entry(source, call):
+    search, entry = CALLS[source.SOURCE_ID]
+    result = call('searchRoms', **search)
+    roms = result.get('roms') or result.get('results')
+    assert roms and result['current_page'] == 1
+    assert all(rom.get('slug') and rom.get('title') for rom in roms)
+    result = call('getEntry', **entry)
+    assert result['entry']['title'] and result['entry']['links']
+
+
+def test_stats_count_upstream_requests(source, call, tmp_path):
+    search, _ = CALLS[source.SOURCE_ID]
+    call('searchRoms', **search)
+    stats = call('getStats', prometheus_file=str(tmp_path / 'metrics.prom'))
+    assert stats['source'] == source.SOURCE_ID
+    counters = {(counter['name'], counter['labels'].get('method')) for counter in stats['counters']}
+    assert ('execute_calls_total', 'searchRoms') in counters
+    assert ('upstream_requests_total', 'searchRoms') in counters
+    latency = [h for h in stats['histograms'] if h['name'] == 'execute_latency_seconds']
+    assert latency and latency[0]['count'] >= 1 and latency[0]['p50'] is not None
+    assert {'rate_limits', 'circuits', 'timeouts'} <= set(stats)
+    with open(stats['prometheus_file'], encoding='utf-8') as f:
+        assert 'execute_calls_total' in f.read()
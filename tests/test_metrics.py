@@ -0,0 +1,40 @@
+"""Registro metriche: contatori, istogrammi di latenza ed esportazione Prometheus"""
+
+
+def find(items, name, **labels):
+    return [item for item in items if item['name'] == name and labels.items() <= item['labels'].items()]
+
+
+def test_counters_are_keyed_by_labels(source):
+    source.metrics_inc('test_total', {'host': 'a', 'method': 'x'})
+    source.metrics_inc('test_total', {'method': 'x', 'host': 'a'}, 2)
+    source.metrics_inc('test_total', {'host': 'b', 'method': 'x'})
+    counters = source.metrics_snapshot()['counters']
+    assert find(counters, 'test_total', host='a')[0]['value'] == 3
+    assert find(counters, 'test_total', host='b')[0]['value'] == 1
+
+
+def test_histogram_percentiles(source):
+    for seconds in [0.01] * 90 + [0.3] * 9 + [12.0]:
+        source.metrics_observe('test_latency_seconds', {'host': 'a'}, seconds)
+    histogram = find(source.metrics_snapshot()['histograms'], 'test_latency_seconds')[0]
+    assert histogram['count'] == 100 and histogram['max'] == 12.0
+    # Limite superiore del bucket che contiene il percentile, mai oltre il massimo osservato
+    assert histogram['p50'] == 0.05
+    assert histogram['p95'] == 0.5
+    assert histogram['p99'] == 0.5
+    source.metrics_observe('test_single_seconds', {}, 0.02)
+    assert find(source.metrics_snapshot()['histograms'], 'test_single_seconds')[0]['p99'] == 0.02
+
+
+def test_prometheus_file(source, tmp_path):
+    source.metrics_inc('test_total', {'host': 'a"b'})
+    source.metrics_observe('test_latency_seconds', {'host': 'a'}, 0.2)
+    with open(source.write_prometheus_file(str(tmp_path / 'out' / 'metrics.prom')), encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert '# TYPE tottodrillo_test_total counter' in lines
+    assert 'tottodrillo_test_total{host="a\\"b"} 1' in lines
+    assert 'tottodrillo_test_latency_seconds_bucket{host="a",le="0.1"} 0' in lines
+    assert 'tottodrillo_test_latency_seconds_bucket{host="a",le="0.25"} 1' in lines
+    assert 'tottodrillo_test_latency_seconds_bucket{host="a",le="+Inf"} 1' in lines
+    assert 'tottodrillo_test_latency_seconds_count{host="a"} 1' in lines
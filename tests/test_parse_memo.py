@@ -0,0 +1,62 @@
+"""Memo dei parsing per hash del contenuto, versione dell'estrattore e regole di estrazione"""
+import json
+import os
+
+import pytest
+
+HELPERS = '''
+def _test_parse(body):
+    _test_parse.calls += 1
+    return _test_helper(body)
+
+def _test_helper(body):
+    return len(body)
+
+_test_parse.calls = 0
+'''
+
+
+@pytest.fixture
+def parse(source):
+    exec(HELPERS, vars(source))
+    return source._test_parse
+
+
+def test_identical_page_is_parsed_once(source, parse):
+    assert source.memo_parse('page', b'<html>a</html>', parse) == 14
+    assert source.memo_parse('page', b'<html>a</html>', parse) == 14
+    assert source.memo_parse('page', b'<html>b!</html>', parse) == 15
+    assert parse.calls == 2
+
+
+def test_disabled_memo(source, parse, monkeypatch):
+    monkeypatch.setattr(source, 'PARSE_MEMO_SIZE', 0)
+    source.memo_parse('page', b'<html>a</html>', parse)
+    source.memo_parse('page', b'<html>a</html>', parse)
+    assert parse.calls == 2
+
+
+def test_helper_change_changes_extractor_version(source, parse):
+    before = source.code_fingerprint(parse.__code__)
+    exec('def _test_helper(body):\n    return -len(body)\n', vars(source))
+    assert source.code_fingerprint(parse.__code__) != before
+
+
+def test_parser_version_is_part_of_the_key(source, parse, monkeypatch):
+    source.memo_parse('page', b'<html>a</html>', parse)
+    monkeypatch.setattr(source, 'PARSER_VERSION', source.PARSER_VERSION + 1)
+    source.memo_parse('page', b'<html>a</html>', parse)
+    assert parse.calls == 2
+
+
+def test_rules_reload_invalidates_memo(source, parse, tmp_path):
+    source._request_context.source_dir = str(tmp_path)
+    try:
+        source.memo_parse('page', b'<html>a</html>', parse)
+        with open(os.path.join(tmp_path, source.EXTRACTION_RULES_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'values': {'test_marker': 'v2'}}, f)
+        source.memo_parse('page', b'<html>a</html>', parse)
+        source.memo_parse('page', b'<html>a</html>', parse)
+    finally:
+        source._request_context.source_dir = None
+    assert parse.calls == 2
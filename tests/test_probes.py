@@ -0,0 +1,67 @@
+"""Probe dei mirror e ordinamento dei link (NSWpedia e SwitchRoms)"""
+import pytest
+
+import fixture_routes
+
+FILE_BODY = b'x' * 4096
+ROUTES = {
+    '/file': (206, {'Content-Type': 'application/octet-stream', 'Content-Range': 'bytes 0-4095/1048576',
+                    'Set-Cookie': 'hoster_session=abc; Path=/'}, FILE_BODY),
+    '/challenge': (403, {'Content-Type': 'text/html', 'Server': 'cloudflare', 'cf-ray': '1234-MXP'},
+                   b'<html>Just a moment...</html>'),
+    '/unavailable': (503, {'Content-Type': 'text/html', 'cf-ray': '1234-MXP'}, b'<html>challenge</html>'),
+    '/landing': (200, {'Content-Type': 'text/html; charset=utf-8'}, b'<html>Download page</html>'),
+    '/gone': (410, {'Content-Type': 'text/plain'}, b'gone'),
+}
+
+
+@pytest.fixture(params=('nswpedia', 'switchroms'))
+def mirror_source(request, make_source_dir):
+    module = fixture_routes.load_source_module(request.param)
+    module._request_context.source_dir = make_source_dir(request.param)
+    yield module
+    module._request_context.source_dir = None
+
+
+def test_probe_classifies_mirrors(mirror_source, local_server):
+    base = local_server(ROUTES)
+    deadline = mirror_source.time.monotonic() + 5
+
+    alive = mirror_source.probe_mirror(f'{base}/file', base, deadline)
+    assert alive['alive'] and alive['size'] == 1048576 and alive['throughput_kbps']
+    # Challenge Cloudflare e pagine HTML non sono misurabili, non morte
+    assert mirror_source.probe_mirror(f'{base}/challenge', base, deadline) is None
+    assert mirror_source.probe_mirror(f'{base}/unavailable', base, deadline) is None
+    assert mirror_source.probe_mirror(f'{base}/landing', base, deadline) is None
+    assert mirror_source.probe_mirror(f'{base}/missing', base, deadline)['alive'] is False
+    assert mirror_source.probe_mirror(f'{base}/gone', base, deadline)['alive'] is False
+    assert mirror_source.probe_mirror('http://127.0.0.1:1/file', base, deadline)['alive'] is False
+
+
+def test_probe_does_not_store_mirror_cookies(mirror_source, local_server):
+    base = local_server(ROUTES)
+    mirror_source.probe_mirror(f'{base}/file', base, mirror_source.time.monotonic() + 5)
+    assert not any(cookie.name == 'hoster_session' for cookie in mirror_source._cookie_jar)
+
+
+def test_probe_links_ranking(mirror_source, local_server):
+    base = local_server(ROUTES)
+    links = [{'url': f'{base}/gone'}, {'url': f'{base}/challenge', 'requires_webview': True},
+             {'url': f'{base}/file', 'size_str': '1 MB'}]
+    ranked = mirror_source.probe_links(links, base, 3000)
+    assert [link['url'].rsplit('/', 1)[1] for link in ranked] == ['file', 'challenge', 'gone']
+    assert 'probe' not in ranked[1]
+    assert ranked[0]['probe']['alive'] and ranked[2]['probe']['alive'] is False
+
+
+def test_probe_links_respects_budget(mirror_source, local_server):
+    def stall(handler):
+        mirror_source.time.sleep(3)
+        handler.send_response(206)
+        handler.end_headers()
+
+    base = local_server({'/slow': stall, **ROUTES})
+    start = mirror_source.time.monotonic()
+    ranked = mirror_source.probe_links([{'url': f'{base}/slow'}, {'url': f'{base}/file'}], base, 500)
+    assert mirror_source.time.monotonic() - start < 1.5
+    assert [link['url'].rsplit('/', 1)[1] for link in ranked] == ['file', 'slow']
@@ -0,0 +1,92 @@
+"""Rate limiter per host: token bucket, backoff su 429/503 e rate appresi persistenti"""
+import email.utils
+import json
+import time
+
+import pytest
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    monkeypatch.setenv('TOTTODRILLO_RATE_LIMIT', '100:2')
+
+
+def test_parse_retry_after(source):
+    assert source.parse_retry_after('3') == 3.0
+    assert source.parse_retry_after(None) is None
+    assert source.parse_retry_after('presto') is None
+    retry_at = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 <= source.parse_retry_after(retry_at) <= 60
+    assert source.parse_retry_after(email.utils.formatdate(time.time() - 60, usegmt=True)) == 0.0
+
+
+def test_token_bucket_burst_then_wait(source):
+    bucket = source.TokenBucket(2.0, 2)
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.0
+    assert 0.4 < bucket.acquire() <= 0.5
+
+
+def test_throttle_halves_rate_and_blocks(source):
+    bucket = source.TokenBucket(2.0, 5)
+    bucket.on_throttled(10.0)
+    assert bucket.rate == 1.0
+    assert 9.5 < bucket.acquire() <= 10.0
+    bucket.on_throttled(1000.0)
+    assert bucket.acquire() == source.RATE_LIMIT_MAX_WAIT
+    for _ in range(5):
+        bucket.on_throttled(None)
+    assert bucket.rate == source.RATE_LIMIT_MIN_RATE
+    assert bucket.on_success() and bucket.rate > source.RATE_LIMIT_MIN_RATE
+    bucket.rate = bucket.max_rate
+    assert not bucket.on_success()
+
+
+def test_rate_limit_config(source, monkeypatch):
+    monkeypatch.setenv('TOTTODRILLO_RATE_LIMIT', '0')
+    assert source.rate_limit_config() is None
+    assert source.get_rate_limiter('example.com') is None
+    monkeypatch.setenv('TOTTODRILLO_RATE_LIMIT', '4:8')
+    assert source.rate_limit_config() == (4.0, 8)
+    source._request_context.rate_limit = False
+    try:
+        assert source.rate_limit_config() is None
+    finally:
+        source._request_context.rate_limit = None
+
+
+def test_429_from_upstream_slows_down_host(source, local_server, limited):
+    base = local_server({'/busy': (429, {'Retry-After': '1'}, b'slow down'), '/ok': (200, {}, b'ok')})
+    host = base.split('//')[1]
+    assert source.http_get(f'{base}/busy').status_code == 429
+    limiter = source.get_rate_limiter(host)
+    assert limiter.rate == 50.0 and limiter.blocked_until > time.monotonic()
+    start = time.monotonic()
+    assert source.http_get(f'{base}/ok').status_code == 200
+    assert time.monotonic() - start >= 0.5
+    assert limiter.rate > 50.0
+    throttled = [c for c in source.metrics_snapshot()['counters'] if c['name'] == 'rate_limit_throttled_total']
+    assert throttled[0]['labels']['status'] == '429'
+
+
+def test_learned_rates_are_saved(source, tmp_path, limited):
+    source._request_context.source_dir = str(tmp_path)
+    try:
+        source.get_rate_limiter('example.com').on_throttled(None)
+        source._rate_limits_dirty = True
+        source.save_rate_limits()
+    finally:
+        source._request_context.source_dir = None
+    saved = json.loads((tmp_path / 'cache' / 'rate_limits.json').read_text())
+    assert saved['example.com']['rate'] == 50.0 and saved['example.com']['max_rate'] == 100.0
+
+
+def test_learned_rate_is_loaded(source, tmp_path, limited):
+    (tmp_path / 'cache').mkdir()
+    (tmp_path / 'cache' / 'rate_limits.json').write_text('{"example.com": {"rate": 7.5}}')
+    source._request_context.source_dir = str(tmp_path)
+    try:
+        assert source.get_rate_limiter('example.com').rate == 7.5
+        assert source.get_rate_limiter('other.example').rate == 100.0
+    finally:
+        source._request_context.source_dir = None
@@ -0,0 +1,99 @@
+"""Cache negativa, last-good e risposte salvate (stale-while-revalidate/offline) di execute()"""
+import json
+import time
+
+import pytest
+
+
+class Upstream:
+    """Sostituisce dispatch_method contando le chiamate; raise_error simula la sorgente giù"""
+
+    def __init__(self, response):
+        self.response = response
+        self.calls = 0
+        self.raise_error = False
+
+    def __call__(self, method, params, source_dir):
+        self.calls += 1
+        if self.raise_error:
+            raise RuntimeError('upstream non raggiungibile')
+        return json.dumps(self.response)
+
+
+@pytest.fixture
+def call(source, tmp_path):
+    def call(**params):
+        params.setdefault('method', 'getEntry')
+        params.setdefault('source_dir', str(tmp_path))
+        return json.loads(source.execute(json.dumps(params)))
+    return call
+
+
+def stored(source, tmp_path, **params):
+    return source.load_stored_response(dict(params, source_dir=str(tmp_path)))
+
+
+def test_positive_entry_is_stored_and_served_fresh(source, call, tmp_path, monkeypatch):
+    upstream = Upstream({'entry': {'slug': 'a', 'title': 'A'}})
+    monkeypatch.setattr(source, 'dispatch_method', upstream)
+    assert call(slug='a')['entry']['title'] == 'A'
+    assert call(slug='a', deadline_ms=5000)['entry']['title'] == 'A'
+    assert upstream.calls == 1
+    assert stored(source, tmp_path, method='getEntry', slug='a')
+
+
+def test_offline_fallback(source, call, monkeypatch):
+    upstream = Upstream({'entry': {'slug': 'a', 'title': 'A'}})
+    monkeypatch.setattr(source, 'dispatch_method', upstream)
+    call(slug='a')
+    upstream.raise_error = True
+    result = call(slug='a', refresh=True)
+    assert result['offline'] is True and result['entry']['title'] == 'A'
+
+
+@pytest.mark.parametrize('method, response, params', [
+    ('getEntry', {'entry': None}, {'slug': 'missing'}),
+    ('searchRoms', {'roms': [], 'total_results': 0}, {'search_key': 'nothing'}),
+])
+def test_negative_results_only_use_negative_cache(source, call, tmp_path, monkeypatch, method, response, params):
+    upstream = Upstream(response)
+    monkeypatch.setattr(source, 'dispatch_method', upstream)
+    call(method=method, **params)
+    call(method=method, **params)
+    assert upstream.calls == 1  # Seconda chiamata dalla cache negativa
+    assert stored(source, tmp_path, method=method, **params) is None
+    assert not source._last_good_responses
+
+    # Scaduto il TTL breve il "non trovato" viene richiesto di nuovo, non servito per giorni
+    source._negative_results.clear()
+    call(method=method, **params)
+    assert upstream.calls == 2
+
+
+def test_profiled_response_is_stored_without_profile(source, call, tmp_path, monkeypatch):
+    monkeypatch.setattr(source, 'dispatch_method', Upstream({'entry': {'slug': 'a', 'title': 'A'}}))
+    assert 'profile' in call(slug='a', profile=True)
+    assert 'profile' not in json.loads(stored(source, tmp_path, method='getEntry', slug='a')[1])
+    assert all('profile' not in json.loads(r) for r in source._last_good_responses.values())
+
+
+def test_negative_cache_ttl_and_refresh(source, call, monkeypatch):
+    upstream = Upstream({'entry': None})
+    monkeypatch.setattr(source, 'dispatch_method', upstream)
+    monkeypatch.setattr(source, 'NEGATIVE_CACHE_TTL', {'getEntry': 0.05, 'searchRoms': 0.05})
+    call(slug='missing')
+    call(slug='missing', refresh=True)
+    assert upstream.calls == 2
+    time.sleep(0.06)
+    call(slug='missing')
+    assert upstream.calls == 3
+
+
+def test_upstream_failure_is_not_a_negative_result(source, call, monkeypatch):
+    def failing(method, params, source_dir):
+        source._request_context.upstream_failed = True
+        return json.dumps({'entry': None})
+
+    monkeypatch.setattr(source, 'dispatch_method', failing)
+    call(slug='a')
+    assert not source._negative_results
@@ -0,0 +1,106 @@
+"""Politica di retry: classificazione degli errori, backoff, budget per chiamata e deadline"""
+import time
+
+import pytest
+import requests
+
+
+class Flaky:
+    """Fallisce le prime failures chiamate con l'errore indicato"""
+
+    def __init__(self, error, failures):
+        self.error = error
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return 'ok'
+
+
+@pytest.fixture
+def policy(source):
+    return source.RetryPolicy(base_delay=0.001, max_delay=0.01)
+
+
+def http_error(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.HTTPError(response=response)
+
+
+def test_transient_errors_are_retried(source, policy):
+    func = Flaky(source.RetryableError('pagina incompleta'), 2)
+    assert policy.run(func) == 'ok' and func.calls == 3
+    retries = [c for c in source.metrics_snapshot()['counters'] if c['name'] == 'retries_total']
+    assert retries[0]['labels']['reason'] == 'RetryableError' and retries[0]['value'] == 2
+
+
+def test_attempts_are_bounded(source, policy):
+    func = Flaky(requests.ConnectionError('giù'), 10)
+    with pytest.raises(requests.ConnectionError):
+        policy.run(func)
+    assert func.calls == source.RETRY_MAX_ATTEMPTS
+
+
+def test_permanent_errors_are_not_retried(source, policy):
+    func = Flaky(ValueError('bug'), 10)
+    with pytest.raises(ValueError):
+        policy.run(func)
+    assert func.calls == 1
+
+
+def test_classify(source):
+    classify = source.RetryPolicy.classify
+    assert classify(http_error(503)) == 'http_503'
+    assert classify(http_error(404)) is None
+    assert classify(requests.Timeout()) == 'Timeout'
+    assert classify(type('PopupError', (source.RetryableError,), {})('popup')) == 'PopupError'
+
+
+def test_delay_honours_retry_after(source):
+    policy = source.RetryPolicy(base_delay=0.1, max_delay=5.0)
+    assert 0.05 <= policy.delay(1, requests.Timeout()) <= 0.1
+    assert policy.delay(1, http_error(429, {'Retry-After': '3'})) == 3.0
+    assert policy.delay(1, http_error(429, {'Retry-After': '60'})) == 5.0
+
+
+def test_budget_is_shared_by_the_call(source, policy):
+    source._request_context.retry_budget = 1
+    try:
+        first = Flaky(requests.Timeout(), 1)
+        assert policy.run(first) == 'ok'
+        second = Flaky(requests.Timeout(), 1)
+        with pytest.raises(requests.Timeout):
+            policy.run(second)
+        assert second.calls == 1
+    finally:
+        source._request_context.retry_budget = None
+
+
+def test_retry_wait_respects_deadline(source):
+    source._request_context.deadline = time.monotonic() + 0.05
+    try:
+        with pytest.raises(source.DeadlineExceededError):
+            source.RetryPolicy(base_delay=1.0).run(Flaky(requests.Timeout(), 1))
+    finally:
+        source._request_context.deadline = None
+
+
+def test_fetch_with_retry(source, local_server, monkeypatch):
+    monkeypatch.setenv('TOTTODRILLO_RATE_LIMIT', '0')
+    statuses = [503, 200]
+
+    def unstable(handler):
+        handler.send_response(statuses.pop(0))
+        handler.send_header('Content-Length', '0')
+        handler.end_headers()
+
+    base = local_server({'/page': unstable})
+    response = source.fetch_with_retry(f'{base}/page', policy=source.RetryPolicy(base_delay=0.001))
+    assert response.status_code == 200 and not statuses
+    # Gli status non transitori arrivano al chiamante senza retry
+    assert source.fetch_with_retry(f'{base}/missing').status_code == 404
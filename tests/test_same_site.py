@@ -0,0 +1,45 @@
+"""Redirect seguiti a mano da fetch_same_site di NSWpedia (popup pubblicitari fuori dominio)"""
+import pytest
+import requests
+
+
+def redirect(location):
+    return 302, {'Location': location}, b''
+
+
+@pytest.fixture
+def base(nswpedia, local_server, monkeypatch):
+    monkeypatch.setenv('TOTTODRILLO_RATE_LIMIT', '0')
+    return local_server({
+        '/start': redirect('/next'),
+        '/next': (200, {'Content-Type': 'text/html'}, b'<html>ok</html>'),
+        '/popup': redirect('http://ads.example/landing'),
+        '/lookalike': redirect('http://127.0.0.1.ads.example/'),
+        '/loop': redirect('/loop'),
+    })
+
+
+def test_same_site_redirect_is_followed(nswpedia, base):
+    response = nswpedia.fetch_same_site(f'{base}/start')
+    assert response.status_code == 200 and response.url == f'{base}/next'
+
+
+@pytest.mark.parametrize('path', ['/popup', '/lookalike'])
+def test_off_domain_redirect_is_not_followed(nswpedia, base, path):
+    with pytest.raises(nswpedia.OffDomainRedirectError):
+        nswpedia.fetch_same_site(f'{base}{path}')
+    popups = [c for c in nswpedia.metrics_snapshot()['counters'] if c['name'] == 'popup_redirects_total']
+    assert popups and popups[0]['value'] == 1
+
+
+def test_redirect_loop_is_bounded(nswpedia, base):
+    with pytest.raises(requests.TooManyRedirects):
+        nswpedia.fetch_same_site(f'{base}/loop', max_redirects=3)
+
+
+def test_same_site_host(nswpedia):
+    allowed = frozenset({'nswpedia.com'})
+    assert nswpedia.same_site_host('nswpedia.com', allowed)
+    assert nswpedia.same_site_host('cdn.nswpedia.com', allowed)
+    assert not nswpedia.same_site_host('evilnswpedia.com', allowed)
+    assert not nswpedia.same_site_host('nswpedia.com.ads.example', allowed)
@@ -0,0 +1,38 @@
+"""
+L'infrastruttura comune (metriche, rate limiter, retry, circuit breaker, cache, timeout, memo...)
+è copiata in ogni source perché ciascuna è distribuita come uno zip autonomo: le copie devono
+restare identiche, così una correzione applicata a una sola source fa fallire questo test
+"""
+import ast
+import os
+
+from fixture_routes import REPO_DIR
+
+SOURCES = ('vimms', 'nswpedia', 'switchroms')
+
+# Funzioni con lo stesso nome ma comportamento specifico della source
+SITE_SPECIFIC = {
+    'dispatch_method',  # Metodi propri (download di Vimm's Lair, cookie di NSWpedia/SwitchRoms)
+    'execute',  # Salvataggio del cookie jar e formato degli errori
+    'http_get',  # Cookie della sessione (NSWpedia/SwitchRoms)
+    'fetch_thumbnail',  # Referer e segnaposto di image.php (Vimm's Lair)
+    'RomRow',  # Campi delle righe dei listing
+    'get_entry', 'search_roms', 'get_platforms', 'get_regions', 'get_random_ua', 'resolve_descriptor',
+}
+
+
+def top_level_definitions(site):
+    path = os.path.join(REPO_DIR, site, f'{site}_source.py')
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    lines = source.splitlines()
+    return {node.name: '\n'.join(lines[node.lineno - 1:node.end_lineno]) for node in ast.parse(source).body
+            if isinstance(node, (ast.FunctionDef, ast.ClassDef))}
+
+
+def test_shared_infrastructure_is_identical():
+    definitions = [top_level_definitions(site) for site in SOURCES]
+    shared = set.intersection(*(set(d) for d in definitions)) - SITE_SPECIFIC
+    assert {'http_get', 'RetryPolicy', 'CircuitBreaker', 'TokenBucket', 'single_flight', 'memo_parse'} <= shared | SITE_SPECIFIC
+    diverged = sorted(name for name in shared if len({d[name] for d in definitions}) > 1)
+    assert not diverged, f'copie divergenti tra le source: {diverged}'
@@ -0,0 +1,91 @@
+"""Single-flight: chiamate identiche e contemporanee condividono un'unica esecuzione"""
+import threading
+import time
+
+import pytest
+
+
+class Slow:
+    """Funzione che resta in corso finché il test non la sblocca"""
+
+    def __init__(self, error=None):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.error = error
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.error:
+            raise self.error
+        return '{"entry": {"slug": "a"}}'
+
+
+def waiting_followers(source):
+    return sum(counter['value'] for counter in source.metrics_snapshot()['counters']
+               if counter['name'] == 'singleflight_requests_total' and counter['labels']['role'] == 'follower')
+
+
+def run_concurrently(source, method, params, func, followers=3):
+    outcomes = []
+
+    def call():
+        try:
+            outcomes.append(source.single_flight(method, dict(params), func))
+        except Exception as e:
+            outcomes.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    assert func.started.wait(5)
+    threads += [threading.Thread(target=call) for _ in range(followers)]
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while waiting_followers(source) < followers and time.monotonic() < deadline:
+        time.sleep(0.01)
+    func.release.set()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_identical_calls_share_one_execution(source):
+    func = Slow()
+    # source_dir e gli altri parametri ignorati non distinguono le chiamate
+    outcomes = run_concurrently(source, 'getEntry', {'slug': 'a', 'source_dir': '/tmp'}, func)
+    assert func.calls == 1
+    assert outcomes == ['{"entry": {"slug": "a"}}'] * 4
+    assert not source._inflight
+
+
+def test_errors_reach_every_caller(source):
+    func = Slow(error=RuntimeError('upstream'))
+    outcomes = run_concurrently(source, 'searchRoms', {'search_key': 'x'}, func, followers=2)
+    assert func.calls == 1
+    assert len(outcomes) == 3 and all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+
+
+def test_other_methods_are_not_coalesced(source):
+    calls = []
+    assert source.single_flight('getPlatforms', {}, lambda: calls.append(1) or 'ok') == 'ok'
+    assert source.single_flight('getPlatforms', {}, lambda: calls.append(1) or 'ok') == 'ok'
+    assert len(calls) == 2
+
+
+def test_follower_gives_up_at_deadline(source):
+    func = Slow()
+    leader = threading.Thread(target=source.single_flight, args=('getEntry', {'slug': 'b'}, func))
+    leader.start()
+    assert func.started.wait(5)
+    source._request_context.deadline = time.monotonic() + 0.05
+    try:
+        with pytest.raises(source.DeadlineExceededError):
+            source.single_flight('getEntry', {'slug': 'b'}, func)
+    finally:
+        source._request_context.deadline = None
+        func.release.set()
+        leader.join(5)
+    assert func.calls == 1
@@ -0,0 +1,71 @@
+"""Timeout adattivi per (host, endpoint)"""
+import pytest
+import requests
+
+HOST = 'upstream.example'
+
+
+class TimeoutRecordingSession(requests.Session):
+    """Sessione finta: registra il timeout ricevuto e scade se la risposta è più lenta"""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+        self.timeouts = []
+
+    def get(self, url, **kwargs):
+        self.timeouts.append(kwargs['timeout'][1])
+        if self.latency > kwargs['timeout'][1]:
+            raise requests.ReadTimeout('read timeout')
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'ok'
+        return response
+
+
+def test_default_until_enough_samples(source):
+    for _ in range(source.TIMEOUT_MIN_SAMPLES - 1):
+        source.record_latency(HOST, 'listing', 0.1)
+    assert source.adaptive_read_timeout(HOST, 'listing', 15.0) == 15.0
+
+
+def test_estimate_is_clamped_to_floor(source):
+    for _ in range(50):
+        source.record_latency(HOST, 'listing', 0.1)
+    assert source.adaptive_read_timeout(HOST, 'listing', 15.0) == source.TIMEOUT_MIN_SECONDS
+
+
+def test_samples_then_timeouts_then_estimate(source, monkeypatch):
+    """Un host rallentato oltre il minimo non deve restare bloccato sul timeout di 2 secondi"""
+    monkeypatch.setenv('TOTTODRILLO_RATE_LIMIT', '0')
+    for _ in range(50):
+        source.record_latency(HOST, 'listing', 0.1)
+    url = f'http://{HOST}/page'
+
+    slow = TimeoutRecordingSession(latency=3.0)
+    with pytest.raises(requests.ReadTimeout):
+        source.http_get(url, session=slow, endpoint='listing', timeout=15.0)
+    assert slow.timeouts == [source.TIMEOUT_MIN_SECONDS]
+    assert source.timeout_snapshot()[f'{HOST} listing']['timeouts'] == 1
+
+    # Dopo il timeout si torna al predefinito: la risposta lenta arriva ed entra nei campioni
+    assert source.adaptive_read_timeout(HOST, 'listing', 15.0) == 15.0
+    for _ in range(5):
+        source.http_get(url, session=slow, endpoint='listing', timeout=15.0)
+        source.record_latency(HOST, 'listing', slow.latency)  # La sessione finta risponde subito
+    assert slow.timeouts[1:] == [15.0] * 5
+
+    # Passato il periodo di recupero la stima copre le nuove latenze (p99 3s × 3)
+    source._last_timeouts[(HOST, 'listing')] -= source.TIMEOUT_RECOVERY_SECONDS
+    assert source.adaptive_read_timeout(HOST, 'listing', 15.0) == pytest.approx(3.0 * source.TIMEOUT_P99_FACTOR)
+    source.http_get(url, session=slow, endpoint='listing', timeout=15.0)
+
+
+def test_deadline_bounds_read_timeout(source):
+    source._request_context.deadline = source.time.monotonic() + 1.0
+    try:
+        (connect, read), deadline_bound = source.request_timeouts(HOST, 'listing', 15.0)
+    finally:
+        source._request_context.deadline = None
+    assert deadline_bound
+    assert read <= 1.0 and connect <= read
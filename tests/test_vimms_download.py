@@ -0,0 +1,178 @@
+"""Download segmentato e riprendibile di Vimm's Lair (startDownload/getDownloadStatus/cancelDownload)"""
+import json
+import os
+import re
+import threading
+import time
+import zipfile
+
+import pytest
+import requests
+
+BODY = bytes(range(256)) * 2048  # 512 KB
+
+
+def make_zip(path, compression):
+    """Archivio zip con BODY e un file di testo in una sottodirectory"""
+    with zipfile.ZipFile(path, 'w', compression) as archive:
+        archive.writestr('game/rom.bin', BODY)
+        archive.writestr('game/readme.txt', 'ciao\n' * 100)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def ranged_file(handler, honor_range=True, stall=None, body=BODY):
+    """Serve BODY rispettando l'header Range; stall: evento atteso a metà del primo blocco"""
+    match = re.match(r'bytes=(\d+)-(\d*)', handler.headers.get('Range', ''))
+    if match and honor_range:
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else len(body) - 1
+        handler.send_response(206)
+        handler.send_header('Content-Range', f'bytes {start}-{end}/{len(body)}')
+    else:
+        start, end = 0, len(body) - 1
+        handler.send_response(200)
+    handler.send_header('Content-Type', 'application/octet-stream')
+    handler.send_header('Content-Length', str(end - start + 1))
+    handler.end_headers()
+    try:
+        if stall is not None:
+            handler.wfile.write(body[start:start + 1024])
+            handler.wfile.flush()
+            stall.wait(10)
+            return
+        handler.wfile.write(body[start:end + 1])
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+
+
+@pytest.fixture
+def call(vimms, tmp_path, monkeypatch):
+    monkeypatch.setattr(vimms, 'DOWNLOAD_MIN_SEGMENT_BYTES', 64 * 1024)
+
+    def call(method, **params):
+        return json.loads(vimms.execute(json.dumps(dict(params, method=method, source_dir=str(tmp_path)))))
+    return call
+
+
+def wait_status(call, dest, statuses, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = call('getDownloadStatus', dest_path=dest)
+        if status['status'] in statuses:
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f'stato finale non raggiunto: {status}')
+
+
+def test_segmented_download(call, local_server, tmp_path):
+    base = local_server({'/file.bin': ranged_file})
+    dest = str(tmp_path / 'out' / 'file.bin')
+    started = call('startDownload', url=f'{base}/file.bin', dest_path=dest, segments=4)
+    assert started['status'] in ('pending', 'downloading')
+    status = wait_status(call, dest, ('completed', 'failed'))
+    assert status['status'] == 'completed' and status['mode'] == 'segmented'
+    assert len(status['segments']) == 4
+    with open(dest, 'rb') as f:
+        assert f.read() == BODY
+    assert not os.path.exists(dest + '.part')
+
+
+def test_range_ignored_falls_back_to_single_stream(call, local_server, tmp_path):
+    def first_probe_only(handler):
+        # Il primo Range (bytes=0-0) è onorato, poi il server lo ignora
+        ranged_file(handler, honor_range=handler.headers.get('Range') == 'bytes=0-0')
+
+    base = local_server({'/file.bin': first_probe_only})
+    dest = str(tmp_path / 'file.bin')
+    call('startDownload', url=f'{base}/file.bin', dest_path=dest)
+    status = wait_status(call, dest, ('completed', 'failed'))
+    assert status['status'] == 'completed' and status['mode'] == 'single'
+    with open(dest, 'rb') as f:
+        assert f.read() == BODY
+
+
+# bzip2 non si estrae in streaming: si ripiega sull'estrazione a download finito
+@pytest.mark.parametrize('compression', [zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED, zipfile.ZIP_BZIP2])
+def test_streaming_extraction(call, local_server, tmp_path, compression):
+    archive = make_zip(str(tmp_path / 'source.zip'), compression)
+    base = local_server({'/game.zip': lambda handler: ranged_file(handler, body=archive)})
+    dest = str(tmp_path / 'game.zip')
+    extract_dir = tmp_path / 'extracted'
+    call('startDownload', url=f'{base}/game.zip', dest_path=dest, segments=2,
+         extract=True, extract_dir=str(extract_dir), keep_archive=False)
+    status = wait_status(call, dest, ('completed', 'failed'))
+    assert status['status'] == 'completed'
+    extraction = status['extraction']
+    assert extraction['status'] == 'completed', extraction
+    assert sorted(name.replace(os.sep, '/') for name in extraction['files']) == ['game/readme.txt', 'game/rom.bin']
+    assert (extract_dir / 'game' / 'rom.bin').read_bytes() == BODY
+    assert not os.path.exists(dest)
+
+
+def test_unsafe_archive_path_is_rejected(vimms, tmp_path):
+    with pytest.raises(ValueError):
+        vimms.safe_extract_path(str(tmp_path), '../escape.txt')
+    assert vimms.safe_extract_path(str(tmp_path), '/game/rom.bin') == str(tmp_path / 'game' / 'rom.bin')
+
+
+def test_cancel_during_range_fallback_is_not_lost(call, local_server, tmp_path):
+    dest = str(tmp_path / 'file.bin')
+
+    ranges = []
+
+    def cancel_then_ignore_range(handler):
+        ranges.append(handler.headers.get('Range'))
+        if ranges[-1] != 'bytes=0-0':
+            call('cancelDownload', dest_path=dest)
+        ranged_file(handler, honor_range=ranges[-1] == 'bytes=0-0')
+
+    base = local_server({'/file.bin': cancel_then_ignore_range})
+    call('startDownload', url=f'{base}/file.bin', dest_path=dest)
+    assert wait_status(call, dest, ('completed', 'failed', 'cancelled'))['status'] == 'cancelled'
+    assert None not in ranges  # Nessun riavvio a stream singolo dopo l'annullamento
+    assert not os.path.exists(dest)
+
+
+def test_cancel_returns_immediately(call, local_server, tmp_path):
+    stall = threading.Event()
+    base = local_server({'/file.bin': lambda handler: ranged_file(handler, stall=None if
+                                                                  handler.headers.get('Range') == 'bytes=0-0' else stall)})
+    dest = str(tmp_path / 'file.bin')
+    call('startDownload', url=f'{base}/file.bin', dest_path=dest)
+    wait_status(call, dest, ('downloading',))
+    time.sleep(0.3)
+    start = time.monotonic()
+    assert call('cancelDownload', dest_path=dest, delete_partial=True)['status'] == 'cancelling'
+    assert time.monotonic() - start < 1.0
+    # Mentre l'annullamento è in corso non parte un secondo download sullo stesso file
+    assert call('startDownload', url=f'{base}/file.bin', dest_path=dest)['status'] == 'cancelling'
+    stall.set()
+    assert wait_status(call, dest, ('cancelled', 'failed', 'completed'))['status'] == 'cancelled'
+    assert not os.path.exists(dest + '.part') and not os.path.exists(dest + '.segments.json')
+
+
+def test_extracting_job_is_not_restarted(vimms, call, tmp_path):
+    dest = str(tmp_path / 'file.bin')
+    job = vimms.DownloadJob(vimms.download_id_for(dest), 'http://127.0.0.1:1/file.bin', dest, '', 1)
+    job.status = 'extracting'
+    vimms._downloads[job.download_id] = job
+    assert call('startDownload', url=job.url, dest_path=dest)['status'] == 'extracting'
+    assert vimms._downloads[job.download_id] is job
+
+
+def test_download_stream_uses_fixed_read_timeout(vimms, tmp_path):
+    class RecordingSession(requests.Session):
+        timeouts = []
+
+        def get(self, url, **kwargs):
+            self.timeouts.append(kwargs['timeout'])
+            response = requests.Response()
+            response.status_code = 206
+            return response
+
+    for _ in range(50):
+        vimms.record_latency('files.example', 'download', 0.05)
+    job = vimms.DownloadJob('id', 'http://files.example/file.bin', str(tmp_path / 'file.bin'), '', 1)
+    job.open_stream(RecordingSession(), (0, 0))
+    assert RecordingSession.timeouts[0][1] == vimms.DOWNLOAD_READ_TIMEOUT_SECONDS
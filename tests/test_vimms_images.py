@@ -0,0 +1,92 @@
+"""Verifica delle copertine e miniature di Vimm's Lair (image.php protetto da hotlink)"""
+import io
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def png(width: int, height: int) -> bytes:
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 40, 40)).save(output, 'PNG')
+    return output.getvalue()
+
+
+COVER = png(300, 420)
+PLACEHOLDER = png(400, 100)  # Dimensione del segnaposto "Error: image not found"
+
+
+@pytest.fixture
+def image_server(vimms, local_server):
+    """image.php che risponde con la copertina solo se il Referer è la pagina della ROM"""
+    state = {}
+
+    def image(handler):
+        rom_id = handler.path.rpartition('id=')[2]
+        referer = handler.headers.get('Referer')
+        state.setdefault('referers', []).append(referer)
+        if rom_id == '404':
+            handler.send_error(404)
+            return
+        if rom_id == '429':
+            handler.send_error(429)
+            return
+        ok = referer == f"{state['base']}/vault/{rom_id}" and rom_id != '999'
+        body = COVER if ok else PLACEHOLDER
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'image/png')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    state['base'] = local_server({'/image.php': image})
+    vimms._request_context.base_url = state['base']
+    yield state
+    vimms._request_context.base_url = None
+
+
+def rom(vimms, base, rom_id, uri=None):
+    return vimms.RomRow(rom_id, uri or f'/vault/{rom_id}', 'Title', 'n64',
+                        box_image=f'{base}/image.php?type=box&id={rom_id}')
+
+
+def test_box_art_check_sends_rom_referer(vimms, image_server, tmp_path):
+    assert vimms.check_box_art(rom(vimms, image_server['base'], '1302'), str(tmp_path)) is True
+    assert image_server['referers'] == [f"{image_server['base']}/vault/1302"]
+    assert vimms.known_box_art(['/vault/1302'], str(tmp_path)) == {'/vault/1302': True}
+
+
+def test_box_art_missing_only_on_404_or_placeholder(vimms, image_server, tmp_path):
+    source_dir = str(tmp_path)
+    assert vimms.check_box_art(rom(vimms, image_server['base'], '404'), source_dir) is False
+    assert vimms.check_box_art(rom(vimms, image_server['base'], '999'), source_dir) is False
+    # Rate limit: la copertina resta da verificare
+    assert vimms.check_box_art(rom(vimms, image_server['base'], '429'), source_dir) is None
+    assert vimms.known_box_art(['/vault/404', '/vault/999', '/vault/429'], source_dir) == {
+        '/vault/404': False, '/vault/999': False}
+
+
+def test_box_art_without_referer_is_not_cached_as_missing(vimms, image_server, tmp_path):
+    row = vimms.RomRow('x', 'x', 'Title', 'n64', box_image=f"{image_server['base']}/image.php?type=box")
+    assert vimms.check_box_art(row, str(tmp_path)) is None
+    assert vimms.known_box_art(['x'], str(tmp_path)) == {}
+
+
+def test_thumbnail_uses_referer(vimms, image_server, make_source_dir):
+    source_dir = make_source_dir('vimms')
+    url = f"{image_server['base']}/image.php?type=box&id=1302"
+    result = vimms.get_thumbnails({'urls': [url], 'size': 64}, source_dir)
+    thumbnail = vimms.json.loads(result)['thumbnails'][0]
+    assert thumbnail['path'] and thumbnail['resized']
+    assert image_server['referers'] == [f"{image_server['base']}/vault/1302"]
+    with Image.open(thumbnail['path']) as img:
+        assert img.size[1] == 64 and img.size[0] < 64  # Copertina verticale, non il segnaposto
+
+
+def test_placeholder_thumbnail_is_not_cached(vimms, image_server, make_source_dir):
+    source_dir = make_source_dir('vimms')
+    url = f"{image_server['base']}/image.php?type=box&id=999"
+    first = vimms.json.loads(vimms.get_thumbnails({'urls': [url]}, source_dir))['thumbnails'][0]
+    assert first['path'] is None and first['error']
+    vimms.get_thumbnails({'urls': [url]}, source_dir)
+    assert len(image_server['referers']) == 2  # Nessuna miniatura servita dalla cache
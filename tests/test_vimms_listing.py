@@ -0,0 +1,73 @@
+"""Lettura incrementale dei listing di Vimm's Lair e ricerche sulle fixture"""
+import os
+
+import pytest
+
+import fixture_routes
+
+
+class ChunkedResponse:
+    """Risposta finta che restituisce il body a blocchi della dimensione indicata"""
+
+    url = 'https://vimm.net/vault/?p=list'
+
+    def __init__(self, body: bytes, chunk_size: int):
+        self.body = body
+        self.chunk_size = chunk_size
+        self.read = 0
+        self.closed = False
+
+    def iter_content(self, _chunk_size):
+        for start in range(0, len(self.body), self.chunk_size):
+            chunk = self.body[start:start + self.chunk_size]
+            self.read += len(chunk)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(scope='module')
+def listing():
+    with open(os.path.join(fixture_routes.FIXTURE_DIR, 'vimms_listing_system.html'), 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 4096])
+def test_rows_split_across_chunks(vimms, chunk_size):
+    body = b'<table class="hovertable">' + b''.join(b'<tr><td>%d</td></t' b'r >' % i for i in range(10)) + b'</table>'
+    head, truncated = vimms.read_listing_body(ChunkedResponse(body, chunk_size), 3)
+    assert truncated
+    assert head.count(b'<tr>') == 4 and head.endswith(b'</tr >')
+
+
+def test_stops_reading_after_needed_rows(vimms, listing):
+    response = ChunkedResponse(listing, 8192)
+    head, truncated = vimms.read_listing_body(response, 10)
+    assert truncated and response.closed
+    assert response.read < len(listing) // 2
+    assert listing.startswith(head)
+
+
+def test_full_read_without_limit(vimms, listing):
+    body, truncated = vimms.read_listing_body(ChunkedResponse(listing, 1000), None)
+    assert body == listing and not truncated
+
+
+def test_truncated_listing_parses_like_full_page(vimms, listing, make_source_dir):
+    source_dir = make_source_dir('vimms')
+    rules = vimms.load_extraction_rules(source_dir)
+    full = vimms.parse_system_listing(listing, rules, 'N64', source_dir)
+    head, _ = vimms.read_listing_body(ChunkedResponse(listing, 5000), 25)
+    rows = vimms.parse_system_listing(head, rules, 'N64', source_dir)
+    assert [row.slug for row in rows] == [row.slug for row in full[:len(rows)]]
+    assert len(rows) >= 25
+
+
+def test_limited_search_matches_full_search(vimms, fixture_transport, make_source_dir):
+    source_dir = make_source_dir('vimms')
+    full = vimms.get_system_search_roms('', 'N64', 1, source_dir)
+    vimms._parse_memo.clear()
+    limited = vimms.get_system_search_roms('', 'N64', 1, source_dir, limit=20)
+    assert len(full) == 200 and 20 <= len(limited) < 200
+    assert [rom.rom_id for rom in limited] == [rom.rom_id for rom in full[:len(limited)]]
@@ -0,0 +1,43 @@
+"""Parsing della pagina ROM di Vimm's Lair guidato dalle regole di estrazione"""
+import json
+import os
+
+from fixture_routes import FIXTURE_DIR
+
+URI = '/vault/1302'
+
+
+def read_detail():
+    with open(os.path.join(FIXTURE_DIR, 'vimms_detail.html'), 'rb') as handle:
+        return handle.read()
+
+
+def test_default_rules(vimms, make_source_dir):
+    source_dir = make_source_dir('vimms')
+    parsed = vimms.parse_rom_page(read_detail(), vimms.load_extraction_rules(source_dir), URI, source_dir)
+    assert parsed['title'] == 'The Legend of Zelda: Ocarina of Time (N64)'
+    assert parsed['system'] == 'N64'
+    assert parsed['boxart_url'].endswith('image.php?type=box&id=1302')
+    assert parsed['screen_url'].endswith('image.php?type=screen&id=1302')
+    assert parsed['download_domain'] == 'dl3.vimm.net'
+    assert [media['ID'] for media in parsed['media_array']] == [4101, 4102, 4103]
+    assert [option['text'] for option in parsed['format_options']] == ['.z64', '.n64', '.v64']
+    assert parsed['regions'] == ['USA', 'Europe']
+
+
+def test_override_rules(vimms, make_source_dir):
+    source_dir = make_source_dir('vimms')
+    with open(os.path.join(source_dir, vimms.EXTRACTION_RULES_FILE), 'w', encoding='utf-8') as handle:
+        json.dump({
+            'selectors': {'download_form': {'tag': 'form', 'id': 'missing'}},
+            'values': {'default_download_domain': 'dl9.vimm.net', 'region_label': 'nessuna'},
+        }, handle)
+    parsed = vimms.parse_rom_page(read_detail(), vimms.load_extraction_rules(source_dir), URI, source_dir)
+    assert parsed['download_domain'] == 'dl9.vimm.net'
+    # Senza la riga Region si ripiega su tutte le bandiere della pagina
+    assert set(parsed['regions']) >= {'USA', 'Europe'}
+
+
+def test_boxart_urls_use_rom_id_pattern(vimms):
+    assert vimms.get_boxart_url_from_uri(URI).endswith('image.php?type=box&id=1302')
+    assert vimms.get_boxart_urls_from_uri('/other/1302') == []
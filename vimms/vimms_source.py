@@ -2,13 +2,27 @@
 Wrapper Python per integrare Vimm's Lair come sorgente Tottodrillo
 Implementa l'interfaccia SourceExecutor
 """
+import copy
+import email.utils
+import hashlib
 import json
 import re
+import shutil
+import sqlite3
+import struct
 import sys
 import os
-from typing import Dict, Any, List, Optional
+import random
+import threading
+import time
+import urllib.parse
+import zipfile
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Optional, Tuple, Callable, FrozenSet
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import urllib3
 
 # Disabilita warning SSL per test (in produzione dovresti usare certificati validi)
@@ -24,8 +38,10 @@ def load_platform_mapping(source_dir: str) -> Dict[str, Any]:
     
     # Se già caricato e stessa directory, ritorna la cache
     if _platform_mapping_cache is not None and _source_dir == source_dir:
+        metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'platform_mapping', 'result': 'hit'})
         return _platform_mapping_cache
     
+    metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'platform_mapping', 'result': 'miss'})
     _source_dir = source_dir
     mapping_file = os.path.join(source_dir, 'platform_mapping.json')
     
@@ -131,14 +147,1109 @@ def get_random_ua() -> str:
     return random.choice(USER_AGENTS)
 
 
+# Identificativo della source usato come label nelle metriche
+SOURCE_ID = "vimms"
+
+# Registro metriche in-process: contatori e istogrammi di latenza per source/metodo/host
+# È condiviso da tutte le chiamate a execute() nello stesso interprete
+_metrics_lock = threading.Lock()
+_metrics_counters: Dict[tuple, float] = {}
+_metrics_histograms: Dict[tuple, Dict[str, Any]] = {}
+_metrics_started_at = time.time()
+
+# Limiti superiori (in secondi) dei bucket degli istogrammi di latenza
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0, float('inf'))
+
+# Contesto della chiamata execute() corrente (metodo in esecuzione, ecc.)
+_request_context = threading.local()
+
+
+def current_method() -> str:
+    """Ritorna il metodo execute() in esecuzione nel thread corrente"""
+    return getattr(_request_context, 'method', None) or 'unknown'
+
+
+# Campi del contesto copiati nei thread worker avviati durante una chiamata
+REQUEST_CONTEXT_FIELDS = ('method', 'base_url', 'source_dir', 'rate_limit', 'deadline')
+
+
+def run_with_context(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Avvolge func perché giri in un thread worker con il contesto della chiamata corrente"""
+    context = {name: getattr(_request_context, name, None) for name in REQUEST_CONTEXT_FIELDS}
+
+    def wrapper(*args, **kwargs):
+        for name, value in context.items():
+            setattr(_request_context, name, value)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            for name in context:
+                setattr(_request_context, name, None)
+    return wrapper
+
+
+def metrics_inc(name: str, labels: Dict[str, str], value: float = 1) -> None:
+    """Incrementa un contatore del registro metriche"""
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        _metrics_counters[key] = _metrics_counters.get(key, 0) + value
+
+
+def metrics_observe(name: str, labels: Dict[str, str], seconds: float) -> None:
+    """Registra una latenza (in secondi) nell'istogramma indicato"""
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        histogram = _metrics_histograms.get(key)
+        if histogram is None:
+            histogram = {'buckets': [0] * len(LATENCY_BUCKETS), 'count': 0, 'sum': 0.0, 'max': 0.0}
+            _metrics_histograms[key] = histogram
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][i] += 1
+                break
+        histogram['count'] += 1
+        histogram['sum'] += seconds
+        histogram['max'] = max(histogram['max'], seconds)
+
+
+def _histogram_percentile(histogram: Dict[str, Any], quantile: float) -> Optional[float]:
+    """Stima un percentile dai bucket (limite superiore del bucket che lo contiene)"""
+    if not histogram['count']:
+        return None
+    target = quantile * histogram['count']
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+        cumulative += count
+        if cumulative >= target:
+            return min(bound, histogram['max'])
+    return histogram['max']
+
+
+def metrics_snapshot() -> Dict[str, Any]:
+    """Ritorna una copia serializzabile del registro metriche"""
+    with _metrics_lock:
+        counters = [
+            {'name': name, 'labels': dict(labels), 'value': value}
+            for (name, labels), value in sorted(_metrics_counters.items())
+        ]
+        histograms = []
+        for (name, labels), histogram in sorted(_metrics_histograms.items()):
+            histograms.append({
+                'name': name,
+                'labels': dict(labels),
+                'count': histogram['count'],
+                'sum': round(histogram['sum'], 6),
+                'max': round(histogram['max'], 6),
+                'p50': _histogram_percentile(histogram, 0.50),
+                'p95': _histogram_percentile(histogram, 0.95),
+                'p99': _histogram_percentile(histogram, 0.99),
+            })
+    return {
+        'source': SOURCE_ID,
+        'uptime_seconds': round(time.time() - _metrics_started_at, 3),
+        'counters': counters,
+        'histograms': histograms
+    }
+
+
+def _prometheus_labels(labels: tuple, extra: Optional[Dict[str, str]] = None) -> str:
+    """Formatta le label nel formato testuale Prometheus"""
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ''
+    escaped = []
+    for k, v in items:
+        value = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{k}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def write_prometheus_file(path: str) -> str:
+    """Scrive il registro metriche in formato testuale Prometheus (scrittura atomica)"""
+    lines = []
+    with _metrics_lock:
+        typed = set()
+        for (name, labels), value in sorted(_metrics_counters.items()):
+            metric = f'tottodrillo_{name}'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} counter')
+                typed.add(metric)
+            lines.append(f'{metric}{_prometheus_labels(labels)} {value}')
+        for (name, labels), histogram in sorted(_metrics_histograms.items()):
+            metric = f'tottodrillo_{name}'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} histogram')
+                typed.add(metric)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else str(bound)
+                lines.append(f'{metric}_bucket{_prometheus_labels(labels, {"le": le})} {cumulative}')
+            lines.append(f'{metric}_sum{_prometheus_labels(labels)} {histogram["sum"]}')
+            lines.append(f'{metric}_count{_prometheus_labels(labels)} {histogram["count"]}')
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+    return path
+
+
+# Directory (dentro source_dir) per i dati persistenti della source
+CACHE_DIR_NAME = 'cache'
+
+
+def get_cache_dir(source_dir: Optional[str] = None) -> Optional[str]:
+    """Ritorna (creandola) la directory cache della source, o None se source_dir non è noto"""
+    source_dir = source_dir or getattr(_request_context, 'source_dir', None)
+    if not source_dir:
+        return None
+    cache_dir = os.path.join(source_dir, CACHE_DIR_NAME)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError:
+        return None
+    return cache_dir
+
+
+def write_json_atomic(path: str, data: Any) -> None:
+    """Scrive un file JSON passando da un file temporaneo (mai file troncati)"""
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+# Rate limiter per host (token bucket) applicato da http_get a tutte le richieste.
+# Su 429/503 il rate si dimezza e Retry-After blocca l'host; con le risposte OK il rate
+# risale gradualmente. I rate appresi sono salvati in cache/rate_limits.json.
+# Configurabile per chiamata ("rate_limit": {"rate": 2, "burst": 5}) o con la variabile
+# d'ambiente TOTTODRILLO_RATE_LIMIT="rate[:burst]" ("0" lo disattiva)
+RATE_LIMIT_ENV_VAR = 'TOTTODRILLO_RATE_LIMIT'
+RATE_LIMIT_DEFAULT_RATE = 2.0  # Richieste al secondo per host
+RATE_LIMIT_DEFAULT_BURST = 5
+RATE_LIMIT_MIN_RATE = 0.1
+RATE_LIMIT_DECREASE_FACTOR = 0.5
+RATE_LIMIT_INCREASE_STEP = 0.05  # Richieste/s recuperate per ogni risposta OK
+RATE_LIMIT_MAX_WAIT = 30.0  # Attesa massima prima di una richiesta (secondi)
+RATE_LIMIT_THROTTLE_STATUS = (429, 503)
+RATE_LIMITS_FILE = 'rate_limits.json'
+
+_rate_limit_lock = threading.Lock()
+_rate_limiters = {}  # host -> TokenBucket
+_learned_rates = {}  # host -> rate letto da rate_limits.json
+_rate_limits_loaded = set()  # source_dir già letti
+_rate_limits_dirty = False
+
+
+class TokenBucket:
+    """Token bucket di un host con rate adattivo e blocco temporaneo da Retry-After"""
+    __slots__ = ('lock', 'max_rate', 'burst', 'rate', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, max_rate: float, burst: int, rate: Optional[float] = None):
+        self.lock = threading.Lock()
+        self.max_rate = max_rate
+        self.burst = burst
+        self.rate = max(RATE_LIMIT_MIN_RATE, min(rate or max_rate, max_rate))
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def configure(self, max_rate: float, burst: int) -> None:
+        with self.lock:
+            self.max_rate = max_rate
+            self.burst = burst
+            self.rate = min(self.rate, max_rate)
+
+    def acquire(self) -> float:
+        """Prenota un token e ritorna i secondi da attendere prima della richiesta"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return min(max(wait, self.blocked_until - now), RATE_LIMIT_MAX_WAIT)
+
+    def on_throttled(self, retry_after: Optional[float]) -> None:
+        """Riduce il rate dopo un 429/503 e blocca l'host per Retry-After secondi"""
+        with self.lock:
+            self.rate = max(RATE_LIMIT_MIN_RATE, self.rate * RATE_LIMIT_DECREASE_FACTOR)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def on_success(self) -> bool:
+        """Fa risalire il rate dopo una risposta OK; ritorna True se il rate è cambiato"""
+        with self.lock:
+            if self.rate >= self.max_rate:
+                return False
+            self.rate = min(self.max_rate, self.rate + RATE_LIMIT_INCREASE_STEP)
+            return True
+
+
+def rate_limit_config() -> Optional[Tuple[float, int]]:
+    """Ritorna (rate, burst) per la chiamata corrente, o None se il rate limiter è disattivato"""
+    config = getattr(_request_context, 'rate_limit', None)
+    if config is None:
+        env_value = os.environ.get(RATE_LIMIT_ENV_VAR, '').strip()
+        if env_value:
+            rate, _, burst = env_value.partition(':')
+            config = {'rate': rate, 'burst': burst or None}
+    if config is False:
+        return None
+    if not isinstance(config, dict):
+        config = {}
+    try:
+        rate = float(config.get('rate') if config.get('rate') is not None else RATE_LIMIT_DEFAULT_RATE)
+        burst = int(config.get('burst') or RATE_LIMIT_DEFAULT_BURST)
+    except (TypeError, ValueError):
+        rate, burst = RATE_LIMIT_DEFAULT_RATE, RATE_LIMIT_DEFAULT_BURST
+    if rate <= 0:
+        return None
+    return rate, max(1, burst)
+
+
+def load_rate_limits() -> None:
+    """Legge (una volta per source_dir) i rate appresi nelle chiamate precedenti"""
+    cache_dir = get_cache_dir()
+    if not cache_dir or cache_dir in _rate_limits_loaded:
+        return
+    _rate_limits_loaded.add(cache_dir)
+    path = os.path.join(cache_dir, RATE_LIMITS_FILE)
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ [rate_limit] Impossibile leggere {path}: {e}", file=sys.stderr)
+        return
+    with _rate_limit_lock:
+        for host, state in saved.items():
+            if isinstance(state, dict) and isinstance(state.get('rate'), (int, float)):
+                _learned_rates[host] = float(state['rate'])
+                if host in _rate_limiters:
+                    bucket = _rate_limiters[host]
+                    bucket.rate = max(RATE_LIMIT_MIN_RATE, min(bucket.rate, _learned_rates[host]))
+
+
+def save_rate_limits() -> None:
+    """Salva i rate appresi in cache/rate_limits.json se sono cambiati"""
+    global _rate_limits_dirty
+    if not _rate_limits_dirty:
+        return
+    cache_dir = get_cache_dir()
+    if not cache_dir:
+        return
+    with _rate_limit_lock:
+        _rate_limits_dirty = False
+        state = {host: {'rate': round(bucket.rate, 4), 'max_rate': bucket.max_rate, 'updated': round(time.time())}
+                 for host, bucket in _rate_limiters.items()}
+    try:
+        write_json_atomic(os.path.join(cache_dir, RATE_LIMITS_FILE), state)
+    except OSError as e:
+        print(f"⚠️ [rate_limit] Impossibile salvare i rate: {e}", file=sys.stderr)
+
+
+def get_rate_limiter(host: str) -> Optional[TokenBucket]:
+    """Ritorna il token bucket dell'host (None se il rate limiter è disattivato)"""
+    config = rate_limit_config()
+    if config is None:
+        return None
+    load_rate_limits()
+    with _rate_limit_lock:
+        bucket = _rate_limiters.get(host)
+        if bucket is None:
+            bucket = _rate_limiters[host] = TokenBucket(config[0], config[1], _learned_rates.get(host))
+        elif (bucket.max_rate, bucket.burst) != config:
+            bucket.configure(*config)
+    return bucket
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Converte l'header Retry-After (secondi o data HTTP) in secondi"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def rate_limit_feedback(limiter: TokenBucket, response: requests.Response, labels: Dict[str, str]) -> None:
+    """Adatta il rate dell'host in base all'esito della risposta"""
+    global _rate_limits_dirty
+    if response.status_code in RATE_LIMIT_THROTTLE_STATUS:
+        limiter.on_throttled(parse_retry_after(response.headers.get('Retry-After')))
+        metrics_inc('rate_limit_throttled_total', dict(labels, status=str(response.status_code)))
+        _rate_limits_dirty = True
+    elif response.status_code < 400 and limiter.on_success():
+        _rate_limits_dirty = True
+
+
+def rate_limit_snapshot() -> Dict[str, Any]:
+    """Stato dei token bucket per host (per getStats)"""
+    with _rate_limit_lock:
+        return {host: {'rate': round(bucket.rate, 4), 'max_rate': bucket.max_rate, 'burst': bucket.burst,
+                       'blocked_for_seconds': round(max(0.0, bucket.blocked_until - time.monotonic()), 3)}
+                for host, bucket in _rate_limiters.items()}
+
+
+# Politica di retry condivisa: backoff esponenziale con jitter, budget di retry per
+# chiamata execute() e classificazione degli errori ritentabili
+RETRY_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5  # Secondi prima del secondo tentativo (raddoppia a ogni tentativo)
+RETRY_MAX_DELAY = 8.0
+RETRY_BUDGET_PER_CALL = 6  # Retry totali consentiti in una chiamata execute()
+RETRIABLE_STATUS = (408, 425, 429, 500, 502, 503, 504)
+
+
+class RetryableError(Exception):
+    """Tentativo fallito ma ripetibile (pagina incompleta, redirect verso un popup, ...)"""
+
+
+class RetryPolicy:
+    """Esegue una funzione ritentando gli errori transitori con backoff esponenziale e jitter"""
+
+    def __init__(self, max_attempts: int = RETRY_MAX_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @staticmethod
+    def classify(error: Exception) -> Optional[str]:
+        """Ritorna il motivo del retry, o None se l'errore non è ritentabile"""
+        if isinstance(error, RetryableError):
+            return type(error).__name__
+        if isinstance(error, requests.HTTPError):
+            status = error.response.status_code if error.response is not None else None
+            return f'http_{status}' if status in RETRIABLE_STATUS else None
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return type(error).__name__
+        return None
+
+    def delay(self, attempt: int, error: Exception) -> float:
+        """Attesa prima del tentativo successivo (rispetta Retry-After se presente)"""
+        backoff = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        wait = random.uniform(backoff / 2, backoff)
+        response = getattr(error, 'response', None)
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after:
+                wait = max(wait, min(retry_after, self.max_delay))
+        return wait
+
+    def run(self, func: Callable[[], Any], description: str = '') -> Any:
+        """Chiama func() finché riesce, l'errore non è ritentabile o tentativi/budget sono esauriti"""
+        attempt = 1
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                reason = self.classify(e)
+                if reason is None or attempt >= self.max_attempts or not consume_retry_budget():
+                    raise
+                wait = self.delay(attempt, e)
+                check_deadline(wait)
+                metrics_inc('retries_total', {'source': SOURCE_ID, 'method': current_method(), 'reason': reason})
+                print(f"⚠️ [retry] {description or 'richiesta'}: {e} - riprovo tra {wait:.1f}s "
+                      f"(tentativo {attempt + 1}/{self.max_attempts})", file=sys.stderr)
+                time.sleep(wait)
+                attempt += 1
+
+
+def consume_retry_budget() -> bool:
+    """Consuma un retry dal budget della chiamata corrente; False se esaurito"""
+    budget = getattr(_request_context, 'retry_budget', None)
+    if budget is None:
+        return True
+    if budget <= 0:
+        return False
+    _request_context.retry_budget = budget - 1
+    return True
+
+
+def fetch_with_retry(url: str, session: Optional[requests.Session] = None,
+                     policy: Optional[RetryPolicy] = None, **kwargs) -> requests.Response:
+    """
+    http_get con retry sugli errori transitori (rete, timeout, 429/5xx)
+    Le risposte con altri status vengono restituite al chiamante così come sono
+    """
+    def attempt() -> requests.Response:
+        response = http_get(url, session=session, **kwargs)
+        if response.status_code in RETRIABLE_STATUS:
+            response.raise_for_status()
+        return response
+    return (policy or RetryPolicy()).run(attempt, url)
+
+
+# Circuit breaker per host: dopo CIRCUIT_FAILURE_THRESHOLD fallimenti consecutivi (errori di
+# rete, timeout, 5xx) le richieste verso l'host falliscono subito con SourceUnavailableError;
+# trascorso il cooldown passa una sola richiesta di prova (half-open) che lo richiude o riapre
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN_SECONDS = 30.0
+CIRCUIT_FAILURE_STATUS = (500, 502, 503, 504)
+LAST_GOOD_CACHE_SIZE = 64  # Risposte recenti riusate quando la sorgente non è raggiungibile
+REQUEST_KEY_IGNORED_PARAMS = ('source_dir', 'profile', 'rate_limit', 'prometheus_file', 'refresh', 'serve_policy',
+                              'deadline_ms')
+
+_circuit_lock = threading.Lock()
+_circuit_breakers = {}  # host -> CircuitBreaker
+_last_good_lock = threading.Lock()
+_last_good_responses = OrderedDict()  # chiave richiesta -> risposta JSON
+
+
+class SourceUnavailableError(Exception):
+    """L'host upstream è considerato non raggiungibile (circuit breaker aperto)"""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"Sorgente non disponibile: {host} (nuovo tentativo tra {retry_in:.0f}s)")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Stato del circuit breaker di un host: closed, open o half_open"""
+    __slots__ = ('host', 'lock', 'state', 'failures', 'opened_at', 'probe_in_flight', 'last_error')
+
+    def __init__(self, host: str):
+        self.host = host
+        self.lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.last_error = None
+
+    def before_request(self) -> None:
+        """Solleva SourceUnavailableError se l'host è giù; in half-open lascia passare una sola prova"""
+        with self.lock:
+            if self.state == 'closed':
+                return
+            retry_in = self.opened_at + CIRCUIT_COOLDOWN_SECONDS - time.monotonic()
+            if self.state == 'open' and retry_in <= 0:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return
+            raise SourceUnavailableError(self.host, max(0.0, retry_in))
+
+    def release_probe(self) -> None:
+        """Libera la richiesta di prova half-open senza cambiare stato (richiesta non eseguita)"""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self.lock:
+            if self.state != 'closed':
+                print(f"✅ [circuit] {self.host} di nuovo raggiungibile", file=sys.stderr)
+            self.state = 'closed'
+            self.failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self, reason: str) -> None:
+        with self.lock:
+            self.failures += 1
+            self.last_error = reason
+            self.probe_in_flight = False
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= CIRCUIT_FAILURE_THRESHOLD):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                metrics_inc('circuit_opened_total', {'source': SOURCE_ID, 'host': self.host})
+                print(f"⛔ [circuit] {self.host} non disponibile dopo {self.failures} errori ({reason})", file=sys.stderr)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            retry_in = self.opened_at + CIRCUIT_COOLDOWN_SECONDS - time.monotonic() if self.state == 'open' else 0.0
+            return {'state': self.state, 'consecutive_failures': self.failures,
+                    'retry_in_seconds': round(max(0.0, retry_in), 3), 'last_error': self.last_error}
+
+
+def get_circuit_breaker(host: str) -> CircuitBreaker:
+    with _circuit_lock:
+        breaker = _circuit_breakers.get(host)
+        if breaker is None:
+            breaker = _circuit_breakers[host] = CircuitBreaker(host)
+        return breaker
+
+
+def circuit_snapshot() -> Dict[str, Any]:
+    """Stato dei circuit breaker per host (per getCircuitState e getStats)"""
+    with _circuit_lock:
+        breakers = list(_circuit_breakers.values())
+    return {breaker.host: breaker.snapshot() for breaker in breakers}
+
+
+def request_cache_key(params: Dict[str, Any]) -> str:
+    """Chiave normalizzata di una richiesta execute() (senza i parametri che non cambiano la risposta)"""
+    return json.dumps({k: v for k, v in params.items() if k not in REQUEST_KEY_IGNORED_PARAMS},
+                      sort_keys=True, default=str)
+
+
+def remember_good_response(params: Dict[str, Any], result: str) -> None:
+    """Conserva l'ultima risposta valida di una richiesta per i periodi di indisponibilità"""
+    key = request_cache_key(params)
+    with _last_good_lock:
+        _last_good_responses[key] = result
+        _last_good_responses.move_to_end(key)
+        while len(_last_good_responses) > LAST_GOOD_CACHE_SIZE:
+            _last_good_responses.popitem(last=False)
+
+
+def source_unavailable_response(params: Dict[str, Any], error: SourceUnavailableError) -> str:
+    """Risposta per sorgente non disponibile: l'ultima risposta valida se presente, altrimenti un errore strutturato"""
+    with _last_good_lock:
+        cached = _last_good_responses.get(request_cache_key(params))
+    if cached is not None:
+        data = json.loads(cached)
+        data["source_unavailable"] = True
+        return dumps_json(data, compact=response_schema(params) >= RESPONSE_SCHEMA_COMPACT)
+    return json.dumps({
+        "error": str(error),
+        "error_code": "source_unavailable",
+        "host": error.host,
+        "retry_after_seconds": round(error.retry_in, 1)
+    })
+
+# Cache negativa: getEntry con entry null (slug inesistente, 404) e ricerche senza risultati
+# vengono ricordati per un breve periodo, così lo stesso slug morto non viene richiesto a ogni
+# visualizzazione. Solo risposte ottenute senza errori upstream; "refresh": true la ignora
+NEGATIVE_CACHE_TTL = {'getEntry': 600.0, 'searchRoms': 300.0}  # Secondi per metodo
+NEGATIVE_CACHE_SIZE = 256
+NEGATIVE_RESULT_MAX_LENGTH = 512  # Le risposte vuote sono piccole: le altre non vengono analizzate
+
+_negative_lock = threading.Lock()
+_negative_results = OrderedDict()  # chiave richiesta -> (scadenza, risposta JSON)
+
+
+def is_negative_result(method: str, result: str) -> bool:
+    """True se la risposta è un "non trovato": entry null o nessun risultato"""
+    if len(result) > NEGATIVE_RESULT_MAX_LENGTH:
+        return False
+    try:
+        data = json.loads(result)
+    except ValueError:
+        return False
+    if not isinstance(data, dict) or 'error' in data:
+        return False
+    if method == 'getEntry':
+        return 'entry' in data and data['entry'] is None
+    return not (data.get('results') or data.get('roms'))
+
+
+def cached_negative_result(method: str, params: Dict[str, Any]) -> Optional[str]:
+    """Risposta negativa ancora valida per la richiesta, o None"""
+    if method not in NEGATIVE_CACHE_TTL or params.get("refresh", False):
+        return None
+    key = request_cache_key(params)
+    with _negative_lock:
+        cached = _negative_results.get(key)
+        if cached and cached[0] <= time.monotonic():
+            del _negative_results[key]
+            cached = None
+    metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'negative', 'result': 'hit' if cached else 'miss'})
+    return cached[1] if cached else None
+
+
+def remember_negative_result(method: str, params: Dict[str, Any], result: str) -> None:
+    if method not in NEGATIVE_CACHE_TTL or not is_negative_result(method, result):
+        return
+    key = request_cache_key(params)
+    with _negative_lock:
+        _negative_results[key] = (time.monotonic() + NEGATIVE_CACHE_TTL[method], result)
+        _negative_results.move_to_end(key)
+        while len(_negative_results) > NEGATIVE_CACHE_SIZE:
+            _negative_results.popitem(last=False)
+
+# Single-flight: chiamate identiche e contemporanee di searchRoms/getEntry (es. prefetch della
+# lista e schermata di dettaglio) condividono un'unica richiesta upstream. La prima chiamata
+# esegue il lavoro, le altre attendono il suo risultato (o la sua eccezione)
+SINGLE_FLIGHT_METHODS = ('searchRoms', 'getEntry')
+
+_inflight_lock = threading.Lock()
+_inflight = {}  # chiave richiesta -> _Flight
+
+
+class _Flight:
+    """Una chiamata in corso e il suo esito, condiviso con le chiamate identiche"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.upstream_failed = False
+
+
+def single_flight(method: str, params: Dict[str, Any], func: Callable[[], str]) -> str:
+    """Esegue func una sola volta per tutte le chiamate identiche in corso nello stesso processo"""
+    if method not in SINGLE_FLIGHT_METHODS:
+        return func()
+    key = request_cache_key(params)
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+    metrics_inc('singleflight_requests_total', {'source': SOURCE_ID, 'method': method,
+                                                'role': 'leader' if leader else 'follower'})
+    if not leader:
+        print(f"🔗 [single_flight] {method} già in corso, attendo il risultato condiviso", file=sys.stderr)
+        remaining = remaining_time()
+        if not flight.done.wait(max(0.0, remaining) if remaining is not None else None):
+            raise DeadlineExceededError("Tempo massimo della richiesta (deadline_ms) esaurito")
+        if flight.upstream_failed:
+            _request_context.upstream_failed = True
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    try:
+        flight.result = func()
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        flight.upstream_failed = getattr(_request_context, 'upstream_failed', False)
+        with _inflight_lock:
+            del _inflight[key]
+        flight.done.set()
+
+# Politica di servizio di searchRoms/getEntry: le risposte valide sono salvate in cache/responses.
+# Entro ttl_seconds vengono restituite senza contattare la sorgente; oltre il TTL (fino a
+# max_stale_seconds) escono subito con "stale": true mentre un thread le aggiorna; se la rete
+# non risponde si usa qualsiasi copia salvata con "offline": true. Configurabile per metodo in
+# SERVE_POLICY o per chiamata ("serve_policy": {...}, false la disattiva); "refresh": true
+# salta le copie salvate ma mantiene il fallback offline
+SERVE_POLICY = {
+    'searchRoms': {'ttl_seconds': 300, 'max_stale_seconds': 24 * 3600, 'stale_while_revalidate': True, 'offline': True},
+    'getEntry': {'ttl_seconds': 900, 'max_stale_seconds': 7 * 24 * 3600, 'stale_while_revalidate': True, 'offline': True},
+}
+RESPONSE_STORE_DIR = 'responses'
+RESPONSE_STORE_MAX_FILES = 500
+RESPONSE_STORE_MEMORY_SIZE = 64
+
+_response_store_lock = threading.Lock()
+_stored_responses = OrderedDict()  # chiave richiesta -> (salvata il, risposta JSON)
+_response_store_writes = 0
+
+
+def serve_policy(method: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Politica di servizio della chiamata, o None se disattivata"""
+    policy = SERVE_POLICY.get(method)
+    override = params.get("serve_policy")
+    if policy is None or override is False:
+        return None
+    policy = dict(policy)
+    if isinstance(override, dict):
+        policy.update({k: v for k, v in override.items() if k in policy})
+    if params.get("refresh", False):
+        policy.update(ttl_seconds=0, stale_while_revalidate=False)
+    return policy
+
+
+def response_store_path(key: str, source_dir: Optional[str]) -> Optional[str]:
+    cache_dir = get_cache_dir(source_dir)
+    if not cache_dir:
+        return None
+    store_dir = os.path.join(cache_dir, RESPONSE_STORE_DIR)
+    os.makedirs(store_dir, exist_ok=True)
+    return os.path.join(store_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+
+def load_stored_response(params: Dict[str, Any]) -> Optional[Tuple[float, str]]:
+    """Ritorna (timestamp di salvataggio, risposta) dalla memoria o da cache/responses"""
+    key = request_cache_key(params)
+    with _response_store_lock:
+        stored = _stored_responses.get(key)
+    if stored:
+        return stored
+    try:
+        with open(response_store_path(key, params.get("source_dir")), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        stored = (float(data['stored_at']), data['result'])
+    except (TypeError, OSError, ValueError, KeyError):
+        return None
+    with _response_store_lock:
+        _stored_responses[key] = stored
+        while len(_stored_responses) > RESPONSE_STORE_MEMORY_SIZE:
+            _stored_responses.popitem(last=False)
+    return stored
+
+
+def store_response(params: Dict[str, Any], result: str) -> None:
+    """Salva una risposta valida; oltre RESPONSE_STORE_MAX_FILES elimina le più vecchie"""
+    global _response_store_writes
+    key = request_cache_key(params)
+    stored = (time.time(), result)
+    with _response_store_lock:
+        _stored_responses[key] = stored
+        _stored_responses.move_to_end(key)
+        while len(_stored_responses) > RESPONSE_STORE_MEMORY_SIZE:
+            _stored_responses.popitem(last=False)
+        _response_store_writes += 1
+        prune = _response_store_writes % 50 == 0
+    try:
+        path = response_store_path(key, params.get("source_dir"))
+        if not path:
+            return
+        write_json_atomic(path, {'stored_at': stored[0], 'result': result})
+        if prune:
+            store_dir = os.path.dirname(path)
+            files = sorted((os.path.join(store_dir, name) for name in os.listdir(store_dir)), key=os.path.getmtime)
+            for old in files[:-RESPONSE_STORE_MAX_FILES]:
+                os.remove(old)
+    except OSError as e:
+        print(f"⚠️ [store_response] Impossibile salvare la risposta: {e}", file=sys.stderr)
+
+
+def flag_response(result: str, params: Dict[str, Any], flag: str, stored_at: float) -> str:
+    """Aggiunge a una risposta salvata il flag indicato ("stale"/"offline") e la sua età"""
+    data = json.loads(result)
+    data[flag] = True
+    data["cached_age_seconds"] = int(max(0, time.time() - stored_at))
+    return dumps_json(data, compact=response_schema(params) >= RESPONSE_SCHEMA_COMPACT)
+
+
+def revalidate_in_background(method: str, params: Dict[str, Any]) -> None:
+    """Aggiorna in un thread la risposta salvata, condividendo l'eventuale richiesta identica in corso"""
+    def refresh() -> None:
+        _request_context.deadline = None
+        _request_context.retry_budget = RETRY_BUDGET_PER_CALL
+        _request_context.upstream_failed = False
+        try:
+            result = single_flight(method, params, lambda: dispatch_method(method, params, params.get("source_dir")))
+            if (not result.startswith('{"error"') and not _request_context.upstream_failed
+                    and not is_negative_result(method, result)):
+                store_response(params, result)
+                metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'responses', 'result': 'revalidated'})
+        except Exception as e:
+            print(f"⚠️ [revalidate] Aggiornamento di {method} fallito: {e}", file=sys.stderr)
+        finally:
+            save_rate_limits()
+
+    threading.Thread(target=run_with_context(refresh), daemon=True).start()
+
+
+def serve_stored_response(method: str, params: Dict[str, Any], policy: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Risposta salvata ancora valida (fresca, o scaduta con "stale": true), o None"""
+    stored = load_stored_response(params) if policy else None
+    if not stored:
+        return None
+    age = time.time() - stored[0]
+    labels = {'source': SOURCE_ID, 'cache': 'responses'}
+    if age < float(policy['ttl_seconds']):
+        metrics_inc('cache_requests_total', dict(labels, result='hit'))
+        return stored[1]
+    if policy['stale_while_revalidate'] and age < float(policy['ttl_seconds']) + float(policy['max_stale_seconds']):
+        metrics_inc('cache_requests_total', dict(labels, result='stale'))
+        print(f"♻️ [serve_stored_response] {method}: copia scaduta da {int(age)}s, aggiorno in background", file=sys.stderr)
+        revalidate_in_background(method, params)
+        return flag_response(stored[1], params, 'stale', stored[0])
+    return None
+
+
+def offline_response(params: Dict[str, Any], policy: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Qualsiasi copia salvata, con "offline": true, quando la sorgente non risponde"""
+    stored = load_stored_response(params) if policy and policy['offline'] else None
+    if not stored:
+        return None
+    metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'responses', 'result': 'offline'})
+    print("📴 [offline_response] Sorgente non raggiungibile, uso la copia salvata", file=sys.stderr)
+    return flag_response(stored[1], params, 'offline', stored[0])
+
+
+# Timeout adattivi per (host, endpoint): il read timeout è il p99 delle latenze recenti
+# moltiplicato per TIMEOUT_P99_FACTOR, limitato tra TIMEOUT_MIN_SECONDS e il timeout
+# predefinito della chiamata (usato finché non ci sono abbastanza campioni, e per
+# TIMEOUT_RECOVERY_SECONDS dopo un timeout, così le risposte lente tornano a essere misurate).
+# Il parametro "deadline_ms" di execute() limita il tempo totale di tutte le richieste
+CONNECT_TIMEOUT_SECONDS = 5.0
+DEFAULT_TIMEOUT_SECONDS = 15.0
+TIMEOUT_P99_FACTOR = 3.0
+TIMEOUT_MIN_SECONDS = 2.0
+TIMEOUT_MIN_SAMPLES = 20
+TIMEOUT_WINDOW = 200  # Campioni di latenza conservati per (host, endpoint)
+TIMEOUT_RECOVERY_SECONDS = 300.0
+
+_timeout_lock = threading.Lock()
+_latency_samples = {}  # (host, endpoint) -> deque delle ultime latenze
+_timeout_defaults = {}  # (host, endpoint) -> timeout predefinito della chiamata
+_timeout_counts = {}  # (host, endpoint) -> richieste scadute (non usate come campioni di latenza)
+_last_timeouts = {}  # (host, endpoint) -> istante (monotonic) dell'ultima richiesta scaduta
+
+
+class DeadlineExceededError(Exception):
+    """Il tempo massimo della chiamata execute() (deadline_ms) è esaurito"""
+
+
+def remaining_time() -> Optional[float]:
+    """Secondi rimanenti prima del deadline della chiamata corrente (None se non impostato)"""
+    deadline = getattr(_request_context, 'deadline', None)
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline(needed: float = 0.0) -> None:
+    """Solleva DeadlineExceededError se non restano almeno needed secondi"""
+    remaining = remaining_time()
+    if remaining is not None and remaining <= needed:
+        raise DeadlineExceededError("Tempo massimo della richiesta (deadline_ms) esaurito")
+
+
+def record_latency(host: str, endpoint: str, seconds: float) -> None:
+    with _timeout_lock:
+        samples = _latency_samples.get((host, endpoint))
+        if samples is None:
+            samples = _latency_samples[(host, endpoint)] = deque(maxlen=TIMEOUT_WINDOW)
+        samples.append(seconds)
+
+
+def record_timeout(host: str, endpoint: str) -> None:
+    with _timeout_lock:
+        _timeout_counts[(host, endpoint)] = _timeout_counts.get((host, endpoint), 0) + 1
+        _last_timeouts[(host, endpoint)] = time.monotonic()
+
+
+def adaptive_read_timeout(host: str, endpoint: str, default: float) -> float:
+    """Read timeout per (host, endpoint) calcolato dalle latenze osservate"""
+    with _timeout_lock:
+        samples = sorted(_latency_samples.get((host, endpoint), ()))
+        last_timeout = _last_timeouts.get((host, endpoint))
+    if len(samples) < TIMEOUT_MIN_SAMPLES:
+        return default
+    if last_timeout is not None and time.monotonic() - last_timeout < TIMEOUT_RECOVERY_SECONDS:
+        # L'host è rallentato oltre la stima: il timeout predefinito lascia arrivare le risposte lente
+        return default
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return max(TIMEOUT_MIN_SECONDS, min(default, p99 * TIMEOUT_P99_FACTOR))
+
+
+def request_timeouts(host: str, endpoint: str, default: float,
+                     adaptive: bool = True) -> Tuple[Tuple[float, float], bool]:
+    """
+    Ritorna ((connect, read), True se il read timeout è stato ridotto dal deadline)
+    Con adaptive=False il read timeout resta quello indicato (es. trasferimenti di file)
+    """
+    with _timeout_lock:
+        _timeout_defaults[(host, endpoint)] = default
+    read = adaptive_read_timeout(host, endpoint, default) if adaptive else default
+    connect = min(CONNECT_TIMEOUT_SECONDS, read)
+    remaining = remaining_time()
+    if remaining is not None and remaining < read:
+        check_deadline()
+        return (min(connect, remaining), remaining), True
+    return (connect, read), False
+
+
+def timeout_snapshot() -> Dict[str, Any]:
+    """Timeout correnti per (host, endpoint) (per getStats)"""
+    with _timeout_lock:
+        counts = {key: len(samples) for key, samples in _latency_samples.items()}
+        timed_out = dict(_timeout_counts)
+        defaults = dict(_timeout_defaults)
+    snapshot = {}
+    for host, endpoint in sorted(set(counts) | set(timed_out)):
+        default = defaults.get((host, endpoint), DEFAULT_TIMEOUT_SECONDS)
+        snapshot[f'{host} {endpoint}'] = {'samples': counts.get((host, endpoint), 0),
+                                          'timeouts': timed_out.get((host, endpoint), 0),
+                                          'default_timeout': default,
+                                          'read_timeout': round(adaptive_read_timeout(host, endpoint, default), 3)}
+    return snapshot
+
+
+def http_get(url: str, session: Optional[requests.Session] = None, endpoint: str = 'default',
+             **kwargs) -> requests.Response:
+    """
+    Esegue una GET verso l'upstream registrando latenza, esito e byte scaricati
+    Tutte le richieste HTTP della source passano da qui; timeout è il valore predefinito
+    dell'endpoint, sostituito dal timeout adattivo quando ci sono abbastanza campioni
+    (adaptive_timeout=False per tenerlo fisso)
+    """
+    host = urllib.parse.urlparse(url).netloc or 'unknown'
+    labels = {'source': SOURCE_ID, 'method': current_method(), 'host': host}
+    check_deadline()
+    breaker = get_circuit_breaker(host)
+    breaker.before_request()
+    # rate_limited=False per le risorse statiche (copertine), che l'app scaricava già senza limiti
+    limiter = get_rate_limiter(host) if kwargs.pop('rate_limited', True) else None
+    adaptive_timeout = kwargs.pop('adaptive_timeout', True)
+    try:
+        if limiter:
+            wait = limiter.acquire()
+            if wait > 0:
+                check_deadline(wait)
+                metrics_observe('rate_limit_wait_seconds', labels, wait)
+                time.sleep(wait)
+        kwargs['timeout'], deadline_bound = request_timeouts(host, endpoint, kwargs.get('timeout') or DEFAULT_TIMEOUT_SECONDS,
+                                                             adaptive_timeout)
+    except DeadlineExceededError:
+        breaker.release_probe()
+        raise
+    start = time.monotonic()
+    try:
+        response = (session or requests).get(url, **kwargs)
+    except Exception as e:
+        metrics_observe('upstream_latency_seconds', labels, time.monotonic() - start)
+        metrics_inc('upstream_errors_total', dict(labels, kind=type(e).__name__))
+        if deadline_bound and isinstance(e, requests.Timeout):
+            # Timeout dovuto al deadline della chiamata, non a un problema dell'host
+            breaker.release_probe()
+            raise DeadlineExceededError("Tempo massimo della richiesta (deadline_ms) esaurito") from e
+        if isinstance(e, requests.Timeout):
+            # Il limite scaduto non è una latenza osservata: non deve alimentare il timeout adattivo
+            record_timeout(host, endpoint)
+        if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+            breaker.record_failure(type(e).__name__)
+            _request_context.upstream_failed = True
+        else:
+            # Nessuno scambio riuscito (URL non valido, troppi redirect...): nessun esito per il breaker
+            breaker.release_probe()
+        raise
+    elapsed = time.monotonic() - start
+    metrics_observe('upstream_latency_seconds', labels, elapsed)
+    record_latency(host, endpoint, elapsed)
+    metrics_inc('upstream_requests_total', dict(labels, status=str(response.status_code)))
+    if response.status_code >= 400:
+        metrics_inc('upstream_errors_total', dict(labels, kind=f'http_{response.status_code}'))
+    if response.status_code in CIRCUIT_FAILURE_STATUS:
+        breaker.record_failure(f'http_{response.status_code}')
+        _request_context.upstream_failed = True
+    else:
+        breaker.record_success()
+    if limiter:
+        rate_limit_feedback(limiter, response, labels)
+    if not kwargs.get('stream'):
+        metrics_inc('bytes_downloaded_total', {'source': SOURCE_ID, 'host': host}, len(response.content))
+    return response
+
+
+# URL base dell'upstream: sovrascrivibile per chiamata (parametro "base_url") o tramite
+# variabile d'ambiente, ad esempio per puntare al server upstream locale dei benchmark
+DEFAULT_BASE_URL = "https://vimm.net"
+BASE_URL_ENV_VAR = "TOTTODRILLO_VIMMS_BASE_URL"
+DEFAULT_IMAGE_BASE_URL = "https://dl.vimm.net"
+VAULT_ID_PATTERN = re.compile(r'(?:/vault/|[?&]id=)(\d+)')
+
+
+def get_base_url() -> str:
+    """Ritorna l'URL base dell'upstream per la chiamata corrente (senza / finale)"""
+    base_url = getattr(_request_context, 'base_url', None) or os.environ.get(BASE_URL_ENV_VAR) or DEFAULT_BASE_URL
+    return base_url.rstrip('/')
+
+
+def get_image_base_url() -> str:
+    """Ritorna l'URL base di image.php (dl.vimm.net, o l'URL base sovrascritto)"""
+    if getattr(_request_context, 'base_url', None) or os.environ.get(BASE_URL_ENV_VAR):
+        return get_base_url()
+    return DEFAULT_IMAGE_BASE_URL
+
+
+def image_referer(uri_or_url: Optional[str]) -> Optional[str]:
+    """
+    Referer richiesto da image.php (imageRefererPattern di source.json: la pagina della ROM),
+    dall'URI della ROM o dall'id nell'URL dell'immagine; None se non ricavabile
+    """
+    match = VAULT_ID_PATTERN.search(uri_or_url or '')
+    return f'{get_base_url()}/vault/{match.group(1)}' if match else None
+
+
+# Versioni dello schema di risposta negoziabili con il parametro "schema_version"
+# 1 = legacy (default), 2 = compatto: niente campi deprecati, null o liste vuote nelle ROM
+RESPONSE_SCHEMA_LEGACY = 1
+RESPONSE_SCHEMA_COMPACT = 2
+DEPRECATED_ROM_FIELDS = ('boxart_url', 'boxart_urls')
+
+# Encoder JSON più veloce se disponibile (usato solo nello schema compatto)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def response_schema(params: Dict[str, Any]) -> int:
+    """Ritorna la versione di schema richiesta dal chiamante"""
+    try:
+        return int(params.get("schema_version") or RESPONSE_SCHEMA_LEGACY)
+    except (TypeError, ValueError):
+        return RESPONSE_SCHEMA_LEGACY
+
+
+def dumps_json(data: Any, compact: bool = False) -> str:
+    """Serializza in JSON; in modalità compatta usa orjson (se presente) e nessuno spazio"""
+    if not compact:
+        return json.dumps(data)
+    if orjson is not None:
+        return orjson.dumps(data).decode('utf-8')
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+
+def compact_rom(rom: Dict[str, Any]) -> Dict[str, Any]:
+    """Rimuove da una ROM i campi deprecati, null e le liste vuote (anche nei link)"""
+    compacted = {}
+    for key, value in rom.items():
+        if key in DEPRECATED_ROM_FIELDS or value is None or value == []:
+            continue
+        if key == 'links':
+            value = [{k: v for k, v in link.items() if v is not None} for link in value]
+        compacted[key] = value
+    return compacted
+
+
+def encode_response(response: Dict[str, Any], params: Dict[str, Any]) -> str:
+    """Serializza la risposta di searchRoms/getEntry nello schema richiesto"""
+    if response_schema(params) < RESPONSE_SCHEMA_COMPACT:
+        return json.dumps(response)
+    response = dict(response)
+    for key in ('results', 'roms'):
+        if response.get(key):
+            response[key] = [compact_rom(rom) for rom in response[key]]
+    if response.get('entry'):
+        response['entry'] = compact_rom(response['entry'])
+    response['schema_version'] = RESPONSE_SCHEMA_COMPACT
+    return dumps_json(response, compact=True)
+
+
+# Campi di getEntry selezionabili con "fields" (lista o stringa separata da virgole): gli stadi di
+# estrazione dei campi non richiesti, con le loro richieste di rete, vengono saltati e i campi
+# omessi dalla entry. slug e rom_id sono sempre presenti; senza "fields" la entry è completa
+ENTRY_FIELDS = ('title', 'platform', 'box_image', 'screen_image', 'regions', 'links')
+ENTRY_ALWAYS_FIELDS = ('slug', 'rom_id')
+
+
+def entry_fields(params: Dict[str, Any]) -> FrozenSet[str]:
+    """Ritorna i campi della entry richiesti dal chiamante (i nomi sconosciuti vengono ignorati)"""
+    fields = params.get("fields")
+    if not fields:
+        return frozenset(ENTRY_FIELDS)
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    return frozenset(str(field).strip() for field in fields) & frozenset(ENTRY_FIELDS)
+
+
+def select_entry_fields(entry: Dict[str, Any], fields: FrozenSet[str]) -> Dict[str, Any]:
+    """Tiene nella entry solo i campi richiesti; i campi deprecati seguono box_image"""
+    if len(fields) == len(ENTRY_FIELDS):
+        return entry
+    return {key: value for key, value in entry.items()
+            if key in ENTRY_ALWAYS_FIELDS or key in fields
+            or (key in DEPRECATED_ROM_FIELDS and 'box_image' in fields)}
+
+
 def get_rom_download_url(page_url: str) -> Optional[str]:
     """Ottiene l'URL di download per una ROM dalla pagina ROM"""
     try:
         headers = {'User-Agent': get_random_ua()}
-        page = requests.get('https://vimm.net/' + page_url, headers=headers, timeout=10, verify=False)
+        page = http_get(get_base_url() + '/' + page_url, endpoint='download_page', headers=headers, timeout=10, verify=False)
         soup = BeautifulSoup(page.content, 'html.parser')
+        rules = load_extraction_rules()
         # Il form ha ID 'dl_form'
-        result = soup.find(id='dl_form')
+        result = rules.selectors['download_form'].find(soup)
         if not result:
             # Prova a cercare qualsiasi form con mediaId
             forms = soup.find_all('form')
@@ -154,16 +1265,16 @@ def get_rom_download_url(page_url: str) -> Optional[str]:
                 media_id = media_id_elem['value']
                 # Estrai il dominio dal form se disponibile, altrimenti usa dl2 come default
                 # Il dominio può essere dl2 o dl3 a seconda della ROM
-                download_domain = "dl2.vimm.net"  # Default
+                download_domain = rules.values['default_download_domain']
                 try:
                     headers = {'User-Agent': get_random_ua()}
-                    page = requests.get('https://vimm.net/' + page_url, headers=headers, timeout=10, verify=False)
+                    page = http_get(get_base_url() + '/' + page_url, endpoint='download_page', headers=headers, timeout=10, verify=False)
                     soup = BeautifulSoup(page.content, 'html.parser')
-                    form = soup.find('form', id='dl_form')
+                    form = rules.selectors['download_form'].find(soup)
                     if form:
                         action = form.get('action', '')
                         if action.startswith('//'):
-                            match = re.search(r'//(dl[23]\.vimm\.net)', action)
+                            match = rules.patterns['download_domain'].search(action)
                             if match:
                                 download_domain = match.group(1)
                 except:
@@ -189,32 +1300,222 @@ def get_rom_slug_from_uri(uri: str) -> str:
 def get_boxart_url_from_uri(uri: str) -> Optional[str]:
     """Costruisce l'URL dell'immagine box art dall'URI della ROM"""
     # L'URI è formato come /vault/48075, estraiamo l'ID
-    match = re.search(r'/vault/(\d+)', uri)
+    match = load_extraction_rules().patterns['rom_id'].search(uri)
     if match:
         rom_id = match.group(1)
-        return f'https://dl.vimm.net/image.php?type=box&id={rom_id}'
+        return f'{get_image_base_url()}/image.php?type=box&id={rom_id}'
     return None
 
 def get_boxart_urls_from_uri(uri: str) -> list:
     """Costruisce la lista di URL delle immagini (box art e screen) dall'URI della ROM"""
     # L'URI è formato come /vault/48075, estraiamo l'ID
-    match = re.search(r'/vault/(\d+)', uri)
+    match = load_extraction_rules().patterns['rom_id'].search(uri)
     if match:
         rom_id = match.group(1)
-        boxart_url = f'https://dl.vimm.net/image.php?type=box&id={rom_id}'
-        screen_url = f'https://dl.vimm.net/image.php?type=screen&id={rom_id}'
+        boxart_url = f'{get_image_base_url()}/image.php?type=box&id={rom_id}'
+        screen_url = f'{get_image_base_url()}/image.php?type=screen&id={rom_id}'
         return [boxart_url, screen_url]
     return []
 
 
-def get_uri_from_slug(slug: str) -> Optional[str]:
-    """Tenta di ricostruire l'URI dallo slug"""
-    # Lo slug è formato come: sistema-nome-rom
-    # Possiamo provare a ricostruire l'URI, ma è meglio salvare l'URI originale
-    # Per ora, restituiamo None - l'URI deve essere salvato nella ricerca
+# Indice persistente slug -> URI (cache/index.sqlite), alimentato da ogni risultato di ricerca:
+# get_entry lo consulta prima di ricorrere alla ricerca per nome
+SLUG_INDEX_FILE = 'index.sqlite'
+SLUG_INDEX_MAX_ROWS = 50000  # Oltre questo limite vengono rimosse le voci viste meno di recente
+
+_slug_index_lock = threading.Lock()
+
+
+def open_slug_index(source_dir: Optional[str]) -> Optional[sqlite3.Connection]:
+    """Apre (creando le tabelle se serve) l'indice della source: slug -> URI e verifiche copertine"""
+    cache_dir = get_cache_dir(source_dir)
+    if not cache_dir:
+        return None
+    conn = sqlite3.connect(os.path.join(cache_dir, SLUG_INDEX_FILE), timeout=5)
+    conn.execute('CREATE TABLE IF NOT EXISTS slug_index (slug TEXT PRIMARY KEY, rom_id TEXT NOT NULL, seen_at REAL NOT NULL)')
+    conn.execute('CREATE INDEX IF NOT EXISTS slug_index_seen_at ON slug_index (seen_at)')
+    conn.execute('CREATE TABLE IF NOT EXISTS box_art (rom_id TEXT PRIMARY KEY, present INTEGER NOT NULL, checked_at REAL NOT NULL)')
+    return conn
+
+
+def record_slugs(roms: List['RomRow'], source_dir: Optional[str]) -> None:
+    """Registra slug -> URI dei risultati di ricerca nell'indice persistente"""
+    rows = [(rom.slug, rom.rom_id, time.time()) for rom in roms if rom.slug and rom.rom_id]
+    if not rows:
+        return
+    with _slug_index_lock:
+        try:
+            conn = open_slug_index(source_dir)
+            if conn is None:
+                return
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO slug_index (slug, rom_id, seen_at) VALUES (?, ?, ?)', rows)
+                excess = conn.execute('SELECT COUNT(*) FROM slug_index').fetchone()[0] - SLUG_INDEX_MAX_ROWS
+                if excess > 0:
+                    conn.execute('DELETE FROM slug_index WHERE slug IN '
+                                 '(SELECT slug FROM slug_index ORDER BY seen_at LIMIT ?)', (excess,))
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ [slug_index] Errore aggiornamento indice: {e}", file=sys.stderr)
+
+
+def get_uri_from_slug(slug: str, source_dir: Optional[str] = None) -> Optional[str]:
+    """Recupera l'URI di uno slug già visto in una ricerca (None se non presente nell'indice)"""
+    try:
+        conn = open_slug_index(source_dir)
+        if conn is None:
+            return None
+        row = conn.execute('SELECT rom_id FROM slug_index WHERE slug = ?', (slug,)).fetchone()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"⚠️ [slug_index] Errore lettura indice: {e}", file=sys.stderr)
+        return None
+    metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'slug_index', 'result': 'hit' if row else 'miss'})
+    return row[0] if row else None
+
+
+# Verifica delle copertine: le URL box art sono costruite dall'ID senza sapere se l'immagine
+# esiste (image.php risponde con un errore o con un'immagine segnaposto). L'esito è salvato per
+# rom_id nell'indice cache/index.sqlite (positivo 30 giorni, negativo 7): le ROM con copertina
+# mancante nota escono con box_image null e l'app non la richiede più
+BOX_ART_POSITIVE_TTL = 30 * 86400
+BOX_ART_NEGATIVE_TTL = 7 * 86400
+BOX_ART_CHECK_BUDGET_MS = 2000
+BOX_ART_CHECK_WORKERS = 6
+BOX_ART_MISSING_STATUS = (404, 410)  # Gli altri errori (429, 403, 5xx...) non dicono nulla sulla copertina
+BOX_ART_MIN_SIDE = 100
+SCREEN_MIN_SIDE = 200
+SCREEN_MIN_BYTES = 20000  # Senza PIL: le immagini di errore sono tra 5KB e 15KB, gli screen reali più grandi
+VIMM_ERROR_IMAGE_SIZE = (400, 100)  # Dimensioni tipiche delle immagini di errore di Vimm's Lair
+
+
+def vimm_image_problem(response: requests.Response, min_side: int, min_bytes: int = 0) -> Optional[str]:
+    """
+    Ritorna il motivo per cui una risposta di image.php non è un'immagine valida (None se valida)
+    Con PIL controlla le dimensioni (i segnaposto di errore sono piccoli, tipicamente 400x100),
+    altrimenti la dimensione del file (solo se min_bytes > 0)
+    """
+    content_type = response.headers.get('Content-Type', '').lower()
+    if response.status_code != 200 or 'image' not in content_type:
+        return f"status {response.status_code}, type {content_type or 'nessuno'}"
+    size = len(response.content)
+    try:
+        from PIL import Image
+        from io import BytesIO
+        width, height = Image.open(BytesIO(response.content)).size
+    except ImportError:
+        return f"dimensione sospetta ({size} byte)" if size <= min_bytes else None
+    except Exception:
+        return f"immagine non leggibile ({size} byte)" if size <= min_bytes else None
+    if (width, height) == VIMM_ERROR_IMAGE_SIZE or width < min_side or height < min_side:
+        return f"probabile segnaposto di errore ({width}x{height})"
     return None
 
 
+def known_box_art(rom_ids: List[str], source_dir: Optional[str]) -> Dict[str, bool]:
+    """Esiti ancora validi delle verifiche copertina (rom_id -> presente)"""
+    if not rom_ids:
+        return {}
+    now = time.time()
+    known = {}
+    try:
+        conn = open_slug_index(source_dir)
+        if conn is None:
+            return {}
+        for start in range(0, len(rom_ids), 500):
+            chunk = rom_ids[start:start + 500]
+            rows = conn.execute(f'SELECT rom_id, present, checked_at FROM box_art WHERE rom_id IN '
+                                f'({",".join("?" * len(chunk))})', chunk).fetchall()
+            for rom_id, present, checked_at in rows:
+                if now - checked_at < (BOX_ART_POSITIVE_TTL if present else BOX_ART_NEGATIVE_TTL):
+                    known[rom_id] = bool(present)
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"⚠️ [box_art] Errore lettura cache: {e}", file=sys.stderr)
+    return known
+
+
+def record_box_art(rom_id: str, present: bool, source_dir: Optional[str]) -> None:
+    with _slug_index_lock:
+        try:
+            conn = open_slug_index(source_dir)
+            if conn is None:
+                return
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO box_art (rom_id, present, checked_at) VALUES (?, ?, ?)',
+                             (rom_id, int(present), time.time()))
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ [box_art] Errore aggiornamento cache: {e}", file=sys.stderr)
+
+
+def check_box_art(rom: 'RomRow', source_dir: Optional[str]) -> Optional[bool]:
+    """
+    Verifica una copertina e ne salva l'esito; None se non verificabile (errore di rete,
+    rate limit, Cloudflare...): solo un 404/410 o un'immagine segnaposto contano come assenza
+    """
+    headers = {'User-Agent': get_random_ua()}
+    referer = image_referer(rom.rom_id) or image_referer(rom.box_image)
+    if referer:
+        headers['Referer'] = referer
+    try:
+        response = http_get(rom.box_image, endpoint='image', rate_limited=False,
+                            headers=headers, timeout=5, verify=False)
+    except Exception as e:
+        print(f"⚠️ [box_art] Verifica non riuscita per {rom.rom_id}: {e}", file=sys.stderr)
+        return None
+    if response.status_code in BOX_ART_MISSING_STATUS:
+        problem = f"status {response.status_code}"
+    elif not 200 <= response.status_code < 300 or 'image' not in response.headers.get('Content-Type', '').lower():
+        print(f"⚠️ [box_art] Verifica non riuscita per {rom.rom_id}: status {response.status_code}", file=sys.stderr)
+        return None
+    else:
+        problem = vimm_image_problem(response, BOX_ART_MIN_SIDE)
+    if problem and not referer:
+        # Immagini protette da hotlink: senza Referer il segnaposto non prova che la copertina manchi
+        print(f"⚠️ [box_art] Verifica non conclusiva per {rom.rom_id} (nessun Referer): {problem}", file=sys.stderr)
+        return None
+    if problem:
+        print(f"ℹ️ [box_art] Copertina assente per {rom.rom_id}: {problem}", file=sys.stderr)
+    record_box_art(rom.rom_id, problem is None, source_dir)
+    return problem is None
+
+
+def apply_box_art_checks(roms: List['RomRow'], params: Dict[str, Any], source_dir: str) -> None:
+    """
+    Azzera box_image delle ROM con copertina mancante nota; con "check_box_art": true verifica
+    in parallelo quelle mai controllate, entro "box_art_budget_ms" (le verifiche in ritardo
+    vengono comunque salvate per le ricerche successive)
+    """
+    candidates = [rom for rom in roms if rom.box_image and rom.rom_id]
+    if not candidates:
+        return
+    known = known_box_art([rom.rom_id for rom in candidates], source_dir)
+    unknown = [rom for rom in candidates if rom.rom_id not in known]
+    metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'box_art', 'result': 'hit'}, len(known))
+    metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'box_art', 'result': 'miss'}, len(unknown))
+
+    if unknown and params.get("check_box_art", False):
+        budget = float(params.get("box_art_budget_ms") or BOX_ART_CHECK_BUDGET_MS) / 1000.0
+        remaining = remaining_time()
+        if remaining is not None:
+            budget = min(budget, remaining - 0.5)
+        if budget > 0:
+            check = run_with_context(check_box_art)
+            executor = ThreadPoolExecutor(max_workers=min(BOX_ART_CHECK_WORKERS, len(unknown)))
+            futures = {executor.submit(check, rom, source_dir): rom for rom in unknown}
+            done, _ = wait(futures, timeout=budget)
+            executor.shutdown(wait=False)
+            for future in done:
+                if future.result() is not None:
+                    known[futures[future].rom_id] = future.result()
+            print(f"🖼️ [box_art] Verificate {len(done)}/{len(unknown)} copertine", file=sys.stderr)
+
+    for rom in candidates:
+        if known.get(rom.rom_id) is False:
+            rom.box_image = None
+
+
 def map_system_to_mother_code(system: str, source_dir: str) -> str:
     """
     Mappa un sistema Vimm's Lair a un mother_code Tottodrillo (case-insensitive)
@@ -223,12 +1524,472 @@ def map_system_to_mother_code(system: str, source_dir: str) -> str:
     # Normalizza a minuscolo per il matching
     return map_vimm_code_to_mother_code(system.lower(), source_dir)
 
+# Regole di estrazione dichiarative: selettori, pattern e campi letti dalle pagine upstream,
+# compilati una sola volta in funzioni di estrazione. extraction_rules.json nella directory della
+# source sovrascrive per nome le regole predefinite e viene ricaricato quando il file cambia, così
+# un cambio di markup del sito si corregge senza aggiornare lo script. Selettore: {"tag", "class"
+# (stringa: classe esatta; lista: tutte contenute nell'attributo), "class_re", "id", "attrs"} o una
+# lista di selettori annidati. Campo: {"select", "attr" (altrimenti il testo), "pattern", "group",
+# "post", "default"}. Record: {"fields", "required"}. Pattern: regex (flag inline, es. "(?i)")
+EXTRACTION_RULES_FILE = 'extraction_rules.json'
+EXTRACTION_RULE_SECTIONS = ('selectors', 'patterns', 'records', 'parse_only', 'values')
+DEFAULT_EXTRACTION_RULES = {
+    'selectors': {
+        # La tabella può avere anche la classe 'striped'
+        'listing_table': {'tag': 'table', 'class': ['rounded', 'centered', 'cellpadding1', 'hovertable']},
+        'title_link': {'tag': 'a', 'attrs': {'href': True}},
+        'region_flag': {'tag': 'img', 'class': 'flag'},
+        # Pagina ROM
+        'rom_title': {'tag': 'h1'},
+        'page_title': {'tag': 'title'},
+        'box_art': {'tag': 'img', 'attrs': {'alt': '^Box$'}},
+        'box_art_src': {'tag': 'img', 'attrs': {'src': r'image\.php\?type=box'}},
+        'screen': {'tag': 'img', 'attrs': {'alt': '^Screen$'}},
+        'screen_src': {'tag': 'img', 'attrs': {'src': 'type=screen'}},
+        'download_row': {'tag': 'tr', 'id': 'dl-row'},
+        'download_form': {'tag': 'form', 'id': 'dl_form'},
+        'format_select': {'id': 'dl_format'},
+        'format_option': {'tag': 'option'},
+        'script': {'tag': 'script'},
+        'table_row': {'tag': 'tr'},
+        'table_cell': {'tag': 'td'},
+    },
+    'patterns': {
+        'rom_id': r'/vault/(\d+)',
+        'page_title_prefix': r'^\s*The Vault:\s*',
+        'system_label': 'System|Platform',
+        'download_domain': r'//(dl[23]\.vimm\.net)',
+        'media_array': r'(?s)const media=(\[.*?\]);',
+        'format_extension': r'\.(\w+)',
+    },
+    'records': {},
+    'parse_only': {},
+    'values': {
+        # Intestazioni delle colonne della tabella risultati
+        'columns': {'system': 'System', 'title': 'Title', 'region': 'Region'},
+        # Pagina ROM: etichetta della riga regioni, src della cartuccia ({rom_id}), dominio di download predefinito
+        'region_label': 'region',
+        'cart_image_src': 'type=cart&id={rom_id}',
+        'default_download_domain': 'dl2.vimm.net',
+    },
+}
+
+# Post-processori applicabili ai campi ("post": [...])
+FIELD_POST_PROCESSORS = {
+    'strip': lambda value: value.strip(),
+    'lower': lambda value: value.lower(),
+    'absolute_url': lambda value: value if not value or value.startswith('http') else f"{get_base_url()}{value}",
+}
+
+_extraction_rules_lock = threading.Lock()
+_extraction_rules = {}  # source_dir -> (mtime e dimensione del file di override, ExtractionRules)
+
+
+class Selector:
+    """Selettore compilato: argomenti di find/find_all preparati una volta sola"""
+
+    def __init__(self, spec: Any):
+        specs = spec if isinstance(spec, list) else [spec]
+        self.steps = [self._compile_step(step) for step in specs]
+        # Chiave di ogni prefisso della catena: i campi di un record condividono i nodi già trovati
+        self.keys = [json.dumps(specs[:depth + 1], sort_keys=True) for depth in range(len(specs))]
+
+    @staticmethod
+    def _compile_step(step: Dict[str, Any]) -> Dict[str, Any]:
+        kwargs = {}
+        if step.get('tag'):
+            kwargs['name'] = step['tag']
+        classes = step.get('class')
+        if isinstance(classes, list):
+            required = tuple(classes)
+
+            def has_classes(value: Optional[str]) -> bool:
+                if not value:
+                    return False
+                for name in required:
+                    if name not in value:
+                        return False
+                return True
+            kwargs['class_'] = has_classes
+        elif classes:
+            kwargs['class_'] = classes
+        if step.get('class_re'):
+            kwargs['class_'] = re.compile(step['class_re'])
+        if step.get('id'):
+            kwargs['id'] = step['id']
+        attrs = {}
+        for name, value in step.get('attrs', {}).items():
+            attrs[name] = value if isinstance(value, bool) else re.compile(value)
+        if attrs:
+            kwargs['attrs'] = attrs
+        return kwargs
+
+    def find(self, node: Any, found: Optional[Dict[str, Any]] = None) -> Any:
+        for key, kwargs in zip(self.keys, self.steps):
+            if found is not None and key in found:
+                node = found[key]
+            else:
+                node = node.find(**kwargs)
+                if found is not None:
+                    found[key] = node
+            if node is None:
+                return None
+        return node
+
+    def find_all(self, node: Any) -> List[Any]:
+        for kwargs in self.steps[:-1]:
+            node = node.find(**kwargs)
+            if node is None:
+                return []
+        return node.find_all(**self.steps[-1])
+
+
+def compile_field(spec: Dict[str, Any]) -> Callable[..., Any]:
+    """Compila un campo in una funzione nodo -> valore"""
+    select = Selector(spec['select']) if spec.get('select') else None
+    attr = spec.get('attr')
+    pattern = re.compile(spec['pattern']) if spec.get('pattern') else None
+    group = spec.get('group', 1)
+    post = [FIELD_POST_PROCESSORS[name] for name in spec.get('post', ())]
+    default = spec.get('default')
+
+    def extract(node: Any, found: Optional[Dict[str, Any]] = None) -> Any:
+        if select:
+            node = select.find(node, found)
+            if node is None:
+                return default
+        value = node.get(attr, '') if attr else node.get_text(strip=True)
+        if pattern:
+            match = pattern.search(value)
+            if not match:
+                return default
+            value = match.group(group)
+        for process in post:
+            value = process(value)
+        return value
+    return extract
+
+
+def compile_record(spec: Dict[str, Any]) -> Callable[[Any], Optional[Dict[str, Any]]]:
+    """Compila un record in una funzione nodo -> dict dei campi, o None se manca un campo obbligatorio"""
+    fields = [(name, compile_field(field)) for name, field in spec['fields'].items()]
+    required = tuple(spec.get('required', ()))
+
+    def extract(node: Any) -> Optional[Dict[str, Any]]:
+        record = {}
+        found = {}
+        for name, field in fields:
+            value = record[name] = field(node, found)
+            if not value and name in required:
+                return None
+        return record
+    return extract
+
+
+class ExtractionRules:
+    """
+    Regole di estrazione compilate
+    Uguaglianza e hash dipendono dal contenuto delle regole: usate come argomento di memo_parse,
+    un ricaricamento con regole diverse invalida i parsing memorizzati
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.digest = hashlib.sha1(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()
+        self.selectors = {name: Selector(selector) for name, selector in spec['selectors'].items()}
+        self.patterns = {name: re.compile(pattern) for name, pattern in spec['patterns'].items()}
+        self.records = {name: compile_record(record) for name, record in spec['records'].items()}
+        self.parse_only = {name: SoupStrainer(class_=re.compile(classes)) for name, classes in spec['parse_only'].items()}
+        self.values = dict(spec['values'])
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, ExtractionRules) and other.digest == self.digest
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+
+def merge_extraction_rules(override: Dict[str, Any]) -> Dict[str, Any]:
+    """Applica le regole di extraction_rules.json a quelle predefinite, sezione per sezione e per nome"""
+    spec = {section: dict(DEFAULT_EXTRACTION_RULES.get(section, {})) for section in EXTRACTION_RULE_SECTIONS}
+    for section, rules in override.items():
+        if section not in spec or not isinstance(rules, dict):
+            raise ValueError(f"sezione non valida: {section}")
+        spec[section].update(rules)
+    return spec
+
 
-def get_system_search_roms(search_key: str, system: str, page_num: int = 1, source_dir: str = None) -> List[Dict[str, Any]]:
+def load_extraction_rules(source_dir: Optional[str] = None) -> ExtractionRules:
+    """Ritorna le regole compilate, ricompilandole se extraction_rules.json è cambiato"""
+    source_dir = source_dir or getattr(_request_context, 'source_dir', None) or ''
+    path = os.path.join(source_dir, EXTRACTION_RULES_FILE) if source_dir else None
+    try:
+        stat = os.stat(path) if path else None
+        signature = (stat.st_mtime_ns, stat.st_size) if stat else None
+    except OSError:
+        signature = None
+    with _extraction_rules_lock:
+        cached = _extraction_rules.get(source_dir)
+    if cached and cached[0] == signature:
+        return cached[1]
+    try:
+        override = {}
+        if signature:
+            with open(path, 'r', encoding='utf-8') as f:
+                override = json.load(f)
+        rules = ExtractionRules(merge_extraction_rules(override))
+        if signature:
+            print(f"🧩 Regole di estrazione caricate da {path}", file=sys.stderr)
+    except (OSError, ValueError, KeyError, TypeError, re.error) as e:
+        # Regole non valide: resta in uso l'ultima versione compilata (o quelle predefinite)
+        print(f"⚠️ Regole di estrazione non valide in {path}: {e}", file=sys.stderr)
+        rules = cached[1] if cached else ExtractionRules(merge_extraction_rules({}))
+    with _extraction_rules_lock:
+        _extraction_rules[source_dir] = (signature, rules)
+    return rules
+
+
+# Memo dei parsing: una pagina identica byte per byte (sha1 del corpo) a una già analizzata
+# riusa il risultato dell'estrattore senza ricostruire l'albero BeautifulSoup. La chiave include
+# la versione dell'estrattore, ricavata dal suo bytecode e da quello delle funzioni e classi del
+# modulo che richiama (modificarne il codice invalida il memo), PARSER_VERSION e l'impronta delle
+# regole di estrazione in uso (un ricaricamento di extraction_rules.json invalida il memo).
+# Il risultato è condiviso tra le chiamate, quindi chi lo riceve non deve modificarlo
+PARSE_MEMO_SIZE = 32
+PARSER_VERSION = 1  # Da incrementare quando cambia l'output degli estrattori senza cambiarne il codice
+
+_parse_memo_lock = threading.Lock()
+_parse_memo = OrderedDict()  # (estrattore, versioni, regole, sha1 pagina, base URL, argomenti) -> risultato
+
+
+def code_fingerprint(code: Any, seen: Optional[set] = None) -> bytes:
+    """
+    Impronta di un code object: bytecode, nomi e costanti (comprese le funzioni annidate),
+    più quella delle funzioni e classi del modulo che richiama (ognuna una sola volta)
+    """
+    seen = set() if seen is None else seen
+    parts = [code.co_code, repr(code.co_names).encode('utf-8')]
+    for const in code.co_consts:
+        parts.append(code_fingerprint(const, seen) if hasattr(const, 'co_code') else repr(const).encode('utf-8'))
+    for name in code.co_names:
+        value = globals().get(name)
+        if name in seen or getattr(value, '__module__', None) != __name__:
+            continue
+        seen.add(name)
+        functions = [value] if hasattr(value, '__code__') else list(vars(value).values()) if isinstance(value, type) else []
+        for function in functions:
+            if hasattr(function, '__code__'):
+                parts.append(code_fingerprint(function.__code__, seen))
+    return b'\0'.join(parts)
+
+
+def extractor_version(parse: Callable[..., Any]) -> str:
+    """Versione di un estrattore (cambia con il suo codice e con quello delle funzioni che richiama)"""
+    version = getattr(parse, 'extractor_version', None)
+    if version is None:
+        version = parse.extractor_version = hashlib.sha1(code_fingerprint(parse.__code__)).hexdigest()[:12]
+    return version
+
+
+def memo_parse(name: str, body: bytes, parse: Callable[..., Any], *args: Any) -> Any:
+    """Ritorna parse(body, *args), riusando il risultato se la stessa pagina è già stata analizzata"""
+    key = (name, PARSER_VERSION, extractor_version(parse), load_extraction_rules().digest,
+           hashlib.sha1(body).hexdigest(), get_base_url(), args)
+    with _parse_memo_lock:
+        found = key in _parse_memo
+        if found:
+            _parse_memo.move_to_end(key)
+            result = _parse_memo[key]
+    metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'parse', 'result': 'hit' if found else 'miss'})
+    if found:
+        return result
+    result = parse(body, *args)
+    with _parse_memo_lock:
+        _parse_memo[key] = result
+        while len(_parse_memo) > PARSE_MEMO_SIZE:
+            _parse_memo.popitem(last=False)
+    return result
+
+
+# Lettura incrementale dei listing: le pagine di Vimm's Lair hanno fino a 200 righe, ma
+# searchRoms ne usa solo offset + max_results; il body viene letto a blocchi e il download
+# si interrompe appena la tabella contiene le righe necessarie (più quella di intestazione)
+LISTING_CHUNK_BYTES = 8 * 1024
+LISTING_TABLE_MARKER = b'hovertable'
+LISTING_SCAN_OVERLAP = 32  # Byte del blocco precedente rianalizzati (tag spezzati)
+_LISTING_ROW_END = re.compile(rb'</tr\s*>', re.I)
+
+
+def read_listing_body(response: requests.Response, rows_needed: Optional[int]) -> Tuple[bytes, bool]:
+    """
+    Legge il body di una risposta in streaming fermandosi dopo rows_needed righe della tabella
+    Ritorna (body, troncato); con rows_needed None la pagina viene letta per intero.
+    Ogni blocco viene analizzato una sola volta (più LISTING_SCAN_OVERLAP byte del precedente)
+    """
+    body = bytearray()
+    scan_from = -1  # -1: marker della tabella non ancora trovato
+    rows = 0
+    cut = None
+    try:
+        for chunk in response.iter_content(LISTING_CHUNK_BYTES):
+            # Un marker o un tag di chiusura può essere spezzato tra due blocchi
+            tail = max(0, len(body) - LISTING_SCAN_OVERLAP)
+            body += chunk
+            if rows_needed is None:
+                continue
+            if scan_from < 0:
+                scan_from = body.find(LISTING_TABLE_MARKER, tail)
+                if scan_from < 0:
+                    continue
+            for match in _LISTING_ROW_END.finditer(body, scan_from):
+                rows += 1
+                scan_from = match.end()
+                if rows > rows_needed:
+                    cut = scan_from
+                    break
+            if cut is not None:
+                break
+            scan_from = max(scan_from, len(body) - LISTING_SCAN_OVERLAP)
+    finally:
+        response.close()
+    host = urllib.parse.urlparse(response.url).netloc
+    metrics_inc('bytes_downloaded_total', {'source': SOURCE_ID, 'host': host}, len(body))
+    if cut is None:
+        return bytes(body), False
+    # Taglia dopo l'ultima riga completa, così il parser non vede righe a metà
+    return bytes(body[:cut]), True
+
+
+def fetch_listing_body(url: str, rows_needed: Optional[int]) -> Tuple[bytes, bool]:
+    """Scarica un listing in streaming con read_listing_body"""
+    headers = {'User-Agent': get_random_ua()}
+    response = fetch_with_retry(url, endpoint='listing', headers=headers, timeout=10, verify=False, stream=True)
+    return read_listing_body(response, rows_needed)
+
+
+class RomRow:
+    """
+    Riga di un risultato di ricerca, usata da parsing, filtri e ricerca per slug
+    Usa __slots__, piattaforma e regioni internate e regioni in tupla per ridurre
+    la memoria sulle pagine da 200 righe; il dict JSON viene creato solo con to_dict()
+    """
+    __slots__ = ('slug', 'rom_id', 'title', 'platform', 'box_image', 'regions')
+
+    def __init__(self, slug: str, rom_id: str, title: str, platform: str,
+                 box_image: Optional[str] = None, regions: Tuple[str, ...] = ()):
+        self.slug = slug
+        self.rom_id = rom_id  # URI della ROM, per poterla recuperare
+        self.title = title
+        self.platform = sys.intern(platform)
+        self.box_image = box_image
+        self.regions = tuple(sys.intern(region) for region in regions)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Converte la riga nel formato JSON di searchRoms"""
+        return {
+            'slug': self.slug,
+            'rom_id': self.rom_id,
+            'title': self.title,
+            'platform': self.platform,
+            'boxart_url': self.box_image,  # Mantieni per compatibilità (deprecato)
+            'boxart_urls': [self.box_image] if self.box_image else [],  # Mantieni per compatibilità (deprecato)
+            'box_image': self.box_image,  # Box art (costruita dall'ID, se fallisce l'app userà placeholder)
+            'screen_image': None,  # Screen non disponibile nella ricerca (solo in getEntry)
+            'regions': list(self.regions),
+            'links': []
+        }
+
+
+def parse_system_listing(content: bytes, rules: ExtractionRules, system: str, source_dir: Optional[str]) -> List[RomRow]:
+    """Estrae le righe della tabella risultati di un listing per sistema"""
+    roms = []
+    soup = BeautifulSoup(content, 'html.parser')
+    result = rules.selectors['listing_table'].find(soup)
+    
+    if not result:
+        return []
+    
+    # Estrai header per identificare le colonne
+    header_row = result.find('tr')
+    headers_list = []
+    if header_row:
+        ths = header_row.find_all(['th', 'td'])
+        for th in ths:
+            headers_list.append(th.get_text(strip=True))
+    
+    # Trova indici colonne
+    columns = rules.values['columns']
+    title_idx = headers_list.index(columns['title']) if columns['title'] in headers_list else 0
+    region_idx = headers_list.index(columns['region']) if columns['region'] in headers_list else -1
+    
+    # Tutte le righe del listing appartengono allo stesso sistema
+    platform = map_system_to_mother_code(system, source_dir) if source_dir else 'unknown'
+    
+    # Le righe sono direttamente <tr> con <td> che contengono i link
+    rows = result.find_all('tr')
+    for row in rows:
+        # Salta l'header se presente
+        if row.find('th'):
+            continue
+        
+        cells = row.find_all('td')
+        if len(cells) <= title_idx:
+            continue
+        
+        # Il <td> con indice title_idx contiene il link alla ROM
+        title_cell = cells[title_idx]
+        link = rules.selectors['title_link'].find(title_cell)
+        if link:
+            name = link.get_text(strip=True)
+            uri_original = link['href']
+            uri = uri_original
+            # Assicurati che l'URI sia completo
+            if not uri.startswith('/'):
+                uri = '/' + uri
+            if not uri.startswith('/vault/'):
+                uri = '/vault/' + uri.lstrip('/')
+            
+            # Debug: log dell'URI originale per capire il formato
+            rom_id_match = rules.patterns['rom_id'].search(uri)
+            if not rom_id_match:
+                print(f"⚠️ [parse_system_listing] URI non numerico: {uri} (href originale: {uri_original})", file=sys.stderr)
+            
+            slug = get_rom_slug_from_uri(uri)
+            
+            # Estrai regione dall'immagine flag se disponibile
+            regions = []
+            if region_idx >= 0 and len(cells) > region_idx:
+                region_cell = cells[region_idx]
+                # Cerca immagine flag con attributo title
+                flag_img = rules.selectors['region_flag'].find(region_cell)
+                if flag_img:
+                    region = flag_img.get('title', '').strip()
+                    if region:
+                        regions = [region]
+                else:
+                    # Fallback: testo della cella
+                    region = region_cell.get_text(strip=True)
+                    if region:
+                        regions = [region]
+            
+            # Costruisci l'URL dell'immagine box art dall'URI
+            # L'app proverà a caricarlo, e se fallisce userà il placeholder
+            boxart_url = None
+            rom_id = None
+            if rom_id_match:
+                rom_id = rom_id_match.group(1)
+                boxart_url = f'{get_image_base_url()}/image.php?type=box&id={rom_id}'
+            
+            roms.append(RomRow(slug, uri, name, platform, boxart_url, regions))
+    return roms
+
+
+def get_system_search_roms(search_key: str, system: str, page_num: int = 1, source_dir: str = None,
+                           limit: Optional[int] = None) -> List[RomRow]:
     """
     Cerca ROM per sistema specifico con paginazione
     Vimm's Lair restituisce massimo 200 righe per pagina
     system: codice URI di Vimm's Lair (es. "N64", "SNES", "Gamecube")
+    limit: righe necessarie dall'inizio della pagina; il download si ferma appena ci sono
     """
     roms = []
     try:
@@ -257,107 +2018,124 @@ def get_system_search_roms(search_key: str, system: str, page_num: int = 1, sour
         if page_num > 1:
             query_params['page'] = str(page_num)
         
-        url = 'https://vimm.net/vault/?' + urllib.parse.urlencode(query_params)
-        
-        headers = {'User-Agent': get_random_ua()}
-        page = requests.get(url, headers=headers, timeout=10, verify=False)
-        soup = BeautifulSoup(page.content, 'html.parser')
-        # La tabella può avere anche la classe 'striped'
-        result = soup.find('table', class_=lambda x: x and 'rounded' in x and 'centered' in x and 'cellpadding1' in x and 'hovertable' in x)
+        url = get_base_url() + '/vault/?' + urllib.parse.urlencode(query_params)
         
-        if not result:
-            return roms
+        body, truncated = fetch_listing_body(url, limit)
+        rules = load_extraction_rules(source_dir)
+        rows = memo_parse('system_listing', body, parse_system_listing, rules, system, source_dir)
+        if truncated and len(rows) < limit:
+            # Markup diverso dal previsto (righe non valide nella tabella): serve la pagina intera
+            body, _ = fetch_listing_body(url, None)
+            rows = memo_parse('system_listing', body, parse_system_listing, rules, system, source_dir)
+        # Righe condivise con il memo dei parsing: copie, perché i filtri possono modificarle
+        roms = [copy.copy(row) for row in rows]
+    except (SourceUnavailableError, DeadlineExceededError):
+        raise
+    except Exception as e:
+        print(f"Errore nella ricerca sistema: {e}", file=sys.stderr)
+    
+    record_slugs(roms, source_dir)
+    return roms
+
+
+def parse_general_listing(content: bytes, rules: ExtractionRules, source_dir: Optional[str]) -> List[RomRow]:
+    """Estrae le righe della tabella risultati della ricerca generale"""
+    roms = []
+    soup = BeautifulSoup(content, 'html.parser')
+    result = rules.selectors['listing_table'].find(soup)
+    
+    if not result:
+        return []
+    
+    # Estrai header per identificare le colonne
+    header_row = result.find('tr')
+    headers_list = []
+    if header_row:
+        ths = header_row.find_all(['th', 'td'])
+        for th in ths:
+            headers_list.append(th.get_text(strip=True))
+    
+    # Trova indici colonne (ricerca generale: System, Title, Region, Version, Languages)
+    columns = rules.values['columns']
+    system_idx = headers_list.index(columns['system']) if columns['system'] in headers_list else -1
+    title_idx = headers_list.index(columns['title']) if columns['title'] in headers_list else 1
+    region_idx = headers_list.index(columns['region']) if columns['region'] in headers_list else -1
+    
+    # Le righe sono direttamente <tr> con <td> che contengono i link
+    rows = result.find_all('tr')
+    for row in rows:
+        # Salta l'header se presente
+        if row.find('th'):
+            continue
         
-        # Estrai header per identificare le colonne
-        header_row = result.find('tr')
-        headers_list = []
-        if header_row:
-            ths = header_row.find_all(['th', 'td'])
-            for th in ths:
-                headers_list.append(th.get_text(strip=True))
+        cells = row.find_all('td')
+        if len(cells) <= title_idx:
+            continue
         
-        # Trova indici colonne
-        title_idx = headers_list.index('Title') if 'Title' in headers_list else 0
-        region_idx = headers_list.index('Region') if 'Region' in headers_list else -1
+        # Estrai sistema se disponibile
+        system = None
+        if system_idx >= 0 and len(cells) > system_idx:
+            system = cells[system_idx].get_text(strip=True)
         
-        # Le righe sono direttamente <tr> con <td> che contengono i link
-        rows = result.find_all('tr')
-        for row in rows:
-            # Salta l'header se presente
-            if row.find('th'):
-                continue
+        # Estrai titolo e link
+        title_cell = cells[title_idx]
+        link = rules.selectors['title_link'].find(title_cell)
+        if link:
+            name = link.get_text(strip=True)
+            uri_original = link['href']
+            uri = uri_original
+            # Assicurati che l'URI sia completo
+            if not uri.startswith('/'):
+                uri = '/' + uri
+            if not uri.startswith('/vault/'):
+                uri = '/vault/' + uri.lstrip('/')
             
-            cells = row.find_all('td')
-            if len(cells) <= title_idx:
-                continue
+            # Debug: log dell'URI originale per capire il formato
+            rom_id_match = rules.patterns['rom_id'].search(uri)
+            if not rom_id_match:
+                print(f"⚠️ [parse_general_listing] URI non numerico: {uri} (href originale: {uri_original})", file=sys.stderr)
             
-            # Il <td> con indice title_idx contiene il link alla ROM
-            title_cell = cells[title_idx]
-            link = title_cell.find('a', href=True)
-            if link:
-                name = link.get_text(strip=True)
-                uri_original = link['href']
-                uri = uri_original
-                # Assicurati che l'URI sia completo
-                if not uri.startswith('/'):
-                    uri = '/' + uri
-                if not uri.startswith('/vault/'):
-                    uri = '/vault/' + uri.lstrip('/')
-                
-                # Debug: log dell'URI originale per capire il formato
-                if not re.search(r'/vault/(\d+)', uri):
-                    print(f"⚠️ [get_system_search_roms] URI non numerico: {uri} (href originale: {uri_original})", file=sys.stderr)
-                
-                slug = get_rom_slug_from_uri(uri)
-                
-                # Estrai regione dall'immagine flag se disponibile
-                regions = []
-                if region_idx >= 0 and len(cells) > region_idx:
-                    region_cell = cells[region_idx]
-                    # Cerca immagine flag con attributo title
-                    flag_img = region_cell.find('img', class_='flag')
-                    if flag_img:
-                        region = flag_img.get('title', '').strip()
-                        if region:
-                            regions = [region]
-                    else:
-                        # Fallback: testo della cella
-                        region = region_cell.get_text(strip=True)
-                        if region:
-                            regions = [region]
-                
-                # Costruisci l'URL dell'immagine box art dall'URI
-                # L'app proverà a caricarlo, e se fallisce userà il placeholder
-                boxart_url = None
-                rom_id = None
-                match = re.search(r'/vault/(\d+)', uri)
-                if match:
-                    rom_id = match.group(1)
-                    boxart_url = f'https://dl.vimm.net/image.php?type=box&id={rom_id}'
-                
-                rom = {
-                    'slug': slug,
-                    'rom_id': uri,  # Salviamo l'URI come rom_id per poterlo recuperare
-                    'title': name,
-                    'platform': map_system_to_mother_code(system, source_dir) if source_dir else 'unknown',
-                    'boxart_url': boxart_url,  # Mantieni per compatibilità (deprecato)
-                    'boxart_urls': [boxart_url] if boxart_url else [],  # Mantieni per compatibilità (deprecato)
-                    'box_image': boxart_url,  # Box art (costruita dall'ID, se fallisce l'app userà placeholder)
-                    'screen_image': None,  # Screen non disponibile nella ricerca (solo in getEntry)
-                    'regions': regions,
-                    'links': []
-                }
-                roms.append(rom)
-    except Exception as e:
-        print(f"Errore nella ricerca sistema: {e}", file=sys.stderr)
-    
+            slug = get_rom_slug_from_uri(uri)
+            
+            # Estrai regione dall'immagine flag se disponibile
+            regions = []
+            if region_idx >= 0 and len(cells) > region_idx:
+                region_cell = cells[region_idx]
+                # Cerca immagine flag con attributo title
+                flag_img = rules.selectors['region_flag'].find(region_cell)
+                if flag_img:
+                    region = flag_img.get('title', '').strip()
+                    if region:
+                        regions = [region]
+                else:
+                    # Fallback: testo della cella
+                    region = region_cell.get_text(strip=True)
+                    if region:
+                        regions = [region]
+            
+            # Mappa il sistema al mother_code
+            platform = 'unknown'
+            if system and source_dir:
+                platform = map_system_to_mother_code(system, source_dir)
+            
+            # Costruisci l'URL dell'immagine box art dall'URI
+            # L'app proverà a caricarlo, e se fallisce userà il placeholder
+            boxart_url = None
+            rom_id = None
+            if rom_id_match:
+                rom_id = rom_id_match.group(1)
+                boxart_url = f'{get_image_base_url()}/image.php?type=box&id={rom_id}'
+            
+            roms.append(RomRow(slug, uri, name, platform, boxart_url, regions))
     return roms
 
 
-def get_general_search_roms(search_key: str, page_num: int = 1, source_dir: str = None) -> List[Dict[str, Any]]:
+def get_general_search_roms(search_key: str, page_num: int = 1, source_dir: str = None,
+                            limit: Optional[int] = None) -> List[RomRow]:
     """
     Cerca ROM in generale su tutto il sito con paginazione
     Vimm's Lair restituisce massimo 200 righe per pagina
+    limit: righe necessarie dall'inizio della pagina; il download si ferma appena ci sono
     """
     roms = []
     try:
@@ -379,380 +2157,307 @@ def get_general_search_roms(search_key: str, page_num: int = 1, source_dir: str
             'sortOrder': 'ASC'
         }
         # Aggiungi numero pagina se > 1
-        if page_num > 1:
-            query_params['page'] = str(page_num)
-        
-        url = 'https://vimm.net/vault/?' + urllib.parse.urlencode(query_params)
-        
-        headers = {'User-Agent': get_random_ua()}
-        page = requests.get(url, headers=headers, timeout=10, verify=False)
-        soup = BeautifulSoup(page.content, 'html.parser')
-        # La tabella può avere anche la classe 'striped'
-        result = soup.find('table', class_=lambda x: x and 'rounded' in x and 'centered' in x and 'cellpadding1' in x and 'hovertable' in x)
-        
-        if not result:
-            return roms
-        
-        # Estrai header per identificare le colonne
-        header_row = result.find('tr')
-        headers_list = []
-        if header_row:
-            ths = header_row.find_all(['th', 'td'])
-            for th in ths:
-                headers_list.append(th.get_text(strip=True))
+        if page_num > 1:
+            query_params['page'] = str(page_num)
         
-        # Trova indici colonne (ricerca generale: System, Title, Region, Version, Languages)
-        system_idx = headers_list.index('System') if 'System' in headers_list else -1
-        title_idx = headers_list.index('Title') if 'Title' in headers_list else 1
-        region_idx = headers_list.index('Region') if 'Region' in headers_list else -1
+        url = get_base_url() + '/vault/?' + urllib.parse.urlencode(query_params)
         
-        # Le righe sono direttamente <tr> con <td> che contengono i link
-        rows = result.find_all('tr')
-        for row in rows:
-            # Salta l'header se presente
-            if row.find('th'):
-                continue
-            
-            cells = row.find_all('td')
-            if len(cells) <= title_idx:
-                continue
-            
-            # Estrai sistema se disponibile
-            system = None
-            if system_idx >= 0 and len(cells) > system_idx:
-                system = cells[system_idx].get_text(strip=True)
-            
-            # Estrai titolo e link
-            title_cell = cells[title_idx]
-            link = title_cell.find('a', href=True)
-            if link:
-                name = link.get_text(strip=True)
-                uri_original = link['href']
-                uri = uri_original
-                # Assicurati che l'URI sia completo
-                if not uri.startswith('/'):
-                    uri = '/' + uri
-                if not uri.startswith('/vault/'):
-                    uri = '/vault/' + uri.lstrip('/')
-                
-                # Debug: log dell'URI originale per capire il formato
-                if not re.search(r'/vault/(\d+)', uri):
-                    print(f"⚠️ [get_general_search_roms] URI non numerico: {uri} (href originale: {uri_original})", file=sys.stderr)
-                
-                slug = get_rom_slug_from_uri(uri)
-                
-                # Estrai regione dall'immagine flag se disponibile
-                regions = []
-                if region_idx >= 0 and len(cells) > region_idx:
-                    region_cell = cells[region_idx]
-                    # Cerca immagine flag con attributo title
-                    flag_img = region_cell.find('img', class_='flag')
-                    if flag_img:
-                        region = flag_img.get('title', '').strip()
-                        if region:
-                            regions = [region]
-                    else:
-                        # Fallback: testo della cella
-                        region = region_cell.get_text(strip=True)
-                        if region:
-                            regions = [region]
-                
-                # Mappa il sistema al mother_code
-                platform = 'unknown'
-                if system and source_dir:
-                    platform = map_system_to_mother_code(system, source_dir)
-                
-                # Costruisci l'URL dell'immagine box art dall'URI
-                # L'app proverà a caricarlo, e se fallisce userà il placeholder
-                boxart_url = None
-                rom_id = None
-                match = re.search(r'/vault/(\d+)', uri)
-                if match:
-                    rom_id = match.group(1)
-                    boxart_url = f'https://dl.vimm.net/image.php?type=box&id={rom_id}'
-                
-                rom = {
-                    'slug': slug,
-                    'rom_id': uri,  # Salviamo l'URI come rom_id per poterlo recuperare
-                    'title': name,
-                    'platform': platform,
-                    'boxart_url': boxart_url,  # Mantieni per compatibilità (deprecato)
-                    'boxart_urls': [boxart_url] if boxart_url else [],  # Mantieni per compatibilità (deprecato)
-                    'box_image': boxart_url,  # Box art (costruita dall'ID, se fallisce l'app userà placeholder)
-                    'screen_image': None,  # Screen non disponibile nella ricerca (solo in getEntry)
-                    'regions': regions,
-                    'links': []
-                }
-                roms.append(rom)
+        body, truncated = fetch_listing_body(url, limit)
+        rules = load_extraction_rules(source_dir)
+        rows = memo_parse('general_listing', body, parse_general_listing, rules, source_dir)
+        if truncated and len(rows) < limit:
+            # Markup diverso dal previsto (righe non valide nella tabella): serve la pagina intera
+            body, _ = fetch_listing_body(url, None)
+            rows = memo_parse('general_listing', body, parse_general_listing, rules, source_dir)
+        # Righe condivise con il memo dei parsing: copie, perché i filtri possono modificarle
+        roms = [copy.copy(row) for row in rows]
+    except (SourceUnavailableError, DeadlineExceededError):
+        raise
     except Exception as e:
         print(f"Errore nella ricerca generale: {e}", file=sys.stderr)
     
+    record_slugs(roms, source_dir)
     return roms
 
 
-def get_rom_entry_by_uri(uri: str, source_dir: str, include_download_links: bool = True) -> Optional[Dict[str, Any]]:
-    """Ottiene i dettagli completi di una ROM dall'URI"""
-    try:
-        # Estrai informazioni dalla pagina ROM per ottenere nome e sistema
-        headers = {'User-Agent': get_random_ua()}
-        page = requests.get('https://vimm.net/' + uri, headers=headers, timeout=10, verify=False)
-        soup = BeautifulSoup(page.content, 'html.parser')
-        
-        # Cerca il titolo della ROM
-        title = "ROM"
-        title_elem = soup.find('h1') or soup.find('title')
-        if title_elem:
-            title = title_elem.get_text().strip()
-            # Rimuovi il prefisso "The Vault:" se presente
-            if title.startswith("The Vault:"):
-                title = title.replace("The Vault:", "").strip()
-        
-        # Cerca il sistema
-        system = None
-        
-        # Carica il mapping per ottenere tutti i codici Vimm's Lair possibili
-        mapping = load_platform_mapping(source_dir)
-        all_vimm_codes = set()
-        for vimm_codes in mapping.values():
-            if isinstance(vimm_codes, list):
-                all_vimm_codes.update(vimm_codes)
+def parse_rom_page(content: bytes, rules: ExtractionRules, uri: str, source_dir: str) -> Dict[str, Any]:
+    """Estrae dalla pagina ROM titolo, sistema, immagini, media, formati e regioni (nessuna richiesta di rete)"""
+    soup = BeautifulSoup(content, 'html.parser')
+    
+    # Cerca il titolo della ROM
+    title = "ROM"
+    title_elem = rules.selectors['rom_title'].find(soup) or rules.selectors['page_title'].find(soup)
+    if title_elem:
+        # Rimuovi il prefisso "The Vault:" se presente
+        title = rules.patterns['page_title_prefix'].sub('', title_elem.get_text()).strip()
+    
+    # Cerca il sistema
+    system = None
+    
+    # Carica il mapping per ottenere tutti i codici Vimm's Lair possibili
+    mapping = load_platform_mapping(source_dir)
+    all_vimm_codes = set()
+    for vimm_codes in mapping.values():
+        if isinstance(vimm_codes, list):
+            all_vimm_codes.update(vimm_codes)
+        else:
+            all_vimm_codes.add(vimm_codes)
+    
+    # Prova prima a estrarre dal titolo (es. "New Super Mario Bros. Wii (Wii)" -> "Wii")
+    if title and '(' in title:
+        title_lower = title.lower()
+        for vimm_code in all_vimm_codes:
+            if vimm_code.lower() in title_lower:
+                system = vimm_code
+                break
+    
+    # Se non trovato nel titolo, cerca nella pagina
+    if not system:
+        system_elem = soup.find(text=rules.patterns['system_label'])
+        if system_elem:
+            parent = system_elem.parent
+            if parent:
+                system_text = parent.get_text()
+                for vimm_code in all_vimm_codes:
+                    if vimm_code in system_text:
+                        system = vimm_code
+                        break
+    
+    # Se ancora non trovato, cerca in tutti i testi della pagina (case-insensitive)
+    if not system:
+        page_text = soup.get_text().lower()
+        for vimm_code in all_vimm_codes:
+            if vimm_code.lower() in page_text:
+                system = vimm_code
+                break
+    
+    # Estrai l'ID della ROM dall'URI per costruire gli URL delle immagini
+    rom_id = None
+    match = rules.patterns['rom_id'].search(uri)
+    if match:
+        rom_id = match.group(1)
+    
+    # Cerca le immagini (box art e screen)
+    boxart_url = None
+    screen_url = None
+    
+    # Cerca l'immagine della box art
+    boxart_img = rules.selectors['box_art'].find(soup)
+    if boxart_img:
+        src = boxart_img.get('src', '')
+        if src:
+            # Normalizza l'URL (rimuovi // iniziale e aggiungi https://)
+            if src.startswith('//'):
+                boxart_url = 'https:' + src
+            elif src.startswith('/'):
+                boxart_url = get_base_url() + src
+            elif src.startswith('http'):
+                boxart_url = src
             else:
-                all_vimm_codes.add(vimm_codes)
-        
-        # Prova prima a estrarre dal titolo (es. "New Super Mario Bros. Wii (Wii)" -> "Wii")
-        if title and '(' in title:
-            title_lower = title.lower()
-            for vimm_code in all_vimm_codes:
-                if vimm_code.lower() in title_lower:
-                    system = vimm_code
-                    break
-        
-        # Se non trovato nel titolo, cerca nella pagina
-        if not system:
-            system_elem = soup.find(text=re.compile('System|Platform'))
-            if system_elem:
-                parent = system_elem.parent
-                if parent:
-                    system_text = parent.get_text()
-                    for vimm_code in all_vimm_codes:
-                        if vimm_code in system_text:
-                            system = vimm_code
-                            break
-        
-        # Se ancora non trovato, cerca in tutti i testi della pagina (case-insensitive)
-        if not system:
-            page_text = soup.get_text().lower()
-            for vimm_code in all_vimm_codes:
-                if vimm_code.lower() in page_text:
-                    system = vimm_code
-                    break
-        
-        # Estrai l'ID della ROM dall'URI per costruire gli URL delle immagini
-        rom_id = None
-        match = re.search(r'/vault/(\d+)', uri)
-        if match:
-            rom_id = match.group(1)
-        
-        # Cerca le immagini (box art e screen)
-        boxart_url = None
-        screen_url = None
-        
-        # Cerca l'immagine della box art
-        boxart_img = soup.find('img', alt='Box')
-        if boxart_img:
-            src = boxart_img.get('src', '')
+                boxart_url = get_base_url() + '/' + src
+            # Verifica che non sia il logo di Vimm's Lair
+            if 'vault.png' in boxart_url or 'logo' in boxart_url.lower():
+                boxart_url = None
+    
+    # Se non trovata, cerca per pattern comune
+    if not boxart_url:
+        for img in rules.selectors['box_art_src'].find_all(soup):
+            src = img.get('src', '')
             if src:
-                # Normalizza l'URL (rimuovi // iniziale e aggiungi https://)
                 if src.startswith('//'):
                     boxart_url = 'https:' + src
                 elif src.startswith('/'):
-                    boxart_url = 'https://vimm.net' + src
+                    boxart_url = get_base_url() + src
                 elif src.startswith('http'):
                     boxart_url = src
-                else:
-                    boxart_url = 'https://vimm.net/' + src
-                # Verifica che non sia il logo di Vimm's Lair
-                if 'vault.png' in boxart_url or 'logo' in boxart_url.lower():
-                    boxart_url = None
-        
-        # Se non trovata, cerca per pattern comune
-        if not boxart_url:
-            all_imgs = soup.find_all('img')
-            for img in all_imgs:
-                src = img.get('src', '')
-                if src and 'image.php?type=box' in src:
-                    if src.startswith('//'):
-                        boxart_url = 'https:' + src
-                    elif src.startswith('/'):
-                        boxart_url = 'https://vimm.net' + src
-                    elif src.startswith('http'):
-                        boxart_url = src
+                break
+    
+    # Se ancora non trovata, prova prima con type=cart (spesso più affidabile)
+    if not boxart_url and rom_id:
+        # Prova prima con cart, poi con box come fallback
+        cart_src = rules.values['cart_image_src'].format(rom_id=rom_id)
+        cart_img = soup.find('img', src=lambda x: x and cart_src in x)
+        if cart_img:
+            cart_src = cart_img.get('src', '')
+            if cart_src.startswith('//'):
+                boxart_url = 'https:' + cart_src
+            elif cart_src.startswith('/'):
+                boxart_url = get_base_url() + cart_src
+            elif cart_src.startswith('http'):
+                boxart_url = cart_src
+            else:
+                boxart_url = get_base_url() + '/' + cart_src
+    
+    # NON costruiamo l'URL direttamente se non trovato nella pagina
+    # Se non trovato, useremo il placeholder quando cover_urls è vuoto
+    if not boxart_url:
+        print(f"⚠️ [parse_rom_page] boxart_url non trovato nella pagina per ROM {title} (rom_id: {rom_id})", file=sys.stderr)
+    
+    # Costruisci l'URL dell'immagine screen solo se trovata nella pagina
+    # Cerca l'immagine screen nella pagina
+    screen_url = None
+    screen_img = rules.selectors['screen'].find(soup) or rules.selectors['screen_src'].find(soup)
+    if screen_img:
+        screen_src = screen_img.get('src', '')
+        if screen_src:
+            if screen_src.startswith('//'):
+                screen_url = 'https:' + screen_src
+            elif screen_src.startswith('/'):
+                screen_url = get_base_url() + screen_src
+            elif screen_src.startswith('http'):
+                screen_url = screen_src
+    
+    if not screen_url and rom_id:
+        print(f"⚠️ [parse_rom_page] screen_url non trovato nella pagina per ROM {title} (rom_id: {rom_id})", file=sys.stderr)
+    
+    # Estrai il dominio di download dalla tabella dl-row (può essere dl2 o dl3)
+    # Ogni ROM può usare un dominio diverso, quindi lo estraiamo dalla tabella
+    download_domain = rules.values['default_download_domain']
+    # Cerca il form dentro la tabella dl-row, altrimenti direttamente nella pagina
+    dl_row = rules.selectors['download_row'].find(soup)
+    download_form = rules.selectors['download_form'].find(dl_row if dl_row else soup)
+    if download_form:
+        action = download_form.get('action', '')
+        if action.startswith('//'):
+            # Estrai il dominio da //dl2.vimm.net/ o //dl3.vimm.net/
+            match = rules.patterns['download_domain'].search(action)
+            if match:
+                download_domain = match.group(1)
+    
+    # Estrai array media dal JavaScript per ottenere tutte le versioni
+    media_array = []
+    for script in rules.selectors['script'].find_all(soup):
+        if script.string:
+            match = rules.patterns['media_array'].search(script.string)
+            if match:
+                try:
+                    media_array = json.loads(match.group(1))
                     break
-        
-        # Se ancora non trovata, prova prima con type=cart (spesso più affidabile)
-        if not boxart_url and rom_id:
-            # Prova prima con cart, poi con box come fallback
-            cart_img = soup.find('img', src=lambda x: x and f'type=cart&id={rom_id}' in x)
-            if cart_img:
-                cart_src = cart_img.get('src', '')
-                if cart_src.startswith('//'):
-                    boxart_url = 'https:' + cart_src
-                elif cart_src.startswith('/'):
-                    boxart_url = 'https://vimm.net' + cart_src
-                elif cart_src.startswith('http'):
-                    boxart_url = cart_src
-                else:
-                    boxart_url = 'https://vimm.net/' + cart_src
-        
-        # NON costruiamo l'URL direttamente se non trovato nella pagina
-        # Se non trovato, useremo il placeholder quando cover_urls è vuoto
-        if not boxart_url:
-            print(f"⚠️ [get_rom_entry_by_uri] boxart_url non trovato nella pagina per ROM {title} (rom_id: {rom_id})", file=sys.stderr)
-        
-        # Costruisci l'URL dell'immagine screen solo se trovata nella pagina
-        # Cerca l'immagine screen nella pagina
-        screen_url = None
-        screen_img = soup.find('img', alt='Screen') or soup.find('img', src=lambda x: x and 'type=screen' in (x or ''))
-        if screen_img:
-            screen_src = screen_img.get('src', '')
-            if screen_src:
-                if screen_src.startswith('//'):
-                    screen_url = 'https:' + screen_src
-                elif screen_src.startswith('/'):
-                    screen_url = 'https://vimm.net' + screen_src
-                elif screen_src.startswith('http'):
-                    screen_url = screen_src
-        
-        if not screen_url and rom_id:
-            print(f"⚠️ [get_rom_entry_by_uri] screen_url non trovato nella pagina per ROM {title} (rom_id: {rom_id})", file=sys.stderr)
+                except:
+                    pass
+    
+    # Estrai opzioni di format dal select (può essere fuori dal form)
+    format_options = []
+    format_select = rules.selectors['format_select'].find(soup)
+    if format_select:
+        for option in rules.selectors['format_option'].find_all(format_select):
+            format_value = option.get('value', '')
+            format_text = option.get_text(strip=True)
+            # Usa il title se disponibile, altrimenti il testo
+            format_title = option.get('title', '')
+            if format_title:
+                # Estrai l'estensione dal title (es. ".wbfs files work..." -> ".wbfs")
+                match = rules.patterns['format_extension'].search(format_title)
+                if match:
+                    ext = match.group(1)
+                    format_text = f".{ext}"
+            format_options.append({
+                'value': format_value,
+                'text': format_text
+            })
+    
+    # Se non ci sono opzioni di format, usa default (0 = Zipped, 1 = AltZipped, 2 = AltZipped2)
+    if not format_options:
+        format_options = [
+            {'value': '0', 'text': 'Default'},
+            {'value': '1', 'text': 'Alt'},
+            {'value': '2', 'text': 'Alt2'}
+        ]
+    
+    # Estrai le regioni dalla tabella della pagina ROM
+    # La struttura è: <tr><td>Region</td><td></td><td><img class="flag" title="USA">...</td></tr>
+    regions = []
+    # Cerca tutte le righe della tabella
+    for row in rules.selectors['table_row'].find_all(soup):
+        cells = rules.selectors['table_cell'].find_all(row)
+        if len(cells) >= 3:
+            # Il primo <td> dovrebbe contenere "Region"
+            first_cell_text = cells[0].get_text(strip=True)
+            if first_cell_text.lower() == rules.values['region_label']:
+                # Il terzo <td> contiene le immagini flag
+                region_cell = cells[2] if len(cells) > 2 else None
+                if region_cell:
+                    # Trova tutte le immagini flag con attributo title
+                    flag_imgs = rules.selectors['region_flag'].find_all(region_cell)
+                    for flag_img in flag_imgs:
+                        region = flag_img.get('title', '').strip()
+                        if region and region not in regions:
+                            regions.append(region)
+                break  # Trovata la riga Region, esci dal loop
+    
+    # Se non trovate regioni nella tabella, prova a cercare in modo alternativo
+    if not regions:
+        # Cerca direttamente tutte le immagini flag nella pagina
+        all_flag_imgs = rules.selectors['region_flag'].find_all(soup)
+        for flag_img in all_flag_imgs:
+            region = flag_img.get('title', '').strip()
+            if region and region not in regions:
+                regions.append(region)
+    
+    return {
+        'title': title,
+        'system': system,
+        'boxart_url': boxart_url,
+        'screen_url': screen_url,
+        'download_domain': download_domain,
+        'media_array': media_array,
+        'format_options': format_options,
+        'regions': regions
+    }
+
+
+def get_rom_entry_by_uri(uri: str, source_dir: str, include_download_links: bool = True,
+                         lazy_links: bool = False,
+                         fields: FrozenSet[str] = frozenset(ENTRY_FIELDS)) -> Optional[Dict[str, Any]]:
+    """
+    Ottiene i dettagli di una ROM dall'URI
+    fields: campi della entry da estrarre (vedi entry_fields); gli altri stadi vengono saltati
+    """
+    try:
+        # Estrai informazioni dalla pagina ROM per ottenere nome e sistema
+        headers = {'User-Agent': get_random_ua()}
+        page = fetch_with_retry(get_base_url() + '/' + uri, endpoint='detail', headers=headers, timeout=10, verify=False)
+        if page.status_code == 404:
+            # ROM rimossa o slug inesistente: niente entry (finisce nella cache negativa)
+            print(f"⚠️ [get_rom_entry_by_uri] 404 per {uri}", file=sys.stderr)
+            return None
+        parsed = memo_parse('rom_page', page.content, parse_rom_page, load_extraction_rules(source_dir), uri, source_dir)
+        title, system = parsed['title'], parsed['system']
+        boxart_url, screen_url = parsed['boxart_url'], parsed['screen_url']
+        download_domain, media_array = parsed['download_domain'], parsed['media_array']
+        format_options = parsed['format_options']
         
         # Verifica se lo screen è un placeholder di errore
         # Vimm's Lair restituisce sempre un'immagine screen anche quando non esiste
         # (con scritto "Error: image not found"). Dobbiamo verificare se l'immagine è valida.
         valid_screen_url = None
-        if screen_url:
+        if screen_url and 'screen_image' in fields:
             # Verifica se l'immagine screen esiste realmente e non è un placeholder di errore
             try:
-                headers = {'User-Agent': get_random_ua()}
+                headers = {'User-Agent': get_random_ua(), 'Referer': image_referer(uri) or get_base_url() + '/'}
                 # Facciamo una richiesta GET per verificare il contenuto dell'immagine
-                response = requests.get(screen_url, headers=headers, timeout=5, verify=False, allow_redirects=True)
-                content_type = response.headers.get('Content-Type', '').lower()
-                
-                # Se è un'immagine valida (non un placeholder di errore)
-                if response.status_code == 200 and 'image' in content_type:
-                    # Verifica le dimensioni dell'immagine: le immagini di errore sono spesso 400x100 o simili
-                    # Le immagini screen reali sono generalmente più grandi (almeno 200x200)
-                    try:
-                        from PIL import Image
-                        from io import BytesIO
-                        img = Image.open(BytesIO(response.content))
-                        width, height = img.size
-                        
-                        # Le immagini di errore sono spesso piccole e rettangolari (es. 400x100)
-                        # Le immagini screen reali sono generalmente più grandi e quadrate/rettangolari grandi
-                        if width < 200 or height < 200:
-                            print(f"⚠️ [get_rom_entry_by_uri] Screen troppo piccolo ({width}x{height}), probabilmente placeholder di errore: {screen_url}", file=sys.stderr)
-                        elif width == 400 and height == 100:
-                            # Dimensione tipica per immagini di errore Vimm's Lair
-                            print(f"⚠️ [get_rom_entry_by_uri] Screen ha dimensioni tipiche di errore ({width}x{height}): {screen_url}", file=sys.stderr)
-                        else:
-                            valid_screen_url = screen_url
-                    except ImportError:
-                        # PIL non disponibile, usa controllo dimensione file come fallback
-                        size = len(response.content)
-                        # Le immagini di errore sono spesso tra 5KB e 15KB
-                        # Le immagini screen reali sono generalmente più grandi (> 20KB)
-                        if 5000 < size < 20000:
-                            print(f"⚠️ [get_rom_entry_by_uri] Screen ha dimensione sospetta ({size} bytes), potrebbe essere placeholder di errore: {screen_url}", file=sys.stderr)
-                        elif size > 20000:
-                            valid_screen_url = screen_url
-                        else:
-                            print(f"⚠️ [get_rom_entry_by_uri] Screen troppo piccolo ({size} bytes): {screen_url}", file=sys.stderr)
-                    except Exception as img_error:
-                        # Errore nel processare l'immagine, usa dimensione file
-                        size = len(response.content)
-                        if size > 20000:
-                            valid_screen_url = screen_url
-                        else:
-                            print(f"⚠️ [get_rom_entry_by_uri] Screen sospetto (size: {size} bytes, errore analisi): {screen_url}", file=sys.stderr)
+                response = http_get(screen_url, endpoint='screen', headers=headers, timeout=5, verify=False, allow_redirects=True)
+                problem = vimm_image_problem(response, SCREEN_MIN_SIDE, SCREEN_MIN_BYTES)
+                if problem:
+                    print(f"⚠️ [get_rom_entry_by_uri] Screen non valido ({problem}): {screen_url}", file=sys.stderr)
                 else:
-                    print(f"⚠️ [get_rom_entry_by_uri] Screen non valido (status: {response.status_code}, type: {content_type}): {screen_url}", file=sys.stderr)
+                    valid_screen_url = screen_url
             except Exception as e:
                 # In caso di errore, non includiamo lo screen
                 print(f"⚠️ [get_rom_entry_by_uri] Errore verifica screen: {e}", file=sys.stderr)
         
         # box_image è obbligatoria (se non presente, l'app userà il placeholder)
         # screen_image è facoltativa (solo se valida)
+        if 'box_image' not in fields:
+            boxart_url = None
+        elif boxart_url and known_box_art([uri], source_dir).get(uri) is False:
+            boxart_url = None  # Copertina già verificata come mancante
         print(f"📊 [get_rom_entry_by_uri] Box art: {boxart_url}, Screen: {valid_screen_url}", file=sys.stderr)
         
-        # Estrai il dominio di download dalla tabella dl-row (può essere dl2 o dl3)
-        # Ogni ROM può usare un dominio diverso, quindi lo estraiamo dalla tabella
-        download_domain = "dl2.vimm.net"  # Default
-        dl_row = soup.find('tr', id='dl-row')
-        if dl_row:
-            # Cerca il form dentro la tabella dl-row
-            download_form = dl_row.find('form', id='dl_form')
-            if download_form:
-                action = download_form.get('action', '')
-                if action.startswith('//'):
-                    # Estrai il dominio da //dl2.vimm.net/ o //dl3.vimm.net/
-                    match = re.search(r'//(dl[23]\.vimm\.net)', action)
-                    if match:
-                        download_domain = match.group(1)
-        else:
-            # Fallback: cerca il form direttamente
-            download_form = soup.find('form', id='dl_form')
-            if download_form:
-                action = download_form.get('action', '')
-                if action.startswith('//'):
-                    match = re.search(r'//(dl[23]\.vimm\.net)', action)
-                    if match:
-                        download_domain = match.group(1)
-        
-        # Estrai array media dal JavaScript per ottenere tutte le versioni
-        media_array = []
-        scripts = soup.find_all('script')
-        for script in scripts:
-            if script.string and 'const media=' in script.string:
-                match = re.search(r'const media=(\[.*?\]);', script.string, re.DOTALL)
-                if match:
-                    try:
-                        media_array = json.loads(match.group(1))
-                        break
-                    except:
-                        pass
-        
-        # Estrai opzioni di format dal select (può essere fuori dal form)
-        format_options = []
-        format_select = soup.find(id='dl_format')
-        if format_select:
-            for option in format_select.find_all('option'):
-                format_value = option.get('value', '')
-                format_text = option.get_text(strip=True)
-                # Usa il title se disponibile, altrimenti il testo
-                format_title = option.get('title', '')
-                if format_title:
-                    # Estrai l'estensione dal title (es. ".wbfs files work..." -> ".wbfs")
-                    match = re.search(r'\.(\w+)', format_title)
-                    if match:
-                        ext = match.group(1)
-                        format_text = f".{ext}"
-                format_options.append({
-                    'value': format_value,
-                    'text': format_text
-                })
-        
-        # Se non ci sono opzioni di format, usa default (0 = Zipped, 1 = AltZipped, 2 = AltZipped2)
-        if not format_options:
-            format_options = [
-                {'value': '0', 'text': 'Default'},
-                {'value': '1', 'text': 'Alt'},
-                {'value': '2', 'text': 'Alt2'}
-            ]
-        
         # Genera link per ogni combinazione di version (media) e format (solo se richiesto)
+        # I link dall'array media servono anche al titolo (versione), senza richieste di rete
         links = []
-        if include_download_links:
+        if include_download_links and ('links' in fields or 'title' in fields):
             for media_item in media_array:
                 media_id = media_item.get('ID')
                 version = media_item.get('Version', '')
@@ -836,7 +2541,13 @@ def get_rom_entry_by_uri(uri: str, source_dir: str, include_download_links: bool
                     })
             
             # Se non ci sono link generati (nessun media array), usa il metodo vecchio
-            if not links and include_download_links:
+            if not links and 'links' not in fields:
+                pass
+            elif not links and include_download_links and lazy_links:
+                # Pagina ROM letta solo al tap con resolveLink
+                links.append(lazy_link_descriptor('rom_page', uri, name='Download', type='direct',
+                                                  format='zip', size_str=None))
+            elif not links and include_download_links:
                 download_url = get_rom_download_url(uri)
                 if download_url:
                     format_type = "zip"  # Default
@@ -850,36 +2561,7 @@ def get_rom_entry_by_uri(uri: str, source_dir: str, include_download_links: bool
         
         slug = get_rom_slug_from_uri(uri)
         
-        # Estrai le regioni dalla tabella della pagina ROM
-        # La struttura è: <tr><td>Region</td><td></td><td><img class="flag" title="USA">...</td></tr>
-        regions = []
-        # Cerca tutte le righe della tabella
-        table_rows = soup.find_all('tr')
-        for row in table_rows:
-            cells = row.find_all('td')
-            if len(cells) >= 3:
-                # Il primo <td> dovrebbe contenere "Region"
-                first_cell_text = cells[0].get_text(strip=True)
-                if first_cell_text.lower() == 'region':
-                    # Il terzo <td> contiene le immagini flag
-                    region_cell = cells[2] if len(cells) > 2 else None
-                    if region_cell:
-                        # Trova tutte le immagini flag con attributo title
-                        flag_imgs = region_cell.find_all('img', class_='flag')
-                        for flag_img in flag_imgs:
-                            region = flag_img.get('title', '').strip()
-                            if region and region not in regions:
-                                regions.append(region)
-                    break  # Trovata la riga Region, esci dal loop
-        
-        # Se non trovate regioni nella tabella, prova a cercare in modo alternativo
-        if not regions:
-            # Cerca direttamente tutte le immagini flag nella pagina
-            all_flag_imgs = soup.find_all('img', class_='flag')
-            for flag_img in all_flag_imgs:
-                region = flag_img.get('title', '').strip()
-                if region and region not in regions:
-                    regions.append(region)
+        regions = list(parsed['regions'])
         
         print(f"🌍 [get_rom_entry_by_uri] Regioni trovate: {regions}", file=sys.stderr)
         
@@ -901,7 +2583,7 @@ def get_rom_entry_by_uri(uri: str, source_dir: str, include_download_links: bool
             'slug': slug,
             'rom_id': uri,
             'title': final_title,
-            'platform': map_system_to_mother_code(system, source_dir) if system else 'unknown',
+            'platform': map_system_to_mother_code(system, source_dir) if system and 'platform' in fields else 'unknown',
             'boxart_url': boxart_url,  # Mantieni per compatibilità (deprecato)
             'boxart_urls': [boxart_url] if boxart_url else [],  # Mantieni per compatibilità (deprecato)
             'box_image': boxart_url,  # Box art (obbligatoria, null se non presente)
@@ -910,7 +2592,9 @@ def get_rom_entry_by_uri(uri: str, source_dir: str, include_download_links: bool
             'links': links
         }
         
-        return entry
+        return select_entry_fields(entry, fields)
+    except (SourceUnavailableError, DeadlineExceededError):
+        raise
     except Exception as e:
         print(f"Errore nel recupero entry: {e}", file=sys.stderr)
         import traceback
@@ -918,6 +2602,664 @@ def get_rom_entry_by_uri(uri: str, source_dir: str, include_download_links: bool
         return None
 
 
+# Downloader per i link diretti (dl*.vimm.net/?mediaId=...): più connessioni con Range quando
+# il server le supporta, altrimenti un solo stream. Il file viene scritto in <dest>.part con la
+# mappa dei segmenti in <dest>.segments.json, così un download interrotto o annullato riprende
+# da dove era arrivato con un nuovo startDownload sullo stesso percorso
+DOWNLOAD_SEGMENTS_DEFAULT = 4
+DOWNLOAD_SEGMENTS_MAX = 8
+DOWNLOAD_MIN_SEGMENT_BYTES = 8 * 1024 * 1024
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
+DOWNLOAD_READ_TIMEOUT_SECONDS = 30.0  # Fisso: le pause dei trasferimenti lunghi non seguono le latenze delle pagine
+DOWNLOAD_SEGMENT_ATTEMPTS = 5
+DOWNLOAD_STATE_SAVE_INTERVAL = 2.0  # Secondi tra un salvataggio della mappa segmenti e il successivo
+DOWNLOAD_SPEED_WINDOW = 5.0  # Secondi considerati per la velocità corrente
+DOWNLOAD_PART_SUFFIX = '.part'
+DOWNLOAD_STATE_SUFFIX = '.segments.json'
+
+_downloads_lock = threading.Lock()
+_downloads = {}  # download_id -> DownloadJob
+
+
+class RangeNotSupportedError(Exception):
+    """Il server ha ignorato l'header Range (risposta 200 invece di 206)"""
+
+
+class DownloadJob:
+    """Download in background di un file, segmentato o a stream singolo"""
+
+    def __init__(self, download_id: str, url: str, dest_path: str, referer: str, segments: int):
+        self.download_id = download_id
+        self.url = url
+        self.dest_path = dest_path
+        self.part_path = dest_path + DOWNLOAD_PART_SUFFIX
+        self.state_path = dest_path + DOWNLOAD_STATE_SUFFIX
+        self.referer = referer
+        self.requested_segments = segments
+        self.status = 'pending'
+        self.mode = None  # 'segmented' o 'single'
+        self.total_size = None
+        self.validator = None  # ETag o Last-Modified, per non riprendere un file cambiato
+        self.segments = []  # [inizio, fine inclusa, byte scaricati]
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.cancel_event = threading.Event()  # Annullamento: ferma i thread dei segmenti
+        self.segment_stop = threading.Event()  # Errore di un segmento: ferma gli altri (azzerato a ogni avvio)
+        self.cancel_requested = False  # Annullamento chiesto dall'app (non un errore)
+        self.delete_partial = False  # Elimina .part e mappa dei segmenti a download fermato
+        self.transfer_finished = False
+        self.extractor = None  # StreamingExtractor se "extract": true
+        self.lock = threading.Lock()
+        self.progress_cond = threading.Condition(self.lock)  # Notifica i byte scritti all'estrazione
+        self.thread = None
+        self._speed_samples = deque()  # (istante, byte scaricati)
+        self._last_state_save = 0.0
+
+    # --- stato persistito ---
+
+    def load_state(self) -> bool:
+        """Riprende la mappa dei segmenti di un download precedente dello stesso URL"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if state.get('url') != self.url or not os.path.exists(self.part_path):
+            return False
+        self.total_size = state.get('total_size')
+        self.validator = state.get('validator')
+        self.mode = state.get('mode')
+        self.segments = [list(segment) for segment in state.get('segments', [])]
+        return bool(self.segments) or self.mode == 'single'
+
+    def save_state(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_state_save < DOWNLOAD_STATE_SAVE_INTERVAL:
+            return
+        self._last_state_save = now
+        with self.lock:
+            state = {'url': self.url, 'total_size': self.total_size, 'validator': self.validator,
+                     'mode': self.mode, 'segments': [list(segment) for segment in self.segments]}
+        try:
+            write_json_atomic(self.state_path, state)
+        except OSError as e:
+            print(f"⚠️ [download] Impossibile salvare {self.state_path}: {e}", file=sys.stderr)
+
+    # --- avanzamento ---
+
+    def stopping(self) -> bool:
+        """True se i segmenti devono fermarsi (annullamento o errore di un altro segmento)"""
+        return self.cancel_event.is_set() or self.segment_stop.is_set()
+
+    def downloaded_bytes(self) -> int:
+        with self.lock:
+            return sum(segment[2] for segment in self.segments)
+
+    def contiguous_bytes(self) -> int:
+        """Byte scritti senza buchi dall'inizio del file (da chiamare con progress_cond acquisito)"""
+        position = 0
+        for start, end, done in sorted(self.segments):
+            if start != position:
+                break
+            position += done
+            if end < 0 or done < end - start + 1:
+                break
+        return position
+
+    def add_progress(self, segment: List[int], count: int) -> None:
+        with self.progress_cond:
+            segment[2] += count
+            self.progress_cond.notify_all()
+        metrics_inc('bytes_downloaded_total', {'source': SOURCE_ID, 'host': urllib.parse.urlparse(self.url).netloc}, count)
+        self.save_state()
+
+    def speed(self) -> float:
+        """Byte/s negli ultimi DOWNLOAD_SPEED_WINDOW secondi"""
+        now = time.monotonic()
+        downloaded = self.downloaded_bytes()
+        with self.lock:
+            self._speed_samples.append((now, downloaded))
+            while len(self._speed_samples) > 1 and now - self._speed_samples[0][0] > DOWNLOAD_SPEED_WINDOW:
+                self._speed_samples.popleft()
+            first_time, first_bytes = self._speed_samples[0]
+        return (downloaded - first_bytes) / (now - first_time) if now > first_time else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        downloaded = self.downloaded_bytes()
+        speed = self.speed() if self.status == 'downloading' else 0.0
+        remaining = self.total_size - downloaded if self.total_size else None
+        with self.lock:
+            segments = [{"start": s, "end": e, "downloaded": d} for s, e, d in self.segments]
+        return {
+            "download_id": self.download_id,
+            "status": self.status,
+            "mode": self.mode,
+            "url": self.url,
+            "dest_path": self.dest_path,
+            "total_bytes": self.total_size,
+            "downloaded_bytes": downloaded,
+            "progress": round(downloaded / self.total_size, 4) if self.total_size else None,
+            "speed_bps": round(speed),
+            "eta_seconds": round(remaining / speed) if remaining is not None and speed > 0 else None,
+            "segments": segments,
+            "error": self.error,
+            "extraction": self.extractor.snapshot() if self.extractor else None,
+        }
+
+    # --- download ---
+
+    def headers(self, byte_range: Optional[Tuple[int, Optional[int]]] = None) -> Dict[str, str]:
+        headers = {'User-Agent': get_random_ua(), 'Referer': self.referer}
+        if byte_range:
+            start, end = byte_range
+            headers['Range'] = f'bytes={start}-{end if end is not None else ""}'
+            if self.validator:
+                headers['If-Range'] = self.validator
+        return headers
+
+    def open_stream(self, session: requests.Session, byte_range: Optional[Tuple[int, Optional[int]]] = None) -> requests.Response:
+        response = fetch_with_retry(self.url, session=session, endpoint='download', stream=True, adaptive_timeout=False,
+                                    headers=self.headers(byte_range), timeout=DOWNLOAD_READ_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        return response
+
+    def plan(self, session: requests.Session) -> None:
+        """Prima richiesta: dimensione, supporto Range e suddivisione in segmenti"""
+        response = self.open_stream(session, (0, 0))
+        response.close()
+        self.validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        total = response.headers.get('Content-Range', '').rpartition('/')[2]
+        if response.status_code == 206 and total.isdigit():
+            self.total_size = int(total)
+            count = max(1, min(self.requested_segments, DOWNLOAD_SEGMENTS_MAX,
+                               self.total_size // DOWNLOAD_MIN_SEGMENT_BYTES or 1))
+            self.mode = 'segmented'
+        else:
+            length = response.headers.get('Content-Length', '')
+            self.total_size = int(length) if response.status_code == 200 and length.isdigit() else None
+            count = 1
+            self.mode = 'single'
+        if self.total_size:
+            step = -(-self.total_size // count)
+            self.segments = [[start, min(start + step, self.total_size) - 1, 0]
+                             for start in range(0, self.total_size, step)]
+        else:
+            self.segments = [[0, -1, 0]]  # Dimensione ignota: un solo segmento fino alla fine
+        with open(self.part_path, 'wb') as f:
+            if self.total_size and self.mode == 'segmented':
+                f.truncate(self.total_size)
+        self.save_state(force=True)
+        print(f"📥 [download] {self.dest_path}: {self.total_size or '?'} byte, modalità {self.mode} "
+              f"({len(self.segments)} segmenti)", file=sys.stderr)
+
+    def download_segment(self, segment: List[int], session: requests.Session) -> None:
+        """Scarica (o completa) un segmento scrivendolo alla sua posizione nel file .part"""
+        def attempt() -> None:
+            start, end, done = segment
+            if (end >= 0 and start + done > end) or self.stopping():
+                return
+            ranged = self.mode == 'segmented' or done > 0
+            response = self.open_stream(session, (start + done, end if end >= 0 else None) if ranged else None)
+            try:
+                if ranged and response.status_code != 206:
+                    raise RangeNotSupportedError(f"Range ignorato dal server (HTTP {response.status_code})")
+                with open(self.part_path, 'r+b') as f:
+                    f.seek(start + done)
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                        if self.stopping():
+                            return
+                        f.write(chunk)
+                        f.flush()  # Visibile subito all'estrazione in streaming
+                        self.add_progress(segment, len(chunk))
+            except requests.exceptions.ChunkedEncodingError as e:
+                # Connessione interrotta a metà: il retry riparte dall'ultimo byte scritto
+                raise RetryableError(str(e)) from e
+            finally:
+                response.close()
+            if end >= 0 and segment[2] < end - start + 1 and not self.stopping():
+                raise RetryableError(f"Segmento {start}-{end} incompleto")
+        RetryPolicy(max_attempts=DOWNLOAD_SEGMENT_ATTEMPTS).run(attempt, f"segmento {segment[0]}-{segment[1]}")
+
+    def run_segments(self) -> None:
+        pending = [segment for segment in self.segments if segment[1] < 0 or segment[2] < segment[1] - segment[0] + 1]
+        errors = []
+        self.segment_stop.clear()
+
+        def worker(segment: List[int]) -> None:
+            try:
+                self.download_segment(segment, new_download_session())
+            except Exception as e:
+                errors.append(e)
+                self.segment_stop.set()  # Ferma gli altri segmenti: lo stato resta riprendibile
+
+        threads = [threading.Thread(target=worker, args=(segment,), daemon=True) for segment in pending]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def run(self) -> None:
+        self.status = 'downloading'
+        try:
+            if self.load_state():
+                print(f"🔄 [download] Ripresa di {self.dest_path} da {self.downloaded_bytes()} byte", file=sys.stderr)
+            else:
+                self.plan(new_download_session())
+            if self.extractor:
+                self.extractor.start()
+            try:
+                self.run_segments()
+            except RangeNotSupportedError:
+                if self.cancel_event.is_set():
+                    raise
+                # Il server non onora più i Range (o il file è cambiato): si ricomincia a stream singolo
+                print(f"⚠️ [download] Range non supportato, riparto a stream singolo", file=sys.stderr)
+                self.mode = 'single'
+                self.segments = [[0, self.total_size - 1 if self.total_size else -1, 0]]
+                open(self.part_path, 'wb').close()
+                self.save_state(force=True)
+                self.run_segments()
+            self.end_transfer()
+            if self.cancel_requested:
+                self.save_state(force=True)
+                self.status = 'cancelled'
+                return
+            size = os.path.getsize(self.part_path)
+            if self.total_size is not None and size != self.total_size:
+                raise IOError(f"Dimensione non valida: {size} byte invece di {self.total_size}")
+            os.replace(self.part_path, self.dest_path)
+            try:
+                os.remove(self.state_path)
+            except OSError:
+                pass
+            self.total_size = size
+            print(f"✅ [download] Completato {self.dest_path} ({size} byte)", file=sys.stderr)
+            if self.extractor:
+                self.status = 'extracting'
+                self.extractor.finish()
+            self.status = 'completed'
+        except Exception as e:
+            self.end_transfer()
+            self.save_state(force=True)
+            self.error = str(e)
+            self.status = 'cancelled' if self.cancel_requested else 'failed'
+            print(f"❌ [download] {self.dest_path}: {e}", file=sys.stderr)
+        finally:
+            with self.lock:
+                self.finished_at = time.time()
+                delete_partial = self.delete_partial and self.status == 'cancelled'
+            if delete_partial:
+                self.remove_partial()
+
+    def remove_partial(self) -> None:
+        for path in (self.part_path, self.state_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def end_transfer(self) -> None:
+        """Segnala all'estrazione in streaming che non arriveranno altri byte"""
+        with self.progress_cond:
+            self.transfer_finished = True
+            self.progress_cond.notify_all()
+
+
+# Estrazione in streaming: con "extract": true in startDownload gli entry zip vengono
+# decompressi mentre il file arriva, leggendo il prefisso contiguo già scritto in <dest>.part.
+# Memoria limitata a EXTRACT_READ_BYTES compressi + EXTRACT_OUTPUT_BYTES decompressi.
+# Quello che non si può estrarre in streaming (metodi diversi da stored/deflate, entry cifrati,
+# archivi 7z) viene estratto a download finito con zipfile o py7zr (se installato)
+EXTRACT_READ_BYTES = 1024 * 1024
+EXTRACT_OUTPUT_BYTES = 4 * 1024 * 1024
+ZIP_LOCAL_HEADER = b'PK\x03\x04'
+ZIP_END_SIGNATURES = (b'PK\x01\x02', b'PK\x05\x06', b'PK\x06\x06')  # Central directory: entry finiti
+ZIP_DATA_DESCRIPTOR = b'PK\x07\x08'
+SEVEN_ZIP_SIGNATURE = b'7z\xbc\xaf\x27\x1c'
+
+# Estrazione degli archivi 7z (opzionale, solo a download finito)
+try:
+    import py7zr
+except ImportError:
+    py7zr = None
+
+
+class StreamingUnsupportedError(Exception):
+    """L'archivio non si può estrarre in streaming: si ripiega sull'estrazione a fine download"""
+
+
+def safe_extract_path(extract_dir: str, name: str) -> str:
+    """Percorso di destinazione di un entry, rifiutando percorsi assoluti o con .."""
+    base = os.path.abspath(extract_dir)
+    path = os.path.normpath(os.path.join(base, name.replace('\\', '/').lstrip('/')))
+    if not path.startswith(base + os.sep):
+        raise ValueError(f"Percorso non valido nell'archivio: {name}")
+    return path
+
+
+class StreamingExtractor:
+    """Estrae gli entry di uno zip leggendo il file .part man mano che il download avanza"""
+
+    def __init__(self, job: 'DownloadJob', extract_dir: str, keep_archive: bool):
+        self.job = job
+        self.extract_dir = os.path.abspath(extract_dir)
+        self.keep_archive = keep_archive
+        self.status = 'waiting'  # waiting, streaming, completed, fallback, failed, cancelled, not_archive
+        self.files = []
+        self.extracted_bytes = 0
+        self.error = None
+        self.thread = None
+        self._file = None
+        self._offset = 0
+        self._pushback = b''
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.run, name=f'extract-{self.job.download_id}', daemon=True)
+        self.thread.start()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"status": self.status, "extract_dir": self.extract_dir, "files": list(self.files),
+                "extracted_bytes": self.extracted_bytes, "keep_archive": self.keep_archive, "error": self.error}
+
+    # --- lettura del prefisso scaricato ---
+
+    def read(self, size: int, exact: bool = True) -> bytes:
+        """Legge fino a size byte, attendendo che il download li scriva"""
+        data = self._pushback[:size]
+        self._pushback = self._pushback[size:]
+        if data and not exact:
+            return data
+        while len(data) < size:
+            wanted = size - len(data)
+            with self.job.progress_cond:
+                while True:
+                    available = self.job.contiguous_bytes() - self._offset
+                    if available > 0 or self.job.transfer_finished:
+                        break
+                    self.job.progress_cond.wait(0.5)
+            if available <= 0:
+                if self.job.stopping():
+                    raise InterruptedError("Download interrotto")
+                if exact:
+                    raise EOFError("Archivio troncato")
+                break
+            self._file.seek(self._offset)
+            chunk = self._file.read(min(wanted, available))
+            self._offset += len(chunk)
+            data += chunk
+            if not exact:
+                break
+        return data
+
+    def unread(self, data: bytes) -> None:
+        self._pushback = data + self._pushback
+
+    # --- parsing zip ---
+
+    def run(self) -> None:
+        try:
+            self._file = open(self.job.part_path, 'rb')
+            magic = self.read(6, exact=False)
+            if magic.startswith(SEVEN_ZIP_SIGNATURE):
+                raise StreamingUnsupportedError("archivio 7z")
+            if not magic.startswith(ZIP_LOCAL_HEADER):
+                self.status = 'not_archive'
+                return
+            self.unread(magic)
+            self.status = 'streaming'
+            while True:
+                signature = self.read(4)
+                if signature in ZIP_END_SIGNATURES:
+                    break
+                if signature != ZIP_LOCAL_HEADER:
+                    raise StreamingUnsupportedError(f"firma zip inattesa {signature!r}")
+                self.extract_entry()
+            self.status = 'completed'
+            print(f"✅ [extract] {len(self.files)} file estratti in streaming in {self.extract_dir}", file=sys.stderr)
+        except InterruptedError:
+            self.status = 'cancelled'
+        except StreamingUnsupportedError as e:
+            print(f"ℹ️ [extract] Streaming non possibile ({e}): estrazione a download finito", file=sys.stderr)
+            self.status = 'fallback'
+        except Exception as e:
+            self.error = str(e)
+            self.status = 'fallback' if not self.job.stopping() else 'cancelled'
+            print(f"⚠️ [extract] Errore in streaming: {e}", file=sys.stderr)
+        finally:
+            if self._file:
+                self._file.close()
+
+    def extract_entry(self) -> None:
+        (_, flags, method, _, _, crc, compressed_size, size,
+         name_length, extra_length) = struct.unpack('<HHHHHIIIHH', self.read(26))
+        name = self.read(name_length).decode('utf-8' if flags & 0x800 else 'cp437')
+        extra = self.read(extra_length)
+        zip64 = compressed_size == 0xFFFFFFFF or size == 0xFFFFFFFF
+        if zip64:
+            size, compressed_size = self.zip64_sizes(extra, size, compressed_size)
+        if flags & 0x1:
+            raise StreamingUnsupportedError(f"entry cifrato {name}")
+        if method not in (0, 8) or (method == 0 and flags & 0x8):
+            raise StreamingUnsupportedError(f"metodo di compressione {method} per {name}")
+
+        target = safe_extract_path(self.extract_dir, name)
+        is_dir = name.endswith('/')
+        os.makedirs(target if is_dir else os.path.dirname(target), exist_ok=True)
+        # Anche le directory possono avere dati (deflate vuoto) e data descriptor da consumare
+        tmp_path = os.devnull if is_dir else target + '.extracting'
+        running_crc = 0
+        with open(tmp_path, 'wb') as out:
+            if method == 0:
+                remaining = compressed_size
+                while remaining:
+                    chunk = self.read(min(remaining, EXTRACT_READ_BYTES))
+                    remaining -= len(chunk)
+                    running_crc = zlib.crc32(chunk, running_crc)
+                    out.write(chunk)
+                    self.extracted_bytes += len(chunk)
+            else:
+                decompressor = zlib.decompressobj(-15)
+                remaining = compressed_size if not flags & 0x8 else None
+                while not decompressor.eof:
+                    if remaining == 0:
+                        raise EOFError(f"Dati compressi incompleti per {name}")
+                    chunk = self.read(min(remaining, EXTRACT_READ_BYTES) if remaining is not None else EXTRACT_READ_BYTES,
+                                      exact=remaining is not None)
+                    if not chunk:
+                        raise EOFError(f"Archivio troncato in {name}")
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    while chunk and not decompressor.eof:
+                        output = decompressor.decompress(chunk, EXTRACT_OUTPUT_BYTES)
+                        chunk = decompressor.unconsumed_tail
+                        running_crc = zlib.crc32(output, running_crc)
+                        out.write(output)
+                        self.extracted_bytes += len(output)
+                    if decompressor.eof:
+                        # Byte letti oltre la fine dello stream deflate: appartengono all'entry successivo
+                        self.unread(decompressor.unused_data + chunk)
+                        if remaining:
+                            self.read(remaining)
+        if flags & 0x8:
+            crc = self.read_data_descriptor(zip64)
+        if is_dir:
+            return
+        if running_crc != crc:
+            os.remove(tmp_path)
+            raise IOError(f"CRC non valido per {name}")
+        os.replace(tmp_path, target)
+        self.files.append(os.path.relpath(target, self.extract_dir))
+
+    @staticmethod
+    def zip64_sizes(extra: bytes, size: int, compressed_size: int) -> Tuple[int, int]:
+        """Dimensioni reali dal campo extra ZIP64 (0x0001)"""
+        position = 0
+        while position + 4 <= len(extra):
+            header_id, data_size = struct.unpack('<HH', extra[position:position + 4])
+            data = extra[position + 4:position + 4 + data_size]
+            if header_id == 0x0001:
+                values = list(struct.unpack(f'<{len(data) // 8}Q', data[:len(data) // 8 * 8]))
+                if size == 0xFFFFFFFF and values:
+                    size = values.pop(0)
+                if compressed_size == 0xFFFFFFFF and values:
+                    compressed_size = values.pop(0)
+                break
+            position += 4 + data_size
+        return size, compressed_size
+
+    def read_data_descriptor(self, zip64: bool) -> int:
+        """Legge il data descriptor dopo i dati (firma opzionale) e ritorna il CRC"""
+        head = self.read(4)
+        if head == ZIP_DATA_DESCRIPTOR:
+            head = self.read(4)
+        crc = struct.unpack('<I', head)[0]
+        self.read(16 if zip64 else 8)
+        return crc
+
+    # --- fine download ---
+
+    def finish(self) -> None:
+        """A download completato: attende lo streaming e, se serve, estrae dall'archivio intero"""
+        if self.thread:
+            self.thread.join()
+        archive_path = self.job.dest_path
+        if self.status == 'fallback':
+            self.files = []
+            self.extracted_bytes = 0
+            self.error = None
+            try:
+                self.extract_archive(archive_path)
+                self.status = 'completed'
+            except Exception as e:
+                self.error = str(e)
+                self.status = 'failed'
+                print(f"❌ [extract] {archive_path}: {e}", file=sys.stderr)
+        if self.status == 'completed' and not self.keep_archive:
+            try:
+                os.remove(archive_path)
+            except OSError:
+                pass
+
+    def extract_archive(self, archive_path: str) -> None:
+        with open(archive_path, 'rb') as f:
+            magic = f.read(6)
+        if magic.startswith(SEVEN_ZIP_SIGNATURE):
+            if py7zr is None:
+                raise StreamingUnsupportedError("archivio 7z: py7zr non installato")
+            with py7zr.SevenZipFile(archive_path, 'r') as archive:
+                names = [name for name in archive.getnames()]
+                for name in names:
+                    safe_extract_path(self.extract_dir, name)
+                archive.extractall(path=self.extract_dir)
+            self.files = names
+        else:
+            with zipfile.ZipFile(archive_path) as archive:
+                for info in archive.infolist():
+                    target = safe_extract_path(self.extract_dir, info.filename)
+                    if info.is_dir():
+                        os.makedirs(target, exist_ok=True)
+                        continue
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    with archive.open(info) as source, open(target, 'wb') as out:
+                        shutil.copyfileobj(source, out, EXTRACT_OUTPUT_BYTES)
+                    self.files.append(info.filename)
+                    self.extracted_bytes += info.file_size
+        print(f"✅ [extract] {len(self.files)} file estratti da {archive_path}", file=sys.stderr)
+
+
+def new_download_session() -> requests.Session:
+    """Sessione dedicata a un thread di download"""
+    session = requests.Session()
+    session.verify = False  # Come le altre richieste verso vimm.net
+    return session
+
+
+def download_id_for(dest_path: str) -> str:
+    """Id stabile del download (lo stesso percorso riprende lo stesso download)"""
+    return hashlib.sha1(os.path.abspath(dest_path).encode('utf-8')).hexdigest()[:16]
+
+
+def start_download(params: Dict[str, Any]) -> str:
+    """
+    Avvia (o riprende) in background il download di un link diretto
+    Parametri: url, dest_path, segments (default 4), referer opzionale;
+    extract, extract_dir e keep_archive per l'estrazione in streaming
+    """
+    url = params.get("url")
+    dest_path = params.get("dest_path")
+    if not url or not dest_path:
+        return json.dumps({"error": "url e dest_path sono obbligatori"})
+    dest_path = os.path.abspath(dest_path)
+    download_id = download_id_for(dest_path)
+    with _downloads_lock:
+        job = _downloads.get(download_id)
+        if job and job.status in ('pending', 'downloading', 'extracting', 'cancelling'):
+            return json.dumps(job.snapshot())
+        if os.path.exists(dest_path) and not params.get("overwrite", False):
+            return json.dumps({"download_id": download_id, "status": "completed", "dest_path": dest_path,
+                               "total_bytes": os.path.getsize(dest_path), "already_exists": True})
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        segments = int(params.get("segments") or DOWNLOAD_SEGMENTS_DEFAULT)
+        job = DownloadJob(download_id, url, dest_path, params.get("referer") or get_base_url() + '/', segments)
+        if params.get("extract", False):
+            job.extractor = StreamingExtractor(job, params.get("extract_dir") or os.path.dirname(dest_path),
+                                               params.get("keep_archive", True))
+        job.thread = threading.Thread(target=job.run, name=f'download-{download_id}', daemon=True)
+        _downloads[download_id] = job
+    job.thread.start()
+    return json.dumps(job.snapshot())
+
+
+def find_download(params: Dict[str, Any]) -> Optional[DownloadJob]:
+    download_id = params.get("download_id") or (download_id_for(params["dest_path"]) if params.get("dest_path") else None)
+    with _downloads_lock:
+        return _downloads.get(download_id)
+
+
+def get_download_status(params: Dict[str, Any]) -> str:
+    """Stato di un download per download_id (o dest_path, anche dopo un riavvio se c'è un file parziale)"""
+    job = find_download(params)
+    if job:
+        return json.dumps(job.snapshot())
+    dest_path = params.get("dest_path")
+    if dest_path:
+        dest_path = os.path.abspath(dest_path)
+        job = DownloadJob(download_id_for(dest_path), None, dest_path, '', 0)
+        try:
+            with open(job.state_path, 'r', encoding='utf-8') as f:
+                job.url = json.load(f).get('url')
+        except (OSError, ValueError):
+            pass
+        if job.url and job.load_state():
+            job.status = 'paused'
+            return json.dumps(job.snapshot())
+    return json.dumps({"error": "Download non trovato"})
+
+
+def cancel_download(params: Dict[str, Any]) -> str:
+    """
+    Annulla un download senza attendere i thread (chiamato dalla UI): la risposta ha stato
+    "cancelling" finché getDownloadStatus non riporta "cancelled". Il file parziale resta
+    riprendibile salvo "delete_partial": true
+    """
+    job = find_download(params)
+    if not job:
+        return json.dumps({"error": "Download non trovato"})
+    job.cancel_requested = True
+    job.cancel_event.set()
+    with job.lock:
+        running = job.finished_at is None and job.thread is not None
+        job.delete_partial = bool(params.get("delete_partial", False))
+        if running:
+            job.status = 'cancelling'
+    if job.delete_partial and not running and job.status != 'completed':
+        job.remove_partial()
+    return json.dumps(job.snapshot())
+
+
 def execute(params_json: str) -> str:
     """
     Funzione principale chiamata da Tottodrillo
@@ -931,20 +3273,216 @@ def execute(params_json: str) -> str:
         if not source_dir:
             return json.dumps({"error": "source_dir non fornito"})
         
-        if method == "searchRoms":
-            return search_roms(params, source_dir)
-        elif method == "getEntry":
-            return get_entry(params, source_dir)
-        elif method == "getPlatforms":
-            return get_platforms(source_dir)
-        elif method == "getRegions":
-            return get_regions()
-        else:
-            return json.dumps({"error": f"Metodo sconosciuto: {method}"})
+        _request_context.method = method
+        _request_context.base_url = params.get("base_url")
+        _request_context.source_dir = source_dir
+        _request_context.rate_limit = params.get("rate_limit")
+        _request_context.retry_budget = RETRY_BUDGET_PER_CALL
+        _request_context.upstream_failed = False
+        deadline_ms = params.get("deadline_ms")
+        _request_context.deadline = time.monotonic() + float(deadline_ms) / 1000.0 if deadline_ms else None
+        labels = {'source': SOURCE_ID, 'method': str(method)}
+        start = time.monotonic()
+        policy = serve_policy(method, params)
+        cached = None
+        profiled = False
+        try:
+            cached = cached_negative_result(method, params) or serve_stored_response(method, params, policy)
+            if cached is not None:
+                result = cached
+            elif profiling_enabled(params):
+                # Volutamente fuori da single_flight: ogni chiamata profilata misura la propria esecuzione
+                profiled = True
+                result = run_profiled(method, params, source_dir)
+            else:
+                result = single_flight(method, params, lambda: dispatch_method(method, params, source_dir))
+        except SourceUnavailableError as e:
+            result = source_unavailable_response(params, e)
+        except DeadlineExceededError as e:
+            result = json.dumps({"error": str(e), "error_code": "deadline_exceeded"})
+        except Exception:
+            metrics_inc('execute_errors_total', labels)
+            # Errore imprevisto (es. pagina non raggiungibile): meglio l'ultima copia salvata
+            cached = result = offline_response(params, policy)
+            if result is None:
+                raise
+        finally:
+            metrics_observe('execute_latency_seconds', labels, time.monotonic() - start)
+            metrics_inc('execute_calls_total', labels)
+            save_rate_limits()
+            upstream_failed = getattr(_request_context, 'upstream_failed', False)
+            _request_context.method = None
+            _request_context.base_url = None
+            _request_context.source_dir = None
+            _request_context.rate_limit = None
+            _request_context.retry_budget = None
+            _request_context.upstream_failed = False
+            _request_context.deadline = None
+        if result.startswith('{"error"'):
+            metrics_inc('execute_errors_total', labels)
+            result = offline_response(params, policy) or result
+        elif cached is None and method in ("searchRoms", "getEntry") and not upstream_failed:
+            # Solo risposte ottenute senza errori upstream (non risultati vuoti dovuti a un guasto)
+            # Il blocco "profile" riguarda solo questa chiamata: non va riproposto dalle cache
+            good = strip_profile(result, params) if profiled else result
+            remember_negative_result(method, params, good)
+            if not is_negative_result(method, good):
+                # I "non trovato" restano solo nella cache negativa, con il suo TTL breve
+                remember_good_response(params, good)
+                if policy:
+                    store_response(params, good)
+        elif upstream_failed and is_negative_result(method, result):
+            # Risultato vuoto dovuto a un guasto di rete: meglio l'ultima copia salvata
+            result = offline_response(params, policy) or result
+        return result
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 
+def dispatch_method(method: str, params: Dict[str, Any], source_dir: str) -> str:
+    """Instrada la chiamata execute() al metodo richiesto"""
+    if method == "searchRoms":
+        return search_roms(params, source_dir)
+    elif method == "getEntry":
+        return get_entry(params, source_dir)
+    elif method == "getPlatforms":
+        return get_platforms(source_dir)
+    elif method == "getRegions":
+        return get_regions()
+    elif method == "getStats":
+        return get_stats(params, source_dir)
+    elif method == "getCircuitState":
+        return json.dumps({"circuits": circuit_snapshot()})
+    elif method == "resolveLink":
+        return resolve_link(params, source_dir)
+    elif method == "getThumbnails":
+        return get_thumbnails(params, source_dir)
+    elif method == "startDownload":
+        return start_download(params)
+    elif method == "getDownloadStatus":
+        return get_download_status(params)
+    elif method == "cancelDownload":
+        return cancel_download(params)
+    else:
+        return json.dumps({"error": f"Metodo sconosciuto: {method}"})
+
+
+def get_stats(params: Dict[str, Any], source_dir: str) -> str:
+    """
+    Ritorna il registro metriche della source (contatori e percentili di latenza)
+    Con prometheus_file=true (o un percorso) scrive anche un file testuale Prometheus
+    """
+    stats = metrics_snapshot()
+    stats["rate_limits"] = rate_limit_snapshot()
+    stats["circuits"] = circuit_snapshot()
+    stats["timeouts"] = timeout_snapshot()
+    prometheus_file = params.get("prometheus_file")
+    if prometheus_file:
+        if not isinstance(prometheus_file, str):
+            prometheus_file = os.path.join(source_dir, 'metrics', f'{SOURCE_ID}.prom')
+        stats["prometheus_file"] = write_prometheus_file(prometheus_file)
+    return json.dumps(stats)
+
+
+# Profilazione opt-in delle chiamate execute() (parametro "profile" o variabile d'ambiente)
+PROFILE_ENV_VAR = 'TOTTODRILLO_PROFILE'
+PROFILE_DIR_NAME = 'profiles'
+PROFILE_KEEP = 20  # Numero di profili conservati prima della rotazione
+
+# cProfile e tracemalloc sono globali all'interprete: una sola chiamata profilata alla volta
+_profile_lock = threading.Lock()
+
+
+def profiling_enabled(params: Dict[str, Any]) -> bool:
+    """Verifica se la chiamata corrente deve essere profilata"""
+    flag = params.get("profile")
+    if flag is None:
+        flag = os.environ.get(PROFILE_ENV_VAR, '')
+    return str(flag).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _rotate_profiles(profile_dir: str) -> None:
+    """Mantiene solo gli ultimi PROFILE_KEEP profili (file .prof + .txt)"""
+    try:
+        names = sorted(n for n in os.listdir(profile_dir) if n.endswith('.prof'))
+        for name in names[:-PROFILE_KEEP]:
+            base = os.path.join(profile_dir, name[:-len('.prof')])
+            for ext in ('.prof', '.txt'):
+                if os.path.exists(base + ext):
+                    os.remove(base + ext)
+    except OSError as e:
+        print(f"⚠️ [profile] Errore rotazione profili: {e}", file=sys.stderr)
+
+
+def strip_profile(result: str, params: Dict[str, Any]) -> str:
+    """Rimuove da una risposta il blocco "profile" aggiunto da run_profiled()"""
+    try:
+        data = json.loads(result)
+    except ValueError:
+        return result
+    if not isinstance(data, dict) or "profile" not in data:
+        return result
+    del data["profile"]
+    return dumps_json(data, compact=response_schema(params) >= RESPONSE_SCHEMA_COMPACT)
+
+
+def run_profiled(method: str, params: Dict[str, Any], source_dir: str) -> str:
+    """
+    Esegue dispatch_method() sotto cProfile e tracemalloc
+    Salva le statistiche in <source_dir>/profiles e aggiunge "profile" alla risposta
+    """
+    import cProfile
+    import io
+    import pstats
+    import tracemalloc
+
+    with _profile_lock:
+        profile_dir = os.path.join(source_dir, PROFILE_DIR_NAME)
+        os.makedirs(profile_dir, exist_ok=True)
+        now = time.time()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f'-{int(now * 1000) % 1000:03d}'
+        base = os.path.join(profile_dir, f'{stamp}_{method}')
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+        start = time.monotonic()
+        profiler.enable()
+        try:
+            result = dispatch_method(method, params, source_dir)
+        finally:
+            profiler.disable()
+            elapsed = time.monotonic() - start
+            _, peak_memory = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+
+        profiler.dump_stats(base + '.prof')
+        report = io.StringIO()
+        report.write(f"method: {method}\nduration_ms: {elapsed * 1000:.1f}\npeak_memory_bytes: {peak_memory}\n\n")
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(40)
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(report.getvalue())
+        _rotate_profiles(profile_dir)
+
+    print(f"⏱️ [profile] {method}: {elapsed * 1000:.1f} ms, picco memoria {peak_memory} bytes -> {base}.prof", file=sys.stderr)
+    try:
+        data = json.loads(result)
+    except ValueError:
+        return result
+    if isinstance(data, dict):
+        data["profile"] = {
+            "path": base + '.prof',
+            "report_path": base + '.txt',
+            "duration_ms": round(elapsed * 1000, 1),
+            "peak_memory_bytes": peak_memory
+        }
+        return dumps_json(data, compact=response_schema(params) >= RESPONSE_SCHEMA_COMPACT)
+    return result
+
+
 def search_roms(params: Dict[str, Any], source_dir: str) -> str:
     """
     Cerca ROM nella sorgente
@@ -990,7 +3528,7 @@ def search_roms(params: Dict[str, Any], source_dir: str) -> str:
                 offset_in_page = ((page - 1) * max_results) % VIMMS_PAGE_SIZE
                 
                 # Carica la pagina di Vimm's Lair
-                roms = get_system_search_roms(query, system_uri, vimms_page, source_dir)
+                roms = get_system_search_roms(query, system_uri, vimms_page, source_dir, offset_in_page + max_results)
                 
                 # Applica l'offset e limita i risultati
                 start_idx = offset_in_page
@@ -1000,19 +3538,19 @@ def search_roms(params: Dict[str, Any], source_dir: str) -> str:
     else:
         # Ricerca generale - richiede una query
         if not search_key:
-            return json.dumps({
+            return encode_response({
                 "results": [],
                 "total_results": 0,
                 "current_page": page,
                 "total_pages": 1
-            })
+            }, params)
         
         # Calcola quale pagina di Vimm's Lair serve
         vimms_page = ((page - 1) * max_results) // VIMMS_PAGE_SIZE + 1
         offset_in_page = ((page - 1) * max_results) % VIMMS_PAGE_SIZE
         
         # Carica la pagina di Vimm's Lair
-        roms = get_general_search_roms(search_key, vimms_page, source_dir)
+        roms = get_general_search_roms(search_key, vimms_page, source_dir, offset_in_page + max_results)
         
         # Applica l'offset e limita i risultati
         start_idx = offset_in_page
@@ -1047,7 +3585,7 @@ def search_roms(params: Dict[str, Any], source_dir: str) -> str:
         }
         
         for rom in all_roms:
-            rom_regions = rom.get('regions', [])
+            rom_regions = rom.regions
             if not rom_regions:
                 # Se la ROM non ha regioni, la escludiamo quando c'è un filtro regioni attivo
                 continue
@@ -1102,28 +3640,32 @@ def search_roms(params: Dict[str, Any], source_dir: str) -> str:
         # Siamo all'ultima pagina
         total_results = (page - 1) * max_results + len(all_roms)
     
-    # Debug: verifica quante ROM hanno boxart_url
-    roms_with_images = [r for r in all_roms if r.get('boxart_url')]
+    apply_box_art_checks(all_roms, params, source_dir)
+    
+    # Debug: verifica quante ROM hanno la box art
+    roms_with_images = [r for r in all_roms if r.box_image]
     # Log solo per ROM senza immagini (debug placeholder)
     if len(all_roms) > 0 and not roms_with_images:
         first_rom = all_roms[0]
-        print(f"⚠️ [search_roms] ROM senza immagini: {first_rom.get('title')}, box_image: {first_rom.get('box_image')}", file=sys.stderr)
+        print(f"⚠️ [search_roms] ROM senza immagini: {first_rom.title}, box_image: {first_rom.box_image}", file=sys.stderr)
     
     response = {
-        "results": all_roms,
+        "results": [rom.to_dict() for rom in all_roms],
         "total_results": total_results,
         "current_results": len(all_roms),
         "current_page": page,
         "total_pages": (total_results + max_results - 1) // max_results if total_results > 0 else 1
     }
     
-    return json.dumps(response)
+    return encode_response(response, params)
 
 
 def get_entry(params: Dict[str, Any], source_dir: str) -> str:
     """Ottiene una entry specifica per slug"""
     slug = params.get("slug")
     include_download_links = params.get("include_download_links", True)  # Default True per retrocompatibilità
+    lazy_links = params.get("lazy_links", False)  # Link risolti su richiesta con resolveLink
+    fields = entry_fields(params)
     
     if not slug:
         return json.dumps({"error": "Slug non fornito"})
@@ -1145,13 +3687,17 @@ def get_entry(params: Dict[str, Any], source_dir: str) -> str:
         if id_part.isdigit():
             uri = f"/vault/{id_part}"
     
+    # Altrimenti consulta l'indice slug -> URI delle ricerche precedenti
+    if not uri:
+        uri = get_uri_from_slug(slug, source_dir)
+    
     # Se abbiamo un URI, usiamolo direttamente
     if uri:
-        entry = get_rom_entry_by_uri(uri, source_dir, include_download_links)
+        entry = get_rom_entry_by_uri(uri, source_dir, include_download_links, lazy_links, fields)
         if entry:
             # Assicuriamoci che lo slug corrisponda
             entry['slug'] = slug
-            return json.dumps({"entry": entry})
+            return encode_response({"entry": entry}, params)
     
     # Se non abbiamo un URI diretto, proviamo a cercare
     # Estrai il nome dalla slug (rimuovi il prefisso sistema-)
@@ -1163,17 +3709,203 @@ def get_entry(params: Dict[str, Any], source_dir: str) -> str:
         
         # Cerca la ROM con slug corrispondente
         for rom in roms:
-            if rom['slug'] == slug and rom.get('rom_id'):
+            if rom.slug == slug and rom.rom_id:
                 # Trovata! Ora ottieni i dettagli completi
-                uri = rom['rom_id']
-                entry = get_rom_entry_by_uri(uri, source_dir, include_download_links)
+                uri = rom.rom_id
+                entry = get_rom_entry_by_uri(uri, source_dir, include_download_links, lazy_links, fields)
                 if entry:
-                    return json.dumps({"entry": entry})
+                    return encode_response({"entry": entry}, params)
     
     # Se non trovata, restituisci entry null per coerenza con l'API
-    return json.dumps({
+    return encode_response({
         "entry": None
-    })
+    }, params)
+
+
+# Link "lazy": con "lazy_links": true getEntry restituisce descrittori non risolti (campo
+# "resolve") che l'app risolve al tap con resolveLink; i link risolti restano in cache
+RESOLVE_CACHE_TTL_SECONDS = 600
+RESOLVE_CACHE_SIZE = 128
+
+_resolve_cache_lock = threading.Lock()
+_resolve_cache = OrderedDict()  # descrittore -> (scadenza, link risolti)
+
+
+def lazy_link_descriptor(kind: str, url: str, referer: Optional[str] = None, **link) -> Dict[str, Any]:
+    """Link non ancora risolto: i campi già noti più il descrittore da passare a resolveLink"""
+    return dict(link, url=url, resolved=False, resolve={"kind": kind, "url": url, "referer": referer})
+
+
+def resolve_link(params: Dict[str, Any], source_dir: str) -> str:
+    """
+    Risolve un link lazy restituito da getEntry
+    Accetta "link" (il link completo) oppure "resolve" (solo il descrittore); ritorna {"links": [...]}
+    """
+    link = params.get("link") or {}
+    descriptor = params.get("resolve") or link.get("resolve")
+    if not isinstance(descriptor, dict) or not descriptor.get("url"):
+        return json.dumps({"error": "Descrittore del link non fornito"})
+    key = json.dumps(descriptor, sort_keys=True)
+    with _resolve_cache_lock:
+        cached = _resolve_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'resolve_link', 'result': 'hit'})
+        return json.dumps({"links": cached[1], "cached": True})
+    metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'resolve_link', 'result': 'miss'})
+
+    base_link = {k: v for k, v in link.items() if k not in ('resolve', 'resolved')}
+    links = resolve_descriptor(descriptor, base_link)
+    if links:
+        with _resolve_cache_lock:
+            _resolve_cache[key] = (time.monotonic() + RESOLVE_CACHE_TTL_SECONDS, links)
+            _resolve_cache.move_to_end(key)
+            while len(_resolve_cache) > RESOLVE_CACHE_SIZE:
+                _resolve_cache.popitem(last=False)
+    return json.dumps({"links": links})
+
+
+def resolve_descriptor(descriptor: Dict[str, Any], base_link: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Risolve un descrittore Vimm's Lair: URL di download letto dal form della pagina ROM"""
+    if descriptor.get("kind") != "rom_page":
+        return []
+    download_url = get_rom_download_url(descriptor["url"])
+    if not download_url:
+        return []
+    link = {'name': 'Download', 'type': 'direct', 'format': 'zip', 'size_str': None}
+    link.update(base_link)
+    link['url'] = download_url
+    return [link]
+
+
+# Miniature delle copertine: getThumbnails scarica in parallelo le immagini di una pagina di
+# risultati, le riduce con PIL (se installato) al lato massimo richiesto e le salva in
+# cache/thumbs, con un limite di spazio e rimozione delle meno usate (LRU sull'ultimo accesso)
+THUMB_DIR_NAME = 'thumbs'
+THUMB_DEFAULT_SIZE = 256
+THUMB_MAX_SIZE = 1024
+THUMB_CACHE_MAX_BYTES = 64 * 1024 * 1024
+THUMB_CACHE_TARGET_RATIO = 0.8  # Dopo una rimozione la cache scende all'80% del limite
+THUMB_MAX_WORKERS = 6
+THUMB_JPEG_QUALITY = 85
+
+_thumb_lock = threading.Lock()
+_thumb_cache_bytes = {}  # directory -> byte occupati (calcolati alla prima scrittura)
+
+
+def get_thumb_dir(source_dir: Optional[str] = None) -> Optional[str]:
+    cache_dir = get_cache_dir(source_dir)
+    if not cache_dir:
+        return None
+    thumb_dir = os.path.join(cache_dir, THUMB_DIR_NAME)
+    os.makedirs(thumb_dir, exist_ok=True)
+    return thumb_dir
+
+
+def make_thumbnail(data: bytes, size: int) -> Optional[bytes]:
+    """Riduce un'immagine a lato massimo size (JPEG); None se PIL non è disponibile"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    from io import BytesIO
+    with Image.open(BytesIO(data)) as img:
+        img.draft('RGB', (size, size))  # I JPEG vengono decodificati già ridotti
+        if img.mode in ('RGBA', 'LA', 'P'):
+            rgba = img.convert('RGBA')
+            img = Image.new('RGB', rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.split()[3])
+        else:
+            img = img.convert('RGB')
+        img.thumbnail((size, size))
+        output = BytesIO()
+        img.save(output, 'JPEG', quality=THUMB_JPEG_QUALITY, optimize=True)
+        return output.getvalue()
+
+
+def store_thumbnail(thumb_dir: str, path: str, data: bytes) -> None:
+    """Scrive una miniatura e applica il limite di spazio della cache"""
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    with _thumb_lock:
+        used = _thumb_cache_bytes.get(thumb_dir)
+        if used is None:
+            used = sum(entry.stat().st_size for entry in os.scandir(thumb_dir) if entry.is_file())
+        else:
+            used += len(data)
+        if used > THUMB_CACHE_MAX_BYTES:
+            entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                             for entry in os.scandir(thumb_dir) if entry.is_file())
+            for _, entry_size, entry_path in entries:
+                if used <= THUMB_CACHE_MAX_BYTES * THUMB_CACHE_TARGET_RATIO:
+                    break
+                try:
+                    os.remove(entry_path)
+                    used -= entry_size
+                except OSError:
+                    pass
+            metrics_inc('thumbnail_evictions_total', {'source': SOURCE_ID})
+        _thumb_cache_bytes[thumb_dir] = used
+
+
+def fetch_thumbnail(url: str, size: int, thumb_dir: str) -> Dict[str, Any]:
+    """Ritorna la miniatura di url dalla cache o scaricandola"""
+    name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    for path, resized in ((os.path.join(thumb_dir, f'{name}_{size}.jpg'), True),
+                          (os.path.join(thumb_dir, f'{name}_orig'), False)):
+        if os.path.exists(path):
+            try:
+                os.utime(path)  # Ultimo accesso per l'LRU
+            except OSError:
+                pass
+            metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'thumbnail', 'result': 'hit'})
+            return {"url": url, "path": path, "resized": resized, "cached": True}
+    metrics_inc('cache_requests_total', {'source': SOURCE_ID, 'cache': 'thumbnail', 'result': 'miss'})
+    headers = {'User-Agent': get_random_ua()}
+    referer = image_referer(url)
+    if referer:
+        headers['Referer'] = referer
+    try:
+        response = http_get(url, endpoint='image', rate_limited=False, headers=headers, timeout=10, verify=False)
+        content_type = response.headers.get('Content-Type', '').lower()
+        if response.status_code != 200 or 'image' not in content_type:
+            return {"url": url, "path": None, "error": f"HTTP {response.status_code} ({content_type or 'nessun tipo'})"}
+        problem = vimm_image_problem(response, BOX_ART_MIN_SIDE) if 'image.php' in url else None
+        if problem:
+            # Segnaposto di image.php: non va salvato come miniatura della copertina
+            return {"url": url, "path": None, "error": problem}
+        data = make_thumbnail(response.content, size)
+        resized = data is not None
+        path = os.path.join(thumb_dir, f'{name}_{size}.jpg' if resized else f'{name}_orig')
+        store_thumbnail(thumb_dir, path, data if resized else response.content)
+        return {"url": url, "path": path, "resized": resized, "cached": False}
+    except Exception as e:
+        print(f"⚠️ [get_thumbnails] Errore miniatura {url}: {e}", file=sys.stderr)
+        return {"url": url, "path": None, "error": str(e)}
+
+
+def get_thumbnails(params: Dict[str, Any], source_dir: str) -> str:
+    """
+    Miniature locali per le copertine di una pagina di risultati
+    Accetta "urls" oppure "results"/"roms" (le ROM di searchRoms, usa box_image) e "size" (lato massimo in px)
+    """
+    rows = params.get("results") or params.get("roms") or []
+    urls = params.get("urls") or [rom.get("box_image") for rom in rows if isinstance(rom, dict)]
+    urls = list(dict.fromkeys(url for url in urls if isinstance(url, str) and url.startswith('http')))
+    try:
+        size = max(16, min(THUMB_MAX_SIZE, int(params.get("size") or THUMB_DEFAULT_SIZE)))
+    except (TypeError, ValueError):
+        return json.dumps({"error": "size non valido"})
+    thumb_dir = get_thumb_dir(source_dir)
+    if not thumb_dir:
+        return json.dumps({"error": "Cache delle miniature non disponibile"})
+    if not urls:
+        return json.dumps({"thumbnails": [], "size": size})
+    fetch = run_with_context(fetch_thumbnail)
+    with ThreadPoolExecutor(max_workers=min(THUMB_MAX_WORKERS, len(urls))) as executor:
+        thumbnails = list(executor.map(lambda url: fetch(url, size, thumb_dir), urls))
+    return json.dumps({"thumbnails": thumbnails, "size": size})
 
 
 def get_platforms(source_dir: str) -> str: